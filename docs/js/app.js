@@ -2,15 +2,16 @@
 
 import { state } from './state.js';
 import { CONFIG } from './constants.js';
-import { loadData } from './data_loader.js';
+import { loadData, loadHistory, defaultDataUrl } from './data_loader.js';
 import { updateLayoutMetrics, setupControls } from './ui.js';
-import { advanceSimulation } from './render.js';
+import { advanceSimulation, syncBarElement } from './render.js';
 
 window.addEventListener('DOMContentLoaded', () => {
     const params = new URLSearchParams(window.location.search);
     state.lang = params.get('lang') || state.lang;
     state.paramDate = params.get('date');
     state.paramPrevDate = params.get('prev_date');
+    state.dataUrl = params.get('data');
 
     if (params.get('mode') === 'capture') {
         document.body.classList.add('capture-mode');
@@ -31,6 +32,17 @@ window.addEventListener('DOMContentLoaded', () => {
  * 根据录制起始帧和预渲染帧数，静默模拟动画以建立正确的初始状态。
  */
 window.initializeToFrame = (recordingStartFrame, preRollFrames) => {
+    const framesToSimulate = seekToPreRoll(recordingStartFrame, preRollFrames);
+    const dt = 1 / CONFIG.fps;
+    for (let i = 0; i < framesToSimulate; i++) {
+        advanceSimulation(dt);
+    }
+};
+
+/**
+ * 清空条目并定位到预渲染起点，返回需要模拟的帧数。
+ */
+function seekToPreRoll(recordingStartFrame, preRollFrames) {
     const simulationStartFrame = recordingStartFrame - preRollFrames;
     const simulationStartMinute = simulationStartFrame;
 
@@ -54,10 +66,75 @@ window.initializeToFrame = (recordingStartFrame, preRollFrames) => {
         state.currentMinute = simulationStartMinute;
     }
     state.currentDateIndex = initialDateIndex;
+    return framesToSimulate;
+}
+
+/**
+ * 导出当前动画状态 (可 JSON 序列化)：日期、分钟以及按叠放顺序排列的全部条目。
+ */
+window.exportState = () => ({
+    date: state.data.dates[state.currentDateIndex],
+    minute: state.currentMinute,
+    bars: Object.entries(state.bars).map(([title, b]) => ({
+        title, currentY: b.currentY, targetY: b.targetY, speedFactor: b.speedFactor,
+        rank: b.rank, value: b.value, widthPct: b.widthPct, color: b.color, opacity: b.opacity
+    }))
+});
+
+/**
+ * 导入 exportState 导出的状态并重建 DOM，之后的 advanceFrame 与不间断模拟的结果完全一致。
+ */
+window.importState = (snapshot) => {
+    const container = document.getElementById('chart-container');
+    container.innerHTML = '';
+    state.bars = {};
+    state.currentDateIndex = state.data.dates.indexOf(snapshot.date);
+    state.currentMinute = snapshot.minute;
+    for (const { title, ...fields } of snapshot.bars) {
+        const barObj = { el: null, ...fields };
+        state.bars[title] = barObj;
+        syncBarElement(container, title, barObj);
+    }
+};
 
+/**
+ * 以无 DOM 模式从日初 (含预渲染) 模拟到各录制起始帧，返回 {帧号: 状态}。
+ * 分块从对应检查点开始录制即可与前一分块的结尾精确衔接，无需预渲染。
+ */
+window.computeCheckpoints = (startFrames, preRollFrames) => {
+    const frames = [...startFrames].sort((a, b) => a - b);
+    const checkpoints = {};
     const dt = 1 / CONFIG.fps;
-    for (let i = 0; i < framesToSimulate; i++) {
-        advanceSimulation(dt);
+
+    state.domless = true;
+    try {
+        const framesToSimulate = seekToPreRoll(0, preRollFrames);
+        for (let i = 0; i < framesToSimulate; i++) advanceSimulation(dt);
+
+        let frame = 0;
+        for (const target of frames) {
+            for (; frame < target; frame++) advanceSimulation(dt);
+            checkpoints[target] = window.exportState();
+        }
+    } finally {
+        state.domless = false;
+        state.bars = {};
+    }
+    return checkpoints;
+};
+
+/**
+ * 切换录制目标日期、配置与数据目录，供复用页面的渲染进程调用 (无需重新加载页面)。
+ * dataUrl 为该日的渲染切片目录；目录变化时只重新读取切片。
+ */
+window.setCaptureTarget = async (date, prevDate, config, dataUrl = null) => {
+    state.paramDate = date;
+    state.paramPrevDate = prevDate;
+    if (config) state.config = config;
+    const url = dataUrl || defaultDataUrl(state.lang);
+    if (url !== state.dataUrl) {
+        state.data = await loadHistory(url);
+        state.dataUrl = url;
     }
 };
 
@@ -5,6 +5,66 @@ import { updateTitle } from './ui.js';
 import { loop, renderCurrentState, advanceSimulation } from './render.js';
 import { CONFIG } from './constants.js';
 
+const MINUTES_PER_DAY = 1440;
+
+/**
+ * 以 XHR 读取资源 (兼容 capture 模式下的 file:// 协议，fetch 不支持该协议)。
+ */
+function loadResource(url, responseType) {
+    return new Promise((resolve, reject) => {
+        const xhr = new XMLHttpRequest();
+        xhr.open('GET', url);
+        xhr.responseType = responseType;
+        xhr.onload = () => {
+            // file:// 协议下 status 为 0
+            if ((xhr.status === 200 || xhr.status === 0) && xhr.response) resolve(xhr.response);
+            else reject(new Error(`Failed to load ${url} (status ${xhr.status})`));
+        };
+        xhr.onerror = () => reject(new Error(`Failed to load ${url}`));
+        xhr.send();
+    });
+}
+
+/**
+ * 返回语言对应的默认历史数据目录。
+ */
+export function defaultDataUrl(lang) {
+    return `data/history_${lang}`;
+}
+
+/**
+ * 加载历史数据：读取分片清单，并行装配保留窗口内每个日期的分片。
+ * baseUrl 也可以是 Python 端写出的渲染切片目录 (同格式，只含渲染单日所需的日期)。
+ * minutes 分片的分钟曲线是该分片 ArrayBuffer 上的 Uint32Array 视图 (小端序)，无需逐值解析；
+ * spline 分片只含 PCHIP 系数，由 getValueAt 按需求值。
+ * titlesByDate 记录每个日期有曲线的条目，渲染时只需遍历当天的条目。
+ */
+export async function loadHistory(baseUrl) {
+    const manifest = await loadResource(`${baseUrl}/manifest.json`, 'json');
+
+    const articles = {};
+    const titlesByDate = {};
+    const article = (title) => articles[title] || (articles[title] = { minutes: {}, splines: {} });
+
+    await Promise.all(manifest.dates.filter(d => manifest.shards[d]).map(async (dateStr) => {
+        const shard = await loadResource(`${baseUrl}/${dateStr}.json`, 'json');
+        titlesByDate[dateStr] = [...Object.keys(shard.splines || {}), ...(shard.titles || [])];
+        if (shard.splines) {
+            for (const [title, coefficients] of Object.entries(shard.splines)) {
+                article(title).splines[dateStr] = coefficients;
+            }
+        }
+        if (shard.titles && shard.titles.length) {
+            const values = new Uint32Array(await loadResource(`${baseUrl}/${dateStr}.bin`, 'arraybuffer'));
+            shard.titles.forEach((title, row) => {
+                article(title).minutes[dateStr] = values.subarray(row * MINUTES_PER_DAY, (row + 1) * MINUTES_PER_DAY);
+            });
+        }
+    }));
+
+    return { dates: manifest.dates, articles, titlesByDate };
+}
+
 export async function loadData(lang, initialDate = null) {
     const loading = document.getElementById('loading');
     if(loading) loading.style.display = 'block';
@@ -21,7 +81,9 @@ export async function loadData(lang, initialDate = null) {
 
     try {
         state.config = window.INJECTED_CONFIG || await (await fetch(`config.json`)).json();
-        state.data = window.INJECTED_DATA || await (await fetch(`data/history_${lang}.json`)).json();
+        // 录制模式可由 URL 参数 data 指定渲染切片目录
+        state.dataUrl = (state.mode === 'capture' && state.dataUrl) || defaultDataUrl(lang);
+        state.data = window.INJECTED_DATA || await loadHistory(state.dataUrl);
 
         state.currentDateIndex = 0;
         if (initialDate && state.data.dates.includes(initialDate)) {
@@ -36,13 +36,14 @@ export function renderCurrentState(dt) {
     const hour = Math.floor(state.currentMinute / 60);
     const minute = Math.floor(state.currentMinute % 60);
 
-    const timeDisplay = document.getElementById('time-display');
+    const timeDisplay = state.domless ? null : document.getElementById('time-display');
     if(timeDisplay) {
         timeDisplay.innerText = `${dateStr.replace(/-/g, '/')}-${String(hour).padStart(2, '0')}:${String(minute).padStart(2, '0')}`;
     }
 
     let currentValues = [];
-    for (const title of Object.keys(state.data.articles)) {
+    const titles = state.data.titlesByDate?.[dateStr] || Object.keys(state.data.articles);
+    for (const title of titles) {
         const val = getValueAt(title, state.currentDateIndex, state.currentMinute);
         if (val > 0) {
             const trendDelta = calculateTrend(title, state.currentDateIndex, state.currentMinute, CONFIG.derivativeWindow);
@@ -61,30 +62,23 @@ export function renderCurrentState(dt) {
         activeTitles.add(item.title);
         let barObj = state.bars[item.title];
         if (!barObj) {
-            const el = createBarElement(item.title);
-            container.appendChild(el);
-            el.style.top = `${state.chartHeight}px`;
-            barObj = { el, currentY: state.chartHeight, targetY: 0, speedFactor: CONFIG.minSpeed };
+            barObj = { el: null, currentY: state.chartHeight, targetY: 0, speedFactor: CONFIG.minSpeed };
             state.bars[item.title] = barObj;
         }
 
         barObj.targetY = index * state.rowHeight;
-        barObj.el.style.height = `${state.rowHeight}px`;
-        barObj.el.querySelector('.bar-rank').innerText = index + 1;
-        barObj.el.querySelector('.bar-value').innerText = item.val.toLocaleString();
-        barObj.el.style.opacity = '1';
+        barObj.rank = index + 1;
+        barObj.value = item.val;
+        barObj.opacity = 1;
 
         let widthPct = state.isLogScale
             ? (Math.log(Math.max(1, item.val)) / Math.log(Math.max(1.1, frameMaxVal))) * 100
             : (item.val / frameMaxVal) * 100;
-        widthPct = Math.max(Math.min(widthPct, 100), 15);
-
-        const fillEl = barObj.el.querySelector('.bar-fill');
-        fillEl.style.width = `${widthPct}%`;
+        barObj.widthPct = Math.max(Math.min(widthPct, 100), 15);
 
         const trendDelta = item.val - item.pastVal;
         const slope = trendDelta / CONFIG.derivativeWindow;
-        fillEl.style.backgroundColor = getDerivativeColor(slope);
+        barObj.color = getDerivativeColor(slope);
 
         const normalizedPosDelta = frameMaxVal > 1 ? Math.abs(trendDelta) / frameMaxVal : 0;
         barObj.speedFactor = CONFIG.minSpeed + (CONFIG.maxSpeed - CONFIG.minSpeed) * normalizedPosDelta;
@@ -95,9 +89,9 @@ export function renderCurrentState(dt) {
             const barObj = state.bars[title];
             barObj.targetY = state.chartHeight + state.rowHeight;
             barObj.speedFactor = CONFIG.minSpeed;
-            barObj.el.style.opacity = '0.5';
-            if (barObj.currentY > state.chartHeight + 200 && barObj.el.parentNode) {
-               container.removeChild(barObj.el);
+            barObj.opacity = 0.5;
+            if (barObj.currentY > state.chartHeight + 200) {
+               if (barObj.el && barObj.el.parentNode) container.removeChild(barObj.el);
                delete state.bars[title];
             }
         }
@@ -107,8 +101,32 @@ export function renderCurrentState(dt) {
     for (const title in state.bars) {
         const barObj = state.bars[title];
         barObj.currentY += (barObj.targetY - barObj.currentY) * Math.min(1, barObj.speedFactor * timeScale);
-        barObj.el.style.top = `${barObj.currentY}px`;
+        // 无 DOM 模拟 (计算检查点) 时只更新状态
+        if (!state.domless) syncBarElement(container, title, barObj, activeTitles.has(title));
+    }
+}
+
+/**
+ * 将条目状态写入对应的 DOM 元素 (不存在时创建)。
+ * full 为 false 时只更新位置与透明度 (离场条目的内容保持不变)。
+ */
+export function syncBarElement(container, title, barObj, full = true) {
+    if (!barObj.el) {
+        barObj.el = createBarElement(title);
+        container.appendChild(barObj.el);
+        full = true;
     }
+    const el = barObj.el;
+    el.style.top = `${barObj.currentY}px`;
+    el.style.opacity = String(barObj.opacity);
+    if (!full) return;
+
+    el.style.height = `${state.rowHeight}px`;
+    el.querySelector('.bar-rank').innerText = barObj.rank;
+    el.querySelector('.bar-value').innerText = barObj.value.toLocaleString();
+    const fillEl = el.querySelector('.bar-fill');
+    fillEl.style.width = `${barObj.widthPct}%`;
+    fillEl.style.backgroundColor = barObj.color;
 }
 
 function createBarElement(title) {
@@ -16,8 +16,10 @@ export const state = {
     // URL参数
     paramDate: null,
     paramPrevDate: null,
+    dataUrl: null, // 历史数据目录 (录制时为渲染切片，默认为 data/history_{lang})
     // 动画状态
     bars: {},
+    domless: false, // 为 true 时只推进模拟状态，不更新 DOM (用于计算检查点)
     rowHeight: 60,
     chartHeight: 0,
     lastFrameTime: 0,
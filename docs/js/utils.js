@@ -9,12 +9,30 @@ export function getValueAt(title, dateIndex, minute) {
 
     const articleData = state.data.articles[title];
     const dateStr = state.data.dates[dateIndex];
-    if (!articleData || !articleData.minutes || !articleData.minutes[dateStr]) return 0;
+    if (!articleData) return 0;
 
+    const coefficients = articleData.splines && articleData.splines[dateStr];
+    if (coefficients) return evaluateSpline(coefficients, Math.min(Math.floor(minute), 1439));
+
+    if (!articleData.minutes || !articleData.minutes[dateStr]) return 0;
     const arr = articleData.minutes[dateStr];
     return arr[Math.min(Math.floor(minute), arr.length - 1)] || 0;
 }
 
+/**
+ * 在第 minuteIndex 分钟处求值 PCHIP 三次多项式 (x 单位为小时)。
+ * 运算顺序与 Python 端 interpolation.evaluate_curves 一致，结果逐位相同。
+ */
+function evaluateSpline(c, minuteIndex) {
+    const s = minuteIndex * (24 / 1440);
+    const s2 = s * s;
+    const s3 = s2 * s;
+    let y = c[3] + c[2] * s;
+    y = y + c[1] * s2;
+    y = y + c[0] * s3;
+    return y > 0 ? Math.trunc(y) : 0;
+}
+
 export function calculateTrend(title, dateIndex, currentMinute, windowSize) {
     const samples = 10;
     const step = windowSize / samples;
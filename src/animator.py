@@ -1,7 +1,9 @@
 # src/animator.py
 
 import os
+import io
 import json
+import hashlib
 import requests
 import urllib.parse
 import subprocess
@@ -9,19 +11,26 @@ import pathlib
 import time
 import base64
 import concurrent.futures
-import numpy as np
 import random
 from datetime import datetime, timedelta
-from typing import Dict, Any, cast, Optional
-from scipy.interpolate import PchipInterpolator
-from playwright.sync_api import sync_playwright, ViewportSize
+from typing import Dict, Any, Optional
 
 # 导入配置和常量
 from config import (
-    DOCS_DIR, DOCS_DATA_DIR, VIDEO_DIR, HEADERS,
-    VIDEO_FPS, VIDEO_TOTAL_FRAMES_PER_DAY, VIDEO_WIDTH, VIDEO_HEIGHT,
-    VIDEO_SCALE, VIDEO_PRE_ROLL_FACTOR, MUSICS_DIR, SUPPORTED_MUSIC_EXTENSIONS
+    DOCS_DIR, DOCS_DATA_DIR, VIDEO_DIR,
+    VIDEO_FPS, VIDEO_TOTAL_FRAMES_PER_DAY, VIDEO_WIDTH, VIDEO_HEIGHT, VIDEO_SCALE,
+    VIDEO_PRE_ROLL_FRAMES, VIDEO_RENDER_ENGINE, VIDEO_CAPTURE_FORMAT,
+    VIDEO_CHUNK_FRAMES, VIDEO_MAX_RENDER_WORKERS, VIDEO_WORKER_MEMORY_MB, VIDEO_CHUNK_MAX_ATTEMPTS, VIDEO_PROFILES,
+    MUSICS_DIR, SUPPORTED_MUSIC_EXTENSIONS,
+    HTTP_MAX_WORKERS, HISTORY_STORAGE_MODE, HISTORY_WINDOW_DAYS, HISTORY_RAW_DAYS, HISTORY_MAINTENANCE_DAYS
 )
+import http_client
+import browser_pool
+import tracing
+from frame_writer import FrameWriter
+from history_store import load_history, save_history, compact_history, segment_curve_hashes, write_segment_slice
+from interpolation import pchip_coefficients, pchip_windows, evaluate_curves
+from utils import available_memory_mb
 
 
 def ensure_dirs():
@@ -33,42 +42,24 @@ def ensure_dirs():
     os.makedirs(MUSICS_DIR, exist_ok=True)
 
 
-def load_history(lang_code: str) -> Dict[str, Any]:
-    """
-    加载指定语言的历史数据。
-    """
-    file_path = os.path.join(DOCS_DATA_DIR, f"history_{lang_code}.json")
-    if os.path.exists(file_path):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {"dates": [], "articles": {}}
-
-
-def save_history(data: Dict[str, Any], lang_code: str):
-    """
-    保存指定语言的历史数据。
-    """
-    ensure_dirs()
-    file_path = os.path.join(DOCS_DATA_DIR, f"history_{lang_code}.json")
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=1)
-
-
 # --- 数据处理逻辑 ---
 
-def fetch_raw_daily_batch(project, title, start_date_str, end_date_str, session=None):
+def fetch_raw_daily_batch(project, title, start_date_str, end_date_str) -> Optional[Dict[str, int]]:
     """
     批量获取单个条目在日期范围内的原始日浏览量数据。
+    404 (无数据) 返回空字典；重试耗尽后仍失败时返回 None，以便调用方保留已有数据。
     """
     try:
         s = datetime.strptime(start_date_str, "%Y-%m-%d").strftime("%Y%m%d")
         e = datetime.strptime(end_date_str, "%Y-%m-%d").strftime("%Y%m%d")
         safe_title = urllib.parse.quote(title, safe='')
         url = f"https://wikimedia.org/api/rest_v1/metrics/pageviews/per-article/{project}/all-access/user/{safe_title}/daily/{s}/{e}"
-        requester = session if session else requests
-        resp = requester.get(url, headers=HEADERS)
-        if resp.status_code != 200:
+        resp = http_client.get(url)
+        if resp.status_code == 404:
             return {}
+        if resp.status_code != 200:
+            print(f"Error fetching data for {title}: HTTP {resp.status_code}")
+            return None
         data = resp.json()
         result = {}
         for item in data.get('items', []):
@@ -77,162 +68,214 @@ def fetch_raw_daily_batch(project, title, start_date_str, end_date_str, session=
         return result
     except (requests.RequestException, ValueError, KeyError) as e:
         print(f"Error fetching data for {title}: {e}")
-        return {}
+        return None
 
 
-def interpolate_curve_for_date(daily_raw_map, target_date_str):
+def fetch_raw_daily_parallel(project, jobs):
     """
-    使用 PCHIP 插值算法为单日数据生成分钟级曲线。
+    有界并发地批量获取多个条目的原始日浏览量。
+    - jobs: [(title, start_date_str, end_date_str), ...]
+    返回与 jobs 顺序一致的结果列表。
     """
-    target_date = datetime.strptime(target_date_str, "%Y-%m-%d")
-    x_points = []
-    y_points = []
-    for i in range(-2, 3):
-        d = target_date + timedelta(days=i)
-        d_str = d.strftime("%Y-%m-%d")
-        val = daily_raw_map.get(d_str)
-        if val is None:
-            val = 0 if i < 0 else daily_raw_map.get(target_date_str, 0)
-        x_points.append((i + 1) * 24)
-        y_points.append(val)
-
-    if sum(y_points) == 0:
-        return [0] * 1440
+    def task(job):
+        return fetch_raw_daily_batch(project, job[0], job[1], job[2])
 
-    try:
-        interpolator = PchipInterpolator(np.array(x_points), np.array(y_points))
-        xs = np.linspace(0, 24, 1440, endpoint=False)
-        ys = interpolator(xs)
-        return [int(max(0, y)) for y in ys]
-    except (ValueError, TypeError):
-        return [y_points[2]] * 1440
+    with concurrent.futures.ThreadPoolExecutor(max_workers=HTTP_MAX_WORKERS) as executor:
+        return list(executor.map(task, jobs))
 
 
 def update_data(project, today_date_str, top_articles, lang_code='en'):
     """
     更新并保存历史数据，包括获取新数据和重新计算插值曲线。
     """
-    history = load_history(lang_code)
     today_date = datetime.strptime(today_date_str, "%Y-%m-%d")
+    # 只装配本次需要的分片：重算插值的日期 (today-2 .. today) 所需的原始值，以及判断补齐资格的近期 Top 列表
+    load_days = max(HISTORY_RAW_DAYS, HISTORY_MAINTENANCE_DAYS)
+    shard_dates = [(today_date - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(load_days - 1, -1, -1)]
+    history = load_history(lang_code, dates=shard_dates, mmap=False)
 
     if today_date_str not in history['dates']:
         history['dates'].append(today_date_str)
         history['dates'].sort()
-        if len(history['dates']) > 30:
-            history['dates'] = history['dates'][-30:]
+        if len(history['dates']) > HISTORY_WINDOW_DAYS:
+            history['dates'] = history['dates'][-HISTORY_WINDOW_DAYS:]
 
     top_titles = set(item['title'] for item in top_articles)
+    history['top'][today_date_str] = [item['title'] for item in top_articles]
     yesterday_str = (today_date - timedelta(days=1)).strftime("%Y-%m-%d")
-    maintenance_titles = []
 
+    # 跌出 Top 列表超过 HISTORY_MAINTENANCE_DAYS 天的条目不再补齐 (缺少 Top 记录的旧数据按原逻辑全部补齐)
+    maintenance_dates = [d for d in shard_dates[-HISTORY_MAINTENANCE_DAYS:] if d in history['dates']]
+    recently_top = None
+    if all(d in history['top'] for d in maintenance_dates):
+        recently_top = set(t for d in maintenance_dates for t in history['top'][d])
+
+    maintenance_titles = []
     for title, data in history['articles'].items():
-        if title not in top_titles:
-            if yesterday_str in data.get("daily_raw", {}):
+        if title not in top_titles and yesterday_str in data.get("daily_raw", {}):
+            if recently_top is None or title in recently_top:
                 maintenance_titles.append(title)
 
     print(f"Updating data context for {today_date_str} [{lang_code}]...")
     fetch_start = (today_date - timedelta(days=3)).strftime("%Y-%m-%d")
 
-    with requests.Session() as session:
-        for item in top_articles:
-            title = item['title']
-            if title not in history['articles']:
-                history['articles'][title] = {"daily_raw": {}, "minutes": {}}
-            recent_data = fetch_raw_daily_batch(project, title, fetch_start, today_date_str, session)
+    jobs = [(item['title'], fetch_start, today_date_str) for item in top_articles]
+    jobs += [(title, yesterday_str, today_date_str) for title in maintenance_titles]
+
+    with tracing.span("history.fetch", lang=lang_code, date=today_date_str, articles=len(jobs)):
+        results = fetch_raw_daily_parallel(project, jobs)
+    failed = sum(1 for r in results if r is None)
+    if failed:
+        print(f"  Warning: {failed}/{len(jobs)} article fetches failed, keeping previously stored values.")
+
+    # 按原始顺序合并结果，保证结果与串行获取一致
+    for item, recent_data in zip(top_articles, results):
+        title = item['title']
+        if title not in history['articles']:
+            history['articles'][title] = {"daily_raw": {}, "minutes": {}, "splines": {}}
+        if recent_data:
             history['articles'][title]["daily_raw"].update(recent_data)
-            history['articles'][title]["daily_raw"][today_date_str] = item['views']
+        history['articles'][title]["daily_raw"][today_date_str] = item['views']
 
-        for title in maintenance_titles:
-            daily_data = fetch_raw_daily_batch(project, title, yesterday_str, today_date_str, session)
-            if daily_data:
-                history['articles'][title]["daily_raw"].update(daily_data)
+    for title, daily_data in zip(maintenance_titles, results[len(top_articles):]):
+        if daily_data:
+            history['articles'][title]["daily_raw"].update(daily_data)
 
     dates_to_recalc = [(today_date - timedelta(days=2)).strftime("%Y-%m-%d"), yesterday_str, today_date_str]
-    for title, data in history['articles'].items():
-        raw = data["daily_raw"]
-        for d_str in dates_to_recalc:
-            if d_str in raw:
-                data["minutes"][d_str] = interpolate_curve_for_date(raw, d_str)
+    targets = [(title, d_str) for title, data in history['articles'].items()
+               for d_str in dates_to_recalc if d_str in data["daily_raw"]]
+    with tracing.span("interpolation", lang=lang_code, date=today_date_str, curves=len(targets),
+                      mode=HISTORY_STORAGE_MODE):
+        coefficients = pchip_coefficients(pchip_windows(
+            [(history['articles'][title]["daily_raw"], d_str) for title, d_str in targets]))
+
+        if HISTORY_STORAGE_MODE == 'spline':
+            # 只保存系数，分钟曲线由使用方按需求值
+            for (title, d_str), row in zip(targets, coefficients):
+                article = history['articles'][title]
+                article["splines"][d_str] = row.tolist()
+                article["minutes"].pop(d_str, None)
+        else:
+            curves = evaluate_curves(coefficients)
+            for (title, d_str), curve in zip(targets, curves):
+                article = history['articles'][title]
+                article["minutes"][d_str] = curve
+                article["splines"].pop(d_str, None)
 
     keep_dates = set(history['dates'])
     for title in history['articles']:
-        keys = list(history['articles'][title]["minutes"].keys())
-        for k in keys:
-            if k not in keep_dates:
-                del history['articles'][title]["minutes"][k]
-
-    save_history(history, lang_code)
+        for key in ("minutes", "splines"):
+            curves_by_date = history['articles'][title][key]
+            for k in list(curves_by_date.keys()):
+                if k not in keep_dates:
+                    del curves_by_date[k]
+
+    with tracing.span("history.save", lang=lang_code, date=today_date_str, shards=len(shard_dates)):
+        save_history(history, lang_code, dates=shard_dates, today_date_str=today_date_str)
+        compact_history(lang_code, today_date_str)
     return history
 
 
-def _render_chunk_worker(args):
+def _capture_params(capture_format, width, height):
     """
-    使用 CDP (Page.captureScreenshot) 进行渲染。
+    返回帧传输格式对应的 (CDP 截图参数, FFmpeg 输入参数)。
     """
-    chunk_index, start_frame, end_frame, base_url, history_data, config_data, chunk_output_path, pre_roll_frames = args
+    if capture_format == 'jpeg':
+        return ({"format": "jpeg", "quality": 90, "optimizeForSpeed": True},
+                ['-f', 'image2pipe', '-vcodec', 'mjpeg'])
+    screenshot = {"format": "png", "optimizeForSpeed": True}
+    if capture_format == 'png':
+        return screenshot, ['-f', 'image2pipe', '-vcodec', 'png']
+    if capture_format == 'rawvideo':
+        return screenshot, ['-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}']
+    raise ValueError(f"Unknown capture format: {capture_format}")
+
+
+def _decode_frame(data, capture_format):
+    """将 CDP 返回的图像数据转换为写入 FFmpeg 的字节流"""
+    if capture_format != 'rawvideo':
+        return data
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as img:
+        return img.convert('RGB').tobytes()
 
-    # 错峰启动，减少并发冲击
-    time.sleep(chunk_index * 1.5)
+
+def _output_size(path: str) -> int:
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def _render_chunk_worker(args):
+    """使用 CDP (Page.captureScreenshot) 进行渲染。页面来自当前进程的常驻浏览器池。"""
+    chunk_index, start_frame, end_frame, lang_code, date_str = args[:5]
+    with tracing.span("render.chunk", engine='browser', lang=lang_code, date=date_str, chunk=chunk_index,
+                      frames=end_frame - start_frame, checkpoint=args[10] is not None) as s:
+        ok = _render_chunk(args)
+        s.set(ok=ok, bytes=_output_size(args[8]))
+    return ok
+
+
+def _render_chunk(args):
+    (chunk_index, start_frame, end_frame, lang_code, date_str, prev_date_str,
+     base_url, config_data, chunk_output_path, pre_roll_frames, checkpoint, capture_format, data_url,
+     profile) = args
 
     os.makedirs(os.path.dirname(chunk_output_path), exist_ok=True)
 
     real_width = int(VIDEO_WIDTH * VIDEO_SCALE)
     real_height = int(VIDEO_HEIGHT * VIDEO_SCALE)
-
-    # FFMPEG: 从 stdin 读取 MJPEG 流
-    ffmpeg_cmd = ['ffmpeg', '-y', '-f', 'image2pipe', '-vcodec', 'mjpeg', '-r', str(VIDEO_FPS), '-i', '-',
-                  '-c:v', 'libx264', '-preset', 'fast', '-crf', '18',
-                  '-vf', f'fps={VIDEO_FPS},scale={real_width}:{real_height}:flags=lanczos',
+    screenshot_params, input_args = _capture_params(capture_format, real_width, real_height)
+    # 预览预设：页面仍按正式分辨率截图，由 FFmpeg 缩放；只采集每 frame_step 帧
+    frame_step = profile['frame_step']
+    output_fps = VIDEO_FPS / frame_step
+    output_width = int(VIDEO_WIDTH * profile['scale'])
+    output_height = int(VIDEO_HEIGHT * profile['scale'])
+
+    # FFMPEG: 从 stdin 读取帧流 (MJPEG / PNG / rgb24 原始像素)
+    ffmpeg_cmd = ['ffmpeg', '-y', *input_args, '-r', str(output_fps), '-i', '-',
+                  '-c:v', 'libx264', '-preset', profile['preset'], '-crf', str(profile['crf']),
+                  '-vf', f'fps={output_fps},scale={output_width}:{output_height}:flags=lanczos',
                   '-pix_fmt', 'yuv420p', chunk_output_path]
 
     proc = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # 解码与写入在后台线程进行，与浏览器截图重叠
+    writer = FrameWriter(proc.stdin, decode=lambda data: _decode_frame(base64.b64decode(data), capture_format))
+    capture_seconds = 0.0
 
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True, args=['--disable-web-security', '--allow-file-access-from-files',
-                                                             '--hide-scrollbars', '--mute-audio', '--disable-gpu'])
-
-            page = browser.new_page(
-                viewport=cast(ViewportSize, {'width': VIDEO_WIDTH, 'height': VIDEO_HEIGHT}),
-                device_scale_factor=VIDEO_SCALE
-            )
-
-            # 注入数据
-            page.add_init_script(script=f"window.INJECTED_DATA = {json.dumps(history_data, ensure_ascii=False)};")
-            page.add_init_script(script=f"window.INJECTED_CONFIG = {json.dumps(config_data, ensure_ascii=False)};")
+        page, client = browser_pool.acquire_page(lang_code, base_url, date_str, prev_date_str, config_data, data_url)
 
-            page.goto(base_url)
-            page.wait_for_function("window.appReady === true", timeout=20000)
-
-            # 初始化位置
+        # 初始化位置：优先从精确检查点恢复 (无需预渲染)，否则预渲染近似
+        if checkpoint is not None:
+            page.evaluate("snapshot => window.importState(snapshot)", checkpoint)
+        else:
             page.evaluate(f"window.initializeToFrame({start_frame}, {pre_roll_frames})")
 
-            # ================= CDP Direct Access Setup =================
-            client = page.context.new_cdp_session(page)
-
-            # 循环渲染每一帧
-            for i in range(start_frame, end_frame):
-                # 1. 推进模拟时间 (同步 JS 调用，确保 DOM 更新)
+        # 循环渲染每一帧 (start_frame 为 frame_step 的整数倍)
+        for i in range(start_frame, end_frame, frame_step):
+            start = time.perf_counter()
+            # 1. 推进模拟时间 (同步 JS 调用，确保 DOM 更新)；预览时一次推进 frame_step 帧
+            if frame_step == 1:
                 page.evaluate("window.advanceFrame()")
+            else:
+                page.evaluate("n => { for (let k = 0; k < n; k++) window.advanceFrame(); }",
+                              min(frame_step, end_frame - i))
 
-                # 2. 调用 CDP 截图
-                res = client.send("Page.captureScreenshot", {
-                    "format": "jpeg",
-                    "quality": 90,
-                    "optimizeForSpeed": True  # 实验性参数：尝试优化速度
-                })
+            # 2. 调用 CDP 截图
+            res = client.send("Page.captureScreenshot", screenshot_params)
+            capture_seconds += time.perf_counter() - start
 
-                # 3. 解码并写入 FFmpeg
-                data = base64.b64decode(res['data'])
-                proc.stdin.write(data)
+            # 3. 交给写入线程解码并写入 FFmpeg (队列满时阻塞)
+            writer.put(res['data'])
 
-            client.detach()
-            browser.close()
+        writer.close()
+        print(writer.summary(capture_seconds, f"Chunk {chunk_index}"))
 
     except Exception as e:
         print(f"  [Chunk {chunk_index}] Worker error: {e}")
+        browser_pool.discard_page()
         return False
     finally:
+        writer.stop()
         if proc.stdin:
             try:
                 proc.stdin.close()
@@ -243,75 +286,222 @@ def _render_chunk_worker(args):
     return proc.returncode == 0 and os.path.exists(chunk_output_path)
 
 
-def render_day_segment_parallel(date_str, prev_date_str, lang_code, history_data, config_data, final_segment_path):
+def _checkpoint_worker(args):
+    """
+    在常驻页面中以无 DOM 模式模拟整日，返回各分块起始帧的状态检查点 {帧号: 状态}。
+    """
+    lang_code, date_str, prev_date_str, base_url, config_data, start_frames, pre_roll_frames, data_url = args
+    try:
+        page, _ = browser_pool.acquire_page(lang_code, base_url, date_str, prev_date_str, config_data, data_url)
+        checkpoints = page.evaluate("([frames, preRoll]) => window.computeCheckpoints(frames, preRoll)",
+                                    [start_frames, pre_roll_frames])
+    except Exception:
+        browser_pool.discard_page()
+        raise
+    return {int(frame): snapshot for frame, snapshot in checkpoints.items()}
+
+
+# 每个进程内按引擎缓存的渲染进程数，避免可用内存的小幅波动导致常驻进程池被重建
+_worker_counts: Dict[str, int] = {}
+
+
+def _render_worker_count(engine: str) -> int:
+    """根据 CPU 核数与可用内存估算渲染进程数"""
+    if engine not in _worker_counts:
+        cpu = os.cpu_count() or 2
+        per_worker = VIDEO_WORKER_MEMORY_MB.get(engine, 500)
+        memory = available_memory_mb()
+        by_memory = int(memory // per_worker) if memory else cpu
+        _worker_counts[engine] = max(1, min(cpu, by_memory, VIDEO_MAX_RENDER_WORKERS))
+        print(f"  Render workers [{engine}]: {_worker_counts[engine]} "
+              f"(cpu {cpu}, available memory {memory:.0f}MB / {per_worker}MB per worker)")
+    return _worker_counts[engine]
+
+
+def _run_chunk_tasks(tasks, worker_fn, get_executor, reset_executor=None) -> list:
+    """
+    将所有分块一次性提交到共享进程池：空闲进程自动领取下一个分块。
+    失败的分块立即单独重新提交 (最多 VIDEO_CHUNK_MAX_ATTEMPTS 次)；进程池崩溃时重建后重新提交。
+    返回最终仍失败的分块参数列表。
+    """
+    attempts = {t[0]: 1 for t in tasks}
+    executor = get_executor()
+    pending = {executor.submit(worker_fn, t): t for t in tasks}
+    failed = []
+
+    while pending:
+        done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        resubmit = []
+        restarted = False
+        for future in done:
+            # 进程池崩溃时同一批完成的其余分块已被整体取出重新提交
+            task_args = pending.pop(future, None)
+            if task_args is None:
+                continue
+            try:
+                if future.result():
+                    continue
+                print(f"  Chunk {task_args[0]} failed.")
+            except concurrent.futures.BrokenExecutor as e:
+                # 进程池已不可用：其余未完成的分块同样会失败，统一重建后重新提交 (不计入尝试次数)
+                if not restarted:
+                    print(f"  Render pool broken ({e}), restarting...")
+                    if reset_executor:
+                        reset_executor()
+                    executor = get_executor()
+                    restarted = True
+                resubmit.append(task_args)
+                for other in list(pending):
+                    resubmit.append(pending.pop(other))
+                continue
+            except Exception as e:
+                print(f"  Chunk {task_args[0]} execution resulted in an exception: {e}")
+
+            if attempts[task_args[0]] < VIDEO_CHUNK_MAX_ATTEMPTS:
+                attempts[task_args[0]] += 1
+                print(f"  Retrying chunk {task_args[0]} (Attempt {attempts[task_args[0]]}/{VIDEO_CHUNK_MAX_ATTEMPTS})...")
+                resubmit.append(task_args)
+            else:
+                failed.append(task_args)
+
+        for task_args in resubmit:
+            pending[executor.submit(worker_fn, task_args)] = task_args
+
+    return failed
+
+
+def render_day_segment_parallel(date_str, prev_date_str, lang_code, config_data, final_segment_path,
+                                engine=VIDEO_RENDER_ENGINE, slice_dir=None, profile='production', frame_range=None,
+                                preview=False):
     """
     分块并行渲染单日视频。
+    - engine: 'browser' 使用无头 Chromium 截图；'native' 使用 native_renderer 直接绘制。
+    - slice_dir: 已写好的渲染切片目录 (渲染农场由协调端提供)；为 None 时从本地历史存储生成。
+    - profile: 渲染预设名 (config.VIDEO_PROFILES)；frame_range: 只渲染当日 [起始帧, 结束帧) 区间。
+    - preview: 预览渲染，临时文件放在 videos/temp/drafts/ 下，与正式渲染互不影响。
+    整日切分为 VIDEO_CHUNK_FRAMES 帧的小分块，各分块从其起点的精确模拟状态 (检查点) 开始渲染，
+    因此分块数量与进程数无关，拼接后与连续渲染逐帧一致。
+    返回 (是否成功, 是否精确)：浏览器引擎缺少检查点时分块退回预渲染，结果只是近似，不应按精确输入缓存。
     """
-    print(f"  Rendering {date_str} (pre-roll from {prev_date_str or 'start'}) (Parallel/CDP)...")
+    print(f"  Rendering {date_str} (pre-roll from {prev_date_str or 'start'}) (Parallel/{engine}/{profile})...")
+    profile_config = VIDEO_PROFILES[profile]
+
+    temp_name = f"{date_str}_{lang_code}"
+    if profile != 'production':
+        temp_name += f"_{profile}"
+    if frame_range:
+        temp_name += f"_{frame_range[0]}-{frame_range[1]}"
+    temp_dir = os.path.join(VIDEO_DIR, "temp", "drafts" if preview else "", temp_name)
+    os.makedirs(temp_dir, exist_ok=True)
+
+    # 渲染切片：只含该日所需曲线的小型只读数据目录，各进程内存映射 / 页面直接加载，不经任务参数传递
+    if slice_dir is None:
+        slice_dir = write_segment_slice(lang_code, date_str, prev_date_str, os.path.join(temp_dir, "slice"))
+    data_url = pathlib.Path(slice_dir).resolve().as_uri()
 
     html_file = os.path.join(DOCS_DIR, 'index.html')
     html_path = pathlib.Path(html_file).as_uri()
-    base_url = f"{html_path}?lang={lang_code}&mode=capture&date={date_str}"
+    base_url = f"{html_path}?lang={lang_code}&mode=capture&date={date_str}&data={urllib.parse.quote(data_url)}"
     if prev_date_str:
         base_url += f"&prev_date={prev_date_str}"
 
-    workers = 2
-    chunk_duration_frames = VIDEO_TOTAL_FRAMES_PER_DAY // workers
-    pre_roll_frames = int(chunk_duration_frames * VIDEO_PRE_ROLL_FACTOR)
+    workers = _render_worker_count(engine)
+    # 分块起点对齐到 frame_step 的整数倍，各分块采集的帧在整日中的位置与连续渲染一致
+    frame_step = profile_config['frame_step']
+    first_frame, last_frame = frame_range or (0, VIDEO_TOTAL_FRAMES_PER_DAY)
+    first_frame = max(0, first_frame - first_frame % frame_step)
+    last_frame = min(last_frame, VIDEO_TOTAL_FRAMES_PER_DAY)
+    chunk_frames = max(frame_step, VIDEO_CHUNK_FRAMES - VIDEO_CHUNK_FRAMES % frame_step)
+    chunk_starts = list(range(first_frame, last_frame, chunk_frames))
+
+    # 先计算各分块起点的精确状态 (一次无绘制的整日模拟)
+    checkpoints = {}
+    if engine == 'native':
+        import native_renderer
+        worker_fn = native_renderer.render_chunk_worker
+        # 原生引擎无需预热，按段创建进程池；缺少检查点时分块自行从日初快进
+        native_executor = None
+
+        def get_executor():
+            nonlocal native_executor
+            if native_executor is None:
+                native_executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+            return native_executor
+
+        def reset_executor():
+            nonlocal native_executor
+            if native_executor is not None:
+                native_executor.shutdown(wait=False, cancel_futures=True)
+                native_executor = None
 
-    initial_tasks = []
+        try:
+            with tracing.span("render.checkpoints", engine=engine, lang=lang_code, date=date_str,
+                              chunks=len(chunk_starts)):
+                checkpoints = native_renderer.compute_checkpoints(lang_code, date_str, prev_date_str, config_data,
+                                                                  chunk_starts, slice_dir)
+        except Exception as e:
+            print(f"  Warning: Could not compute checkpoints ({e}), chunks will fast-forward.")
+    else:
+        # 浏览器引擎使用常驻进程池 (进程内浏览器跨分块、日期和语言复用)；检查点失败时退回逐块预渲染
+        worker_fn = _render_chunk_worker
+        get_executor = lambda: browser_pool.get_executor(workers)
+        reset_executor = browser_pool.reset_executor
+        native_executor = None
+        try:
+            with tracing.span("render.checkpoints", engine=engine, lang=lang_code, date=date_str,
+                              chunks=len(chunk_starts)):
+                future = get_executor().submit(
+                    _checkpoint_worker,
+                    (lang_code, date_str, prev_date_str, base_url, config_data, chunk_starts, VIDEO_PRE_ROLL_FRAMES,
+                     data_url))
+                checkpoints = future.result()
+        except Exception as e:
+            print(f"  Warning: Could not compute checkpoints ({e}), falling back to pre-roll.")
+
+    tasks = []
     chunk_files = []
-    temp_dir = os.path.join(VIDEO_DIR, "temp", f"{date_str}_{lang_code}")
-    os.makedirs(temp_dir, exist_ok=True)
 
-    for i in range(workers):
-        start = i * chunk_duration_frames
-        end = (i + 1) * chunk_duration_frames if i < workers - 1 else VIDEO_TOTAL_FRAMES_PER_DAY
-        chunk_path = os.path.join(temp_dir, f"chunk_{i}.mp4")
+    for i, start in enumerate(chunk_starts):
+        end = min(start + chunk_frames, last_frame)
+        chunk_path = os.path.join(temp_dir, f"chunk_{i:04d}.mp4")
         chunk_files.append(chunk_path)
-        args = (i, start, end, base_url, history_data, config_data, chunk_path, pre_roll_frames)
-        initial_tasks.append(args)
-
-    tasks_to_run = initial_tasks
-    max_attempts = 3
-    attempt = 0
-    all_chunks_succeeded = False
-
-    while attempt < max_attempts and not all_chunks_succeeded:
-        attempt += 1
-        if attempt > 1:
-            print(f"  Retrying {len(tasks_to_run)} failed chunks (Attempt {attempt}/{max_attempts})...")
-
-        failed_tasks = []
-        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
-            future_to_task = {executor.submit(_render_chunk_worker, t): t for t in tasks_to_run}
-            for future in concurrent.futures.as_completed(future_to_task):
-                task_args = future_to_task[future]
-                try:
-                    if not future.result():
-                        failed_tasks.append(task_args)
-                except Exception as e:
-                    print(f"  Chunk {task_args[0]} execution resulted in an exception: {e}")
-                    failed_tasks.append(task_args)
-
-        if not failed_tasks:
-            all_chunks_succeeded = True
+        if engine == 'native':
+            args = (i, start, end, date_str, prev_date_str, lang_code, config_data, chunk_path,
+                    checkpoints.get(start), slice_dir, profile_config)
         else:
-            tasks_to_run = failed_tasks
+            args = (i, start, end, lang_code, date_str, prev_date_str, base_url, config_data, chunk_path,
+                    VIDEO_PRE_ROLL_FRAMES, checkpoints.get(start), VIDEO_CAPTURE_FORMAT, data_url, profile_config)
+        tasks.append(args)
 
-    if not all_chunks_succeeded:
-        print(f"  Error: {len(tasks_to_run)} chunks failed to render after {max_attempts} attempts.")
-        return False
+    # 原生引擎缺少检查点时从日初精确快进；浏览器引擎退回预渲染，结果与精确渲染不同
+    exact = engine == 'native' or all(start in checkpoints for start in chunk_starts)
+    if not exact:
+        print(f"  Warning: Segment {date_str} is rendered from an approximate pre-roll and will not be cached.")
+
+    print(f"  Scheduling {len(tasks)} chunks of {chunk_frames} frames on {workers} workers")
+    try:
+        with tracing.span("render.chunks", engine=engine, lang=lang_code, date=date_str, chunks=len(tasks),
+                          workers=workers, frames=last_frame - first_frame):
+            failed_tasks = _run_chunk_tasks(tasks, worker_fn, get_executor, reset_executor)
+    finally:
+        if native_executor is not None:
+            native_executor.shutdown(wait=True)
+
+    if failed_tasks:
+        print(f"  Error: {len(failed_tasks)} chunks failed to render after {VIDEO_CHUNK_MAX_ATTEMPTS} attempts.")
+        return False, exact
 
     concat_list_path = os.path.join(temp_dir, "concat_chunks.txt")
     with open(concat_list_path, 'w') as f:
         for cf in chunk_files:
             f.write(f"file '{os.path.abspath(cf).replace('\\', '/')}'\n")
 
-    print(f"  Merging {workers} chunks -> {os.path.basename(final_segment_path)}")
+    print(f"  Merging {len(chunk_files)} chunks -> {os.path.basename(final_segment_path)}")
     os.makedirs(os.path.dirname(final_segment_path), exist_ok=True)
     cmd = f'ffmpeg -y -f concat -safe 0 -i "{concat_list_path}" -c copy "{final_segment_path}"'
-    ret = subprocess.call(cmd, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with tracing.span("ffmpeg.concat_chunks", lang=lang_code, date=date_str, inputs=len(chunk_files)) as s:
+        ret = subprocess.call(cmd, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        s.set(bytes=_output_size(final_segment_path))
 
     if ret == 0:
         import shutil
@@ -320,7 +510,7 @@ def render_day_segment_parallel(date_str, prev_date_str, lang_code, history_data
         except OSError:
             pass
 
-    return ret == 0
+    return ret == 0, exact
 
 
 # --- 音频处理 ---
@@ -390,72 +580,181 @@ def add_background_music(video_path: str, output_path: str) -> str:
 
 # --- 主渲染流程 ---
 
-def render_video(date_str, lang_code, config) -> Optional[str]:
+# --- 分段缓存 ---
+# 每个单日 segment 旁存放 segment_{date}.key.json，记录渲染它时各项输入的哈希。
+# 只有输入 (当日与前一日的分片、该语言的阈值配置、前端资源、视频参数、渲染引擎) 全部一致时才复用，
+# 否则重新渲染。
+
+def _hash_files(paths) -> str:
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(os.path.relpath(path, DOCS_DIR).replace('\\', '/').encode('utf-8'))
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _render_assets_hash(engine: str) -> str:
+    """渲染所用代码的哈希：浏览器引擎为 index.html 与 docs/js、docs/css；原生引擎另含 native_renderer.py"""
+    paths = [os.path.join(DOCS_DIR, 'index.html')]
+    for sub_dir in ('js', 'css'):
+        for root, _, files in os.walk(os.path.join(DOCS_DIR, sub_dir)):
+            paths.extend(os.path.join(root, name) for name in files)
+    if engine == 'native':
+        paths.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'native_renderer.py'))
+    return _hash_files([p for p in paths if os.path.exists(p)])
+
+
+def _segment_inputs(d_str, prev_d_str, lang_code, config_data, engine, assets_hash,
+                    profile='production', frame_range=None) -> Dict[str, Any]:
+    """收集决定单日 segment 内容的全部输入 (曲线哈希覆盖预渲染日、目标日及其前后各一天)"""
+    history = segment_curve_hashes(lang_code, d_str, prev_d_str)
+    return {
+        "history": history,
+        "config": {"baseThreshold": config_data.get('baseThreshold'),
+                   "scalingFactor": config_data.get('scalingFactors', {}).get(lang_code)},
+        "assets": assets_hash,
+        "video": {"engine": engine, "fps": VIDEO_FPS, "frames": VIDEO_TOTAL_FRAMES_PER_DAY,
+                  "width": VIDEO_WIDTH, "height": VIDEO_HEIGHT, "scale": VIDEO_SCALE,
+                  "pre_roll": VIDEO_PRE_ROLL_FRAMES,
+                  "capture": VIDEO_CAPTURE_FORMAT if engine != 'native' else 'rawvideo',
+                  "profile": VIDEO_PROFILES[profile], "frame_range": list(frame_range) if frame_range else None},
+    }
+
+
+def _segment_key_path(seg_path: str) -> str:
+    return os.path.splitext(seg_path)[0] + ".key.json"
+
+
+def _segment_cache_status(seg_path: str, inputs: Dict[str, Any], allow_approximate: bool = False) -> Optional[str]:
+    """
+    返回缓存未命中的原因，命中时返回 None。
+    近似渲染 (预渲染代替检查点) 的 segment 只在本次运行中使用 (allow_approximate)，之后总是重新渲染。
+    """
+    if not os.path.exists(seg_path):
+        return "missing"
+    try:
+        with open(_segment_key_path(seg_path), 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return "no cache key"
+    if cached.get("approximate") and not allow_approximate:
+        return "approximate render"
+    changed = [name for name, value in inputs.items() if cached.get(name) != value]
+    return f"{', '.join(changed)} changed" if changed else None
+
+
+def _write_segment_key(seg_path: str, inputs: Dict[str, Any], exact: bool = True):
+    key = inputs if exact else {**inputs, "approximate": True}
+    with open(_segment_key_path(seg_path), 'w', encoding='utf-8') as f:
+        json.dump(key, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+def _render_segments_locally(jobs, lang_code, config, engine, profile='production', frame_range=None,
+                             preview=False):
+    """在本机依次渲染需要更新的 segment，成功后写入缓存键"""
+    for job in jobs:
+        with tracing.span("render.segment", engine=engine, lang=lang_code, date=job["date"], profile=profile) as s:
+            ok, exact = render_day_segment_parallel(job["date"], job["prev_date"], lang_code, config, job["path"],
+                                                    engine, profile=profile, frame_range=frame_range,
+                                                    preview=preview)
+            s.set(ok=ok, exact=exact, bytes=_output_size(job["path"]))
+        if ok:
+            _write_segment_key(job["path"], job["inputs"], exact)
+        else:
+            print(f"  Failed to render segment {job['date']}")
+
+
+def render_video(date_str, lang_code, config, engine=None, farm_dir=None,
+                 profile='production', days=None, frame_range=None) -> Optional[str]:
     """
     主入口。渲染并拼接 5 天的视频，并添加背景音乐。
+    - engine: 渲染引擎 ('browser' 或 'native')，默认使用 VIDEO_RENDER_ENGINE。
+    - farm_dir: 渲染农场目录；给定时需要更新的 segment 作为任务放入农场队列，由任意数量的 worker 渲染。
+    - profile: 渲染预设 (config.VIDEO_PROFILES)，'draft' 用于快速预览。
+    - days: 只渲染其中的这些日期；frame_range: 每天只渲染 [起始帧, 结束帧) 区间。
+    预览 (非 production 预设，或指定了 days / frame_range) 输出到 videos/drafts/，与正式视频及其缓存互不影响。
     """
     ensure_dirs()
-    final_output = os.path.join(VIDEO_DIR, f"{date_str}_{lang_code}.mp4")
-    print(f"Starting High-Performance Browser Render for {date_str} ({lang_code})...")
-
-    history_data = load_history(lang_code)
+    engine = engine or VIDEO_RENDER_ENGINE
+    preview = profile != 'production' or bool(days) or frame_range is not None
+    output_dir = os.path.join(VIDEO_DIR, "drafts") if preview else VIDEO_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    final_output = os.path.join(output_dir, f"{date_str}_{lang_code}.mp4")
+    print(f"Starting High-Performance {engine.capitalize()} Render for {date_str} ({lang_code})"
+          f"{f' [preview: {profile}]' if preview else ''}...")
+
+    # 渲染页面自行读取分片，这里只需要保留窗口内的日期列表
+    history_data = load_history(lang_code, dates=[])
     if not history_data['dates']:
         print("No history data found.")
         return None
 
     today_date = datetime.strptime(date_str, "%Y-%m-%d")
     dates_to_render = [(today_date - timedelta(days=4 - i)).strftime("%Y-%m-%d") for i in range(5)]
+    if days:
+        dates_to_render = [d for d in dates_to_render if d in days]
     segment_files = []
+    jobs = []
 
-    # 检查最新的 segment (即昨天的 segment) 是否已存在。
-    latest_date_str = dates_to_render[-1]
-    latest_segment_path = os.path.join(VIDEO_DIR, latest_date_str, lang_code, f"segment_{latest_date_str}.mp4")
-
-    all_required_paths = [os.path.join(VIDEO_DIR, d, lang_code, f"segment_{d}.mp4") for d in dates_to_render]
-
-    if os.path.exists(latest_segment_path) and all(os.path.exists(p) for p in all_required_paths):
-        print(
-            f"  Latest segment for {lang_code} ({os.path.basename(latest_segment_path)}) already exists. Skipping render loop.")
-        segment_files = all_required_paths
-    else:
-        for i, d_str in enumerate(dates_to_render):
-            prev_d_str = None
-            if i > 0:
-                prev_d_str = dates_to_render[i - 1]
-            else:
-                current_obj = datetime.strptime(d_str, "%Y-%m-%d")
-                prev_obj = current_obj - timedelta(days=1)
-                prev_check_str = prev_obj.strftime("%Y-%m-%d")
-                if prev_check_str in history_data['dates']:
-                    prev_d_str = prev_check_str
+    assets_hash = _render_assets_hash(engine)
 
-            seg_dir = str(os.path.join(VIDEO_DIR, d_str, lang_code))
-            seg_path = os.path.join(seg_dir, f"segment_{d_str}.mp4")
-
-            force_render = (d_str >= (today_date - timedelta(days=2)).strftime("%Y-%m-%d")) or not os.path.exists(seg_path)
-
-            if d_str not in history_data['dates']:
-                print(f"  Warning: No data for {d_str}, skipping.")
-                continue
-            if force_render and prev_d_str and prev_d_str not in history_data['dates']:
-                print(f"  Warning: No pre-roll data for {prev_d_str}, skipping render of {d_str}.")
-                continue
-
-            if force_render:
-                success = render_day_segment_parallel(d_str, prev_d_str, lang_code, history_data, config, seg_path)
-                if not success:
-                    print(f"  Failed to render segment {d_str}")
-            else:
-                print(f"  Using cached segment for {d_str}")
-
-            if os.path.exists(seg_path):
-                segment_files.append(seg_path)
+    for i, d_str in enumerate(dates_to_render):
+        prev_d_str = None
+        if i > 0:
+            prev_d_str = dates_to_render[i - 1]
+        else:
+            current_obj = datetime.strptime(d_str, "%Y-%m-%d")
+            prev_obj = current_obj - timedelta(days=1)
+            prev_check_str = prev_obj.strftime("%Y-%m-%d")
+            if prev_check_str in history_data['dates']:
+                prev_d_str = prev_check_str
+
+        seg_dir = str(os.path.join(output_dir, d_str, lang_code))
+        seg_path = os.path.join(seg_dir, f"segment_{d_str}.mp4")
+
+        if d_str not in history_data['dates']:
+            print(f"  Warning: No data for {d_str}, skipping.")
+            continue
+
+        inputs = _segment_inputs(d_str, prev_d_str, lang_code, config, engine, assets_hash, profile, frame_range)
+        miss_reason = _segment_cache_status(seg_path, inputs)
+
+        if miss_reason is None:
+            print(f"  Using cached segment for {d_str}")
+        elif prev_d_str and prev_d_str not in history_data['dates']:
+            print(f"  Warning: No pre-roll data for {prev_d_str}, skipping render of {d_str}.")
+            continue
+        else:
+            print(f"  Segment {d_str} needs rendering ({miss_reason}).")
+            # 先移除旧的视频与缓存键，渲染失败时不会把旧视频拼进成品
+            for path in (seg_path, _segment_key_path(seg_path)):
+                if os.path.exists(path):
+                    os.remove(path)
+            jobs.append({"date": d_str, "prev_date": prev_d_str, "path": seg_path, "inputs": inputs})
+        segment_files.append((d_str, seg_path, inputs))
+
+    if jobs and farm_dir and not preview:
+        import render_farm
+        render_farm.render_segments(farm_dir, jobs, lang_code, config, engine)
+    elif jobs:
+        _render_segments_locally(jobs, lang_code, config, engine, profile, frame_range, preview)
+
+    # 只拼接缓存键与本次输入一致的 segment (本地或农场渲染失败的日期被跳过；本次的近似渲染照常使用)
+    rendered = []
+    for d_str, seg_path, inputs in segment_files:
+        miss_reason = _segment_cache_status(seg_path, inputs, allow_approximate=True)
+        if miss_reason is None:
+            rendered.append(seg_path)
+        else:
+            print(f"  Warning: Segment {d_str} is not up to date ({miss_reason}), leaving it out of the video.")
+    segment_files = rendered
 
     if not segment_files:
         print("No segments generated.")
         return None
 
-    temp_dir = os.path.join(VIDEO_DIR, "temp", f"final_{date_str}_{lang_code}")
+    temp_dir = os.path.join(VIDEO_DIR, "temp", f"final_{date_str}_{lang_code}{'_preview' if preview else ''}")
     os.makedirs(temp_dir, exist_ok=True)
     list_file = os.path.join(temp_dir, "concat_final.txt")
 
@@ -464,16 +763,20 @@ def render_video(date_str, lang_code, config) -> Optional[str]:
             f.write(f"file '{os.path.abspath(seg).replace('\\', '/')}'\n")
 
     video_only_path = os.path.join(temp_dir, 'video_no_audio.mp4')
-    print("Concatenating 5 days into a temporary video file...")
+    print(f"Concatenating {len(segment_files)} days into a temporary video file...")
     cmd_concat = f'ffmpeg -y -f concat -safe 0 -i "{list_file}" -c copy "{video_only_path}"'
-    subprocess.call(cmd_concat, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with tracing.span("ffmpeg.concat_days", lang=lang_code, date=date_str, inputs=len(segment_files)) as s:
+        subprocess.call(cmd_concat, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        s.set(bytes=_output_size(video_only_path))
 
     if not os.path.exists(video_only_path):
         print("  Error: Failed to create temporary concatenated video.")
         return None
 
     # 添加背景音乐
-    final_video_with_music = add_background_music(video_only_path, final_output)
+    with tracing.span("ffmpeg.mix_music", lang=lang_code, date=date_str) as s:
+        final_video_with_music = add_background_music(video_only_path, final_output)
+        s.set(bytes=_output_size(final_video_with_music))
 
     # 清理临时目录
     import shutil
@@ -0,0 +1,74 @@
+# src/benchmark_capture.py
+
+import os
+import sys
+import time
+import shutil
+import pathlib
+import json
+import argparse
+import tempfile
+
+import animator
+import browser_pool
+from config import DOCS_DIR, CONFIG_JSON_PATH, VIDEO_PROFILES
+from history_store import load_history
+
+# 帧传输基准：对同一段帧区间，分别用不同的传输格式渲染单个分块，比较每秒帧数。
+# 用法: python src/benchmark_capture.py --lang en --frames 300 --formats jpeg png rawvideo
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark browser frame transport formats")
+    parser.add_argument('--lang', default='en', help="语言代码")
+    parser.add_argument('--date', default=None, help="渲染日期 (默认为历史窗口中的最后一天)")
+    parser.add_argument('--frames', type=int, default=300, help="每种格式渲染的帧数")
+    parser.add_argument('--formats', nargs='+', default=['jpeg', 'png', 'rawvideo'],
+                        choices=['jpeg', 'png', 'rawvideo'], help="参与比较的传输格式")
+    return parser.parse_args()
+
+
+def main(args):
+    dates = load_history(args.lang, dates=[])['dates']
+    if not dates:
+        print(f"No history data found for {args.lang}.")
+        return 1
+    date_str = args.date or dates[-1]
+
+    html_path = pathlib.Path(os.path.join(DOCS_DIR, 'index.html')).as_uri()
+    base_url = f"{html_path}?lang={args.lang}&mode=capture&date={date_str}"
+    with open(CONFIG_JSON_PATH, 'r', encoding='utf-8') as f:
+        config_data = json.load(f)
+
+    # 预热常驻浏览器与页面，使各格式的计时只包含逐帧渲染
+    browser_pool.acquire_page(args.lang, base_url, date_str, None, config_data)
+
+    temp_dir = tempfile.mkdtemp(prefix="capture_bench_")
+    results = []
+    try:
+        for capture_format in args.formats:
+            output_path = os.path.join(temp_dir, f"{capture_format}.mp4")
+            task = (0, 0, args.frames, args.lang, date_str, None, base_url, config_data, output_path, 0, None, capture_format,
+                    None, VIDEO_PROFILES['production'])
+
+            start = time.perf_counter()
+            ok = animator._render_chunk_worker(task)
+            elapsed = time.perf_counter() - start
+
+            size = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+            results.append((capture_format, ok, elapsed, size))
+            print(f"  {capture_format}: {'ok' if ok else 'FAILED'} in {elapsed:.1f}s")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        browser_pool.shutdown()
+
+    print(f"\nCapture benchmark: {args.frames} frames of {date_str} [{args.lang}]")
+    print(f"  {'format':<10} {'seconds':>8} {'fps':>8} {'output':>10}")
+    for capture_format, ok, elapsed, size in results:
+        fps = args.frames / elapsed if ok and elapsed else 0.0
+        print(f"  {capture_format:<10} {elapsed:>8.1f} {fps:>8.1f} {size / 1024:>8.0f}KB")
+    return 0 if all(ok for _, ok, _, _ in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,144 @@
+# src/browser_pool.py
+
+import json
+import concurrent.futures
+import multiprocessing
+import multiprocessing.util
+from typing import cast, Optional, Dict, Any
+from playwright.sync_api import sync_playwright, ViewportSize
+
+from config import VIDEO_WIDTH, VIDEO_HEIGHT, VIDEO_SCALE
+from history_store import history_version
+
+# 常驻浏览器池：
+# - 渲染进程池中的每个进程启动时预热一个 Chromium 与页面，在多个分块、日期和语言之间复用；
+#   同一语言且数据未变化时只切换录制目标，不重新加载页面。
+# 截图使用独立的异步浏览器，见 screenshots.py。
+
+BROWSER_ARGS = ['--disable-web-security', '--allow-file-access-from-files',
+                '--hide-scrollbars', '--mute-audio', '--disable-gpu']
+
+# 每个进程只能启动一个同步 Playwright 实例
+_playwright = None
+
+
+def _get_playwright():
+    global _playwright
+    if _playwright is None:
+        _playwright = sync_playwright().start()
+    return _playwright
+
+
+def _stop_playwright():
+    global _playwright
+    if _playwright is not None and _worker["browser"] is None:
+        try:
+            _playwright.stop()
+        except Exception:
+            pass
+        _playwright = None
+
+
+# --- 渲染进程侧 ---
+
+# 当前进程的常驻浏览器与页面
+_worker: Dict[str, Any] = {"browser": None, "page": None, "client": None, "key": None}
+
+
+def _launch_browser():
+    if _worker["browser"] is None:
+        _worker["browser"] = _get_playwright().chromium.launch(headless=True, args=BROWSER_ARGS)
+
+
+def _close_worker():
+    discard_page()
+    if _worker["browser"] is not None:
+        try:
+            _worker["browser"].close()
+        except Exception:
+            pass
+    _worker["browser"] = None
+    _stop_playwright()
+
+
+def _init_worker():
+    """进程池初始化：预热浏览器，并在进程退出时关闭"""
+    multiprocessing.util.Finalize(None, _close_worker, exitpriority=10)
+    try:
+        _launch_browser()
+    except Exception as e:
+        print(f"  Warning: Could not pre-launch browser: {e}")
+
+
+def acquire_page(lang_code: str, base_url: str, date_str: str, prev_date_str: Optional[str],
+                 config_data: Dict[str, Any], data_url: Optional[str] = None):
+    """
+    返回已就绪 (appReady) 的录制页面及其 CDP 会话，并切换到指定的录制目标。
+    - data_url: 该日渲染切片目录的 URL；为 None 时使用完整的历史数据目录。
+    语言或历史数据版本变化时才重新加载页面。
+    """
+    key = (lang_code, history_version(lang_code))
+    if _worker["page"] is None or _worker["key"] != key:
+        discard_page()
+        _launch_browser()
+        page = _worker["browser"].new_page(
+            viewport=cast(ViewportSize, {'width': VIDEO_WIDTH, 'height': VIDEO_HEIGHT}),
+            device_scale_factor=VIDEO_SCALE
+        )
+        # 注入配置 (历史数据由页面直接读取 docs/data 下的分片)
+        page.add_init_script(script=f"window.INJECTED_CONFIG = {json.dumps(config_data, ensure_ascii=False)};")
+        page.goto(base_url)
+        page.wait_for_function("window.appReady === true", timeout=20000)
+        _worker["page"] = page
+        _worker["client"] = page.context.new_cdp_session(page)
+        _worker["key"] = key
+
+    page = _worker["page"]
+    page.evaluate("([date, prevDate, config, dataUrl]) => window.setCaptureTarget(date, prevDate, config, dataUrl)",
+                  [date_str, prev_date_str, config_data, data_url])
+    return page, _worker["client"]
+
+
+def discard_page():
+    """丢弃当前页面 (出错后调用，下一个任务会重新创建)"""
+    page = _worker["page"]
+    _worker["page"] = _worker["client"] = _worker["key"] = None
+    if page is not None:
+        try:
+            page.close()
+        except Exception:
+            pass
+
+
+# --- 主进程侧 ---
+
+_executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+_executor_workers = 0
+
+
+def get_executor(workers: int) -> concurrent.futures.ProcessPoolExecutor:
+    """
+    返回常驻的渲染进程池 (惰性创建；进程数变化时重建)。
+    使用 spawn 启动方式，避免子进程继承主进程中的 Playwright 状态。
+    """
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != workers:
+        reset_executor()
+        _executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=_init_worker)
+        _executor_workers = workers
+    return _executor
+
+
+def reset_executor():
+    """关闭渲染进程池 (进程崩溃导致进程池不可用时调用，下次获取时重建)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+def shutdown():
+    """关闭渲染进程池，以及在主进程内直接调用渲染任务时启动的浏览器"""
+    reset_executor()
+    _close_worker()
@@ -12,11 +12,14 @@ PICTURES_DIR = os.path.join(BASE_DIR, "pictures")
 DATA_DIR = os.path.join(BASE_DIR, "data")
 MUSICS_DIR = os.path.join(BASE_DIR, "musics")
 CONFIG_JSON_PATH = os.path.join(DOCS_DIR, "config.json")
+SITEVIEWS_STORE_PATH = os.path.join(DATA_DIR, "siteviews.json")
 
 # ================= 基础配置 =================
 REPO_URL = "https://github.com/anonym-g/Attention"
 TWITTER_USERNAME = "trailblaziger"
 BASE_COLOR_SLOPE_THRESHOLD = 100.0
+# 计算放缩因子时使用的站点日浏览量滚动窗口 (天)
+SITEVIEWS_WINDOW_DAYS = 20
 SUPPORTED_MUSIC_EXTENSIONS = ['.flac', '.mp3', '.wav', '.m4a', '.ogg']
 
 # HTTP 头
@@ -24,6 +27,20 @@ HEADERS = {
     'User-Agent': 'Attention-Bot/3.0 (https://github.com/anonym-g/Attention)'
 }
 
+# ================= 网络配置 =================
+# 并发请求的最大线程数 (同时作为连接池大小)
+HTTP_MAX_WORKERS = 8
+# 超时 (连接, 读取) 秒数；429/5xx 与连接错误的最大重试次数及指数退避因子
+HTTP_TIMEOUT = (5, 30)
+HTTP_MAX_RETRIES = 5
+HTTP_BACKOFF_FACTOR = 1.0
+# Wikimedia REST API 客户端限速 (令牌桶)：每秒请求数与突发容量
+HTTP_RATE_LIMIT_PER_SEC = 25.0
+HTTP_RATE_LIMIT_BURST = 10
+# 磁盘 HTTP 缓存：历史日期的数据视为不可变，最新一天的数据使用短 TTL (秒)
+HTTP_CACHE_DIR = os.path.join(BASE_DIR, ".cache", "http")
+HTTP_CACHE_RECENT_TTL = 3600
+
 # ================= 视频生成配置 (Animator) =================
 VIDEO_FPS = 60
 VIDEO_SECONDS_PER_DAY = 24
@@ -31,13 +48,93 @@ VIDEO_TOTAL_FRAMES_PER_DAY = VIDEO_FPS * VIDEO_SECONDS_PER_DAY
 VIDEO_WIDTH = 1920
 VIDEO_HEIGHT = 1080
 VIDEO_SCALE = 1
-# 预渲染区间乘数因子：1.0 表示预渲染的长度等于一个并行块的长度
+# 预渲染区间乘数因子：1.0 表示预渲染半天 (从前一天正午开始模拟)。
+# 分块之间通过精确的状态检查点衔接，只有日初需要预渲染；检查点不可用时各分块同样预渲染半天 (近似结果，不写入缓存)
 VIDEO_PRE_ROLL_FACTOR = 1.0
+VIDEO_PRE_ROLL_FRAMES = int(VIDEO_TOTAL_FRAMES_PER_DAY // 2 * VIDEO_PRE_ROLL_FACTOR)
+# 渲染引擎：
+# 'browser' - 无头 Chromium 逐帧截图 (与网页完全一致)
+# 'native'  - Python 复现条形图模拟并用 Pillow 直接绘制，无需浏览器，速度快得多
+VIDEO_RENDER_ENGINE = 'browser'
+# 浏览器引擎的帧传输格式：
+# 'jpeg'     - CDP 返回 JPEG，FFmpeg 以 MJPEG 解码 (有损，且多一次编解码)
+# 'png'      - CDP 返回无损 PNG，FFmpeg 以 PNG 解码
+# 'rawvideo' - CDP 返回无损 PNG，由渲染进程解码为 rgb24 原始像素后以 rawvideo 写入 FFmpeg
+VIDEO_CAPTURE_FORMAT = 'rawvideo'
+# 采集与编码之间的有界帧队列长度 (背压：编码跟不上时采集端阻塞)
+VIDEO_FRAME_QUEUE_SIZE = 8
+# 渲染预设 (render_video 的 profile 参数)：
+# 'production' - 正式输出
+# 'draft'      - 快速预览：半分辨率、每 4 帧采集 1 帧 (15 fps)、低画质编码。
+#                模拟仍按 VIDEO_FPS 逐帧推进，预览中的每一帧与正式渲染的对应帧一致
+VIDEO_PROFILES = {
+    'production': {'scale': VIDEO_SCALE, 'frame_step': 1, 'preset': 'fast', 'crf': 18},
+    'draft': {'scale': 0.5, 'frame_step': 4, 'preset': 'ultrafast', 'crf': 32},
+}
+# 分块调度：每日视频切成许多小分块放入共享队列，空闲的渲染进程随取随做 (动态负载均衡)
+VIDEO_CHUNK_FRAMES = 120
+# 渲染进程数 = min(CPU 核数, 可用内存 / 单进程内存估算, 上限)
+VIDEO_MAX_RENDER_WORKERS = 8
+VIDEO_WORKER_MEMORY_MB = {'browser': 700, 'native': 250}
+# 单个分块的最大尝试次数 (失败的分块单独立即重试，不等待整轮结束)
+VIDEO_CHUNK_MAX_ATTEMPTS = 3
+
+# 历史数据存储模式：
+# 'minutes' - 保存每天 1440 个分钟采样 (uint32 二进制块)
+# 'spline'  - 仅保存 daily_raw 与每日 PCHIP 三次多项式系数，由前端按需求值 (结果与 'minutes' 逐位一致)
+HISTORY_STORAGE_MODE = 'minutes'
+
+# 历史数据保留分级：
+# 1. HISTORY_WINDOW_DAYS       - 保留分钟曲线 (前端可播放) 的日期数，更早的分片整体删除
+# 2. HISTORY_RAW_DAYS          - 保留 daily_raw 的最近天数 (重算 today-2 .. today 的插值需要 today-4 .. today)
+# 3. HISTORY_MAINTENANCE_DAYS  - 条目跌出 Top 列表后继续补齐浏览量、生成曲线的天数
+HISTORY_WINDOW_DAYS = 30
+HISTORY_RAW_DAYS = 5
+HISTORY_MAINTENANCE_DAYS = 7
+
+# ================= 渲染农场配置 =================
+# 农场目录由协调端与同一台机器上的各 worker 共享：SQLite 任务队列、渲染切片与 worker 上传的 segment。
+# 队列使用 SQLite WAL 模式，依赖本机共享内存，不能放在 NFS / SMB 等网络存储上 (多机需要独立的队列服务)
+RENDER_FARM_DIR = os.path.join(VIDEO_DIR, "farm")
+# 任务租约时长 (秒)：worker 按心跳间隔续约，租约过期的任务 (worker 崩溃或失联) 重新排队
+RENDER_FARM_LEASE_SECONDS = 120
+RENDER_FARM_HEARTBEAT_SECONDS = 30
+RENDER_FARM_MAX_ATTEMPTS = 3
+# 队列轮询间隔与协调端等待全部任务的最长时间 (秒)
+RENDER_FARM_POLL_SECONDS = 2
+RENDER_FARM_TIMEOUT = 3 * 3600
+# 超过该时长 (秒) 没有任何 worker 领取任务或续约时，协调端不再等待
+RENDER_FARM_WORKER_TIMEOUT = 3 * RENDER_FARM_LEASE_SECONDS
+
+# ================= 流水线配置 =================
+# main 中各阶段按资源池调度 (资源池: 并发数)：
+# network - Wikimedia 数据抓取与历史数据更新；browser - 截图与浏览器池关闭 (须为 1，Playwright 绑定线程)；
+# render  - 视频渲染 (内部已按 CPU 并行，多语言同时渲染只会互相争抢)
+PIPELINE_POOLS = {'network': 4, 'browser': 1, 'render': 1}
+
+# ================= 发布配置 =================
+# 各语言的媒体上传与处理状态轮询并发进行，推文仍按 LANG_CONFIG 顺序逐条发布
+TWITTER_UPLOAD_WORKERS = 4
+# 相邻两条推文的最小间隔 (秒)
+TWITTER_POST_INTERVAL = 5
+# 服务器未给出 check_after_secs 时的轮询退避 (初始, 上限) 秒数，以及视频处理的最长等待时间
+TWITTER_STATUS_BACKOFF = (1, 16)
+TWITTER_PROCESSING_TIMEOUT = 600
+# 设为 1 时使用 fake_twitter.py 中的本地假接口 (不访问 X，用于测试发布流程)
+TWITTER_FAKE = os.environ.get("TWITTER_FAKE") == "1"
+
+# ================= 追踪配置 =================
+# 每次运行的 Chrome trace 与汇总表写入 data/traces/，保留最近 TRACE_KEEP_RUNS 次 (history.jsonl 长期保留)
+TRACES_DIR = os.path.join(DATA_DIR, "traces")
+TRACE_KEEP_RUNS = 14
 
 # ================= 截图配置 =================
 BASE_VIEWPORT_WIDTH = 1920
 BASE_VIEWPORT_HEIGHT = 1080
 DEVICE_SCALE_FACTOR = 2
+SCREENSHOT_CONCURRENCY = 4  # 同时截图的语言数 (共用一个浏览器，各占一个页面)
+SCREENSHOT_TIMEOUT_MS = 15000  # 单个就绪信号的等待上限
+SCREENSHOT_SETTLE_POLL_MS = 150  # 图表稳定检测的轮询间隔
 
 # ================= 语言配置 =================
 LANG_CONFIG = [
@@ -0,0 +1,230 @@
+# src/fake_twitter.py
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import requests
+import tweepy
+from http import HTTPStatus
+from types import SimpleNamespace
+from typing import Optional, Dict, Any, List
+
+# 本地假 X 接口：在进程内模拟 media_upload / get_media_upload_status / create_tweet，
+# 包括按文件大小计时的上传、带 check_after_secs 的异步视频处理，以及对未就绪媒体和无效回复目标的校验。
+# 接口错误以 tweepy.errors 中对应的异常抛出 (带 response.status_code)，与真实客户端一致。
+# - 设置环境变量 TWITTER_FAKE=1 后 twitter_client 返回这里的对象，可离线跑通 main 的发布阶段；
+# - 直接运行本文件则用假数据演练一次发布，并检查推文串顺序与运行清单中的发布状态。
+# 用法: python src/fake_twitter.py --langs 7 --video-mb 8 --processing 6 --fail l2 --fail-video l4
+
+
+def api_error(status_code: int, message: str) -> tweepy.errors.HTTPException:
+    """构造与 tweepy 相同形状的接口错误 (BadRequest / Forbidden / TwitterServerError ...)"""
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = HTTPStatus(status_code).phrase
+    response._content = json.dumps({"errors": [{"message": message}]}).encode('utf-8')
+    error_types = {400: tweepy.errors.BadRequest, 401: tweepy.errors.Unauthorized, 403: tweepy.errors.Forbidden,
+                   404: tweepy.errors.NotFound, 429: tweepy.errors.TooManyRequests}
+    if status_code >= 500:
+        return tweepy.errors.TwitterServerError(response)
+    return error_types.get(status_code, tweepy.errors.HTTPException)(response)
+
+
+class FakeTwitterServer:
+    def __init__(self, upload_mb_per_sec: float = 20.0, processing_seconds: float = 6.0,
+                 check_after_secs: int = 1, fail_media: Optional[List[str]] = None,
+                 reject_tweets: Optional[List[str]] = None):
+        self.upload_mb_per_sec = upload_mb_per_sec
+        self.processing_seconds = processing_seconds
+        self.check_after_secs = check_after_secs
+        # 文件名包含其中任一字符串的视频处理失败
+        self.fail_media = fail_media or []
+        # 文本包含其中任一字符串的推文被拒绝 (403 Forbidden)
+        self.reject_tweets = reject_tweets or []
+        self.lock = threading.Lock()
+        self.media: Dict[int, Dict[str, Any]] = {}
+        self.tweets: List[Dict[str, Any]] = []
+        self.status_calls = 0
+        self._next_id = 1000
+
+    def _new_id(self) -> int:
+        with self.lock:
+            self._next_id += 1
+            return self._next_id
+
+    def upload(self, filename: str, media_category: Optional[str]) -> int:
+        size_mb = os.path.getsize(filename) / (1024 * 1024)
+        time.sleep(size_mb / self.upload_mb_per_sec)
+        media_id = self._new_id()
+        is_video = media_category == 'tweet_video'
+        with self.lock:
+            self.media[media_id] = {
+                "filename": filename,
+                "video": is_video,
+                "ready_at": time.monotonic() + (self.processing_seconds if is_video else 0),
+                "failed": is_video and any(s in filename for s in self.fail_media),
+            }
+        return media_id
+
+    def processing_info(self, media_id: int) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            media = self.media[media_id]
+        if not media["video"]:
+            return None
+        remaining = media["ready_at"] - time.monotonic()
+        if remaining <= 0:
+            if media["failed"]:
+                return {"state": "failed", "progress_percent": 100, "error": {"name": "InvalidMedia"}}
+            return {"state": "succeeded", "progress_percent": 100}
+        progress = int(100 * (1 - remaining / self.processing_seconds)) if self.processing_seconds else 100
+        return {"state": "in_progress", "progress_percent": progress,
+                "check_after_secs": max(1, min(self.check_after_secs, int(remaining + 0.999)))}
+
+    def create_tweet(self, text: str, media_ids: Optional[List[int]], in_reply_to_tweet_id: Optional[str]) -> str:
+        for media_id in media_ids or []:
+            info = self.processing_info(media_id) if media_id in self.media else {"state": "missing"}
+            if info is not None and info["state"] != "succeeded":
+                raise api_error(400, f"Media {media_id} is not ready ({info['state']})")
+        with self.lock:
+            if in_reply_to_tweet_id is not None and not any(t["id"] == in_reply_to_tweet_id for t in self.tweets):
+                raise api_error(400, f"Reply target {in_reply_to_tweet_id} does not exist")
+        if any(s in (text or '') for s in self.reject_tweets):
+            raise api_error(403, "You are not allowed to create a Tweet with duplicate content.")
+        tweet_id = str(self._new_id())
+        with self.lock:
+            self.tweets.append({"id": tweet_id, "text": text, "media_ids": list(media_ids or []),
+                                "in_reply_to": in_reply_to_tweet_id, "time": time.monotonic()})
+        return tweet_id
+
+
+class FakeAPI:
+    """tweepy.API 的假实现 (只包含发布流程用到的方法)"""
+
+    def __init__(self, server: FakeTwitterServer):
+        self.server = server
+
+    def media_upload(self, filename, *, chunked=False, media_category=None, wait_for_async_finalize=True, **kwargs):
+        media_id = self.server.upload(filename, media_category)
+        media = self.get_media_upload_status(media_id)
+        if chunked and wait_for_async_finalize:
+            while media.processing_info and media.processing_info["state"] in ("pending", "in_progress"):
+                time.sleep(media.processing_info["check_after_secs"])
+                media = self.get_media_upload_status(media_id)
+        return media
+
+    def get_media_upload_status(self, media_id, **kwargs):
+        with self.server.lock:
+            self.server.status_calls += 1
+        info = self.server.processing_info(media_id)
+        media = SimpleNamespace(media_id=media_id)
+        if info is not None:
+            media.processing_info = info
+        return media
+
+
+class FakeClient:
+    """tweepy.Client 的假实现"""
+
+    def __init__(self, server: FakeTwitterServer):
+        self.server = server
+
+    def create_tweet(self, text=None, media_ids=None, in_reply_to_tweet_id=None, **kwargs):
+        tweet_id = self.server.create_tweet(text, media_ids, in_reply_to_tweet_id)
+        print(f"  [fake] tweet {tweet_id} (reply to {in_reply_to_tweet_id}, media {media_ids})")
+        return SimpleNamespace(data={"id": tweet_id, "text": text})
+
+
+_server: Optional[FakeTwitterServer] = None
+
+
+def get_server() -> FakeTwitterServer:
+    """进程内共享的假服务器 (FakeAPI 与 FakeClient 需要看到同一份媒体状态)"""
+    global _server
+    if _server is None:
+        _server = FakeTwitterServer()
+    return _server
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Rehearse the posting phase against a local fake X API")
+    parser.add_argument('--langs', type=int, default=7, help="推文条数")
+    parser.add_argument('--video-mb', type=float, default=8.0, help="每个假视频的大小 (MB)")
+    parser.add_argument('--images', type=int, default=3, help="每条推文的图片数")
+    parser.add_argument('--processing', type=float, default=6.0, help="服务器端视频处理耗时 (秒)")
+    parser.add_argument('--upload-mbps', type=float, default=20.0, help="上传速度 (MB/s)")
+    parser.add_argument('--post-interval', type=float, default=1.0, help="相邻推文的最小间隔 (秒)")
+    parser.add_argument('--fail', nargs='*', default=[], help="推文被接口拒绝 (403) 的语言代码")
+    parser.add_argument('--fail-video', nargs='*', default=[], help="视频处理失败 (只带图片发布) 的语言代码")
+    return parser.parse_args()
+
+
+def main(args):
+    from twitter_client import post_thread
+    from run_manifest import RunManifest
+
+    server = FakeTwitterServer(upload_mb_per_sec=args.upload_mbps, processing_seconds=args.processing,
+                               fail_media=[f"{code}.mp4" for code in args.fail_video],
+                               reject_tweets=[f"tweet {code}" for code in args.fail])
+    temp_dir = tempfile.mkdtemp(prefix="fake_twitter_")
+    # 与 main 相同的发布状态记录方式
+    manifest = RunManifest("rehearsal", runs_dir=temp_dir)
+    try:
+        queue = []
+        for i in range(args.langs):
+            code = f"l{i}"
+            video_path = os.path.join(temp_dir, f"{code}.mp4")
+            with open(video_path, 'wb') as f:
+                f.write(os.urandom(int(args.video_mb * 1024 * 1024)))
+            image_paths = []
+            for j in range(args.images):
+                image_paths.append(os.path.join(temp_dir, f"{code}_{j}.png"))
+                with open(image_paths[-1], 'wb') as f:
+                    f.write(os.urandom(300 * 1024))
+            queue.append({"lang_code": code, "text": f"tweet {code}", "video_path": video_path,
+                          "image_paths": image_paths})
+
+        start = time.monotonic()
+        tweet_ids = post_thread(FakeClient(server), FakeAPI(server), queue, post_interval=args.post_interval,
+                                posted=manifest.posts(),
+                                on_posted=lambda item, tweet_id: manifest.mark_posted(item['lang_code'], tweet_id),
+                                on_sending=lambda item: manifest.mark_sending(item['lang_code']),
+                                on_rejected=lambda item, e: manifest.mark_failed(item['lang_code'], str(e)))
+        elapsed = time.monotonic() - start
+        posts = manifest.data["posts"]
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    # 推文串检查：发布顺序与队列一致，且每条回复上一条成功的推文
+    posted = [t for t in tweet_ids if t is not None]
+    expected = [item["text"] for item, t in zip(queue, tweet_ids) if t is not None]
+    in_order = [t["text"] for t in server.tweets] == expected
+    chained = all(t["in_reply_to"] == (posted[i - 1] if i else None) for i, t in enumerate(server.tweets))
+
+    print(f"\nPosted {len(posted)}/{len(queue)} tweets in {elapsed:.1f}s "
+          f"({server.status_calls} status checks)")
+    print(f"  Thread order: {'ok' if in_order else 'WRONG'}, reply chain: {'ok' if chained else 'BROKEN'}")
+
+    # 发布状态检查：被拒绝的语言记为 failed (下次可重试)，其余 (包括视频处理失败、只带图片的) 记为 posted
+    states = {item["lang_code"]: (posts.get(item["lang_code"]) or {}).get("state") for item in queue}
+    expected_states = {code: "failed" if code in args.fail else "posted" for code in states}
+    ledger_ok = states == expected_states
+    print(f"  Post ledger: {'ok' if ledger_ok else 'WRONG'} "
+          f"({', '.join(f'{code}={state}' for code, state in states.items())})")
+
+    # 视频处理失败的推文只带图片
+    media_counts = {t["text"]: len(t["media_ids"]) for t in server.tweets}
+    media_ok = all(media_counts[item["text"]] == args.images + (item["lang_code"] not in args.fail_video)
+                   for item in queue if item["text"] in media_counts)
+    print(f"  Media: {'ok' if media_ok else 'WRONG'}")
+
+    expected_failures = sum(1 for item in queue if item["lang_code"] in args.fail)
+    return 0 if in_order and chained and ledger_ok and media_ok and len(posted) == len(queue) - expected_failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
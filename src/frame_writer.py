@@ -0,0 +1,80 @@
+# src/frame_writer.py
+
+import queue
+import threading
+import time
+from typing import Callable, Optional, Dict
+
+from config import VIDEO_FRAME_QUEUE_SIZE
+
+_SENTINEL = None
+
+
+class FrameWriter:
+    """
+    在后台线程中解码帧并写入 FFmpeg 的 stdin，使采集与编码重叠进行。
+    - 有界队列提供背压：编码跟不上时 put() 阻塞，阻塞时间计入 "stall"。
+    - decode: 可选的帧转换函数 (如 PNG -> rgb24)，在写入线程中执行。
+    写入线程出错 (如 FFmpeg 退出) 后，put()/close() 会重新抛出该异常。
+    """
+
+    def __init__(self, stdin, decode: Optional[Callable[[bytes], bytes]] = None,
+                 max_queued: int = VIDEO_FRAME_QUEUE_SIZE):
+        self.stdin = stdin
+        self.decode = decode
+        self.queue: queue.Queue = queue.Queue(maxsize=max(1, max_queued))
+        self.error: Optional[BaseException] = None
+        self.timings: Dict[str, float] = {"decode": 0.0, "write": 0.0, "stall": 0.0}
+        self.frames = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is _SENTINEL:
+                return
+            if self.error is not None:
+                continue  # 出错后只排空队列，避免采集端在 put() 上永久阻塞
+            try:
+                start = time.perf_counter()
+                if self.decode:
+                    frame = self.decode(frame)
+                decoded = time.perf_counter()
+                self.stdin.write(frame)
+                self.timings["decode"] += decoded - start
+                self.timings["write"] += time.perf_counter() - decoded
+                self.frames += 1
+            except BaseException as e:
+                self.error = e
+
+    def put(self, frame: bytes):
+        """提交一帧；队列已满时阻塞"""
+        if self.error is not None:
+            raise self.error
+        start = time.perf_counter()
+        self.queue.put(frame)
+        self.timings["stall"] += time.perf_counter() - start
+
+    def stop(self):
+        """结束写入线程 (已结束时无操作)，不抛出写入错误"""
+        if self.thread.is_alive():
+            self.queue.put(_SENTINEL)
+            self.thread.join()
+
+    def close(self):
+        """等待队列中的帧全部写出"""
+        self.stop()
+        if self.error is not None:
+            raise self.error
+
+    def summary(self, capture_seconds: float, label: str) -> str:
+        """
+        返回各阶段每帧平均耗时的摘要。
+        采集端在 put() 上阻塞 (stall) 明显时瓶颈在写入端 (解码/编码)，否则在采集端。
+        """
+        n = max(1, self.frames)
+        per_frame = {"capture": capture_seconds, **self.timings}
+        parts = ", ".join(f"{stage} {seconds / n * 1000:.1f}" for stage, seconds in per_frame.items())
+        bottleneck = "encoder" if self.timings["stall"] > capture_seconds * 0.1 else "capture"
+        return f"  [{label}] {self.frames} frames, ms/frame: {parts} (bottleneck: {bottleneck})"
@@ -0,0 +1,427 @@
+# src/history_store.py
+
+import os
+import json
+import hashlib
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Iterable, List
+from config import DOCS_DATA_DIR, HISTORY_STORAGE_MODE, HISTORY_RAW_DAYS
+from interpolation import pchip_coefficients, pchip_windows, evaluate_curves
+
+# 历史数据按 "语言/日期" 分片存储：
+#   docs/data/history_{lang}/manifest.json  - 保留窗口内的日期列表与各分片的内容哈希
+#   docs/data/history_{lang}/{date}.json    - 当日 Top 列表、各条目的原始日浏览量，以及分钟块行表或 PCHIP 系数
+#   docs/data/history_{lang}/{date}.bin     - 当日分钟曲线 (uint32 小端，每行 1440 分钟，仅 minutes 模式)
+# 每次运行只重写内容发生变化的分片，读取方按需加载所需日期。
+MANIFEST_FORMAT = "sharded-v1"
+MINUTES_PER_DAY = 1440
+
+# 分片前的单文件格式 (仅用于迁移)
+_LEGACY_COLUMNAR_FORMAT = "columnar-u32"
+_LEGACY_SPLINE_FORMAT = "spline-pchip"
+
+
+def _store_dir(lang_code: str) -> str:
+    return os.path.join(DOCS_DATA_DIR, f"history_{lang_code}")
+
+
+def _manifest_path(lang_code: str) -> str:
+    return os.path.join(_store_dir(lang_code), "manifest.json")
+
+
+def _shard_paths(lang_code: str, d_str: str):
+    base = os.path.join(_store_dir(lang_code), d_str)
+    return f"{base}.json", f"{base}.bin"
+
+
+def _write_atomic(path: str, payload: bytes):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def _read_manifest(lang_code: str) -> Optional[Dict[str, Any]]:
+    path = _manifest_path(lang_code)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def history_version(lang_code: str) -> str:
+    """
+    返回历史数据的版本标识 (清单文件的修改时间)，供缓存了已加载数据的使用方判断是否需要重新加载。
+    """
+    path = _manifest_path(lang_code)
+    return str(os.stat(path).st_mtime_ns) if os.path.exists(path) else ""
+
+
+def shard_hashes(lang_code: str, dates: Iterable[str]) -> Dict[str, Optional[str]]:
+    """返回指定日期分片的内容哈希 (来自清单)，不存在的日期为 None"""
+    manifest = _read_manifest(lang_code) or {"shards": {}}
+    return {d_str: (manifest['shards'].get(d_str) or {}).get('hash') for d_str in dates}
+
+
+def _new_article() -> Dict[str, Any]:
+    return {"daily_raw": {}, "minutes": {}, "splines": {}}
+
+
+def get_minutes(article: Dict[str, Any], d_str: str) -> Optional[np.ndarray]:
+    """
+    返回条目在指定日期的分钟曲线；spline 存储时按系数即时求值。无数据时返回 None。
+    """
+    minutes = article.get("minutes", {}).get(d_str)
+    if minutes is not None:
+        return minutes
+    coefficients = article.get("splines", {}).get(d_str)
+    if coefficients is not None:
+        return evaluate_curves(coefficients)[0]
+    return None
+
+
+def _data_dates(data: Dict[str, Any]) -> set:
+    dates = set()
+    for art in data['articles'].values():
+        dates.update(art["daily_raw"])
+        dates.update(art.get("minutes", {}))
+        dates.update(art.get("splines", {}))
+    return dates
+
+
+# --- 读取 ---
+
+def load_history(lang_code: str, dates: Optional[Iterable[str]] = None, mmap: bool = True) -> Dict[str, Any]:
+    """
+    加载指定语言的历史数据。
+    - dates: 只装配这些日期的分片；为 None 时加载清单中的全部分片。
+    - mmap: 分钟曲线直接内存映射分片二进制文件 (只读)；否则读入内存。
+    返回 {"dates": 保留窗口, "articles": {title: {"daily_raw", "minutes", "splines"}}, "top": {date: [titles]}}。
+    """
+    manifest = _read_manifest(lang_code)
+    if manifest is None:
+        manifest = _migrate_single_file(lang_code)
+        if manifest is None:
+            return {"dates": [], "articles": {}, "top": {}}
+
+    wanted = manifest['shards'].keys() if dates is None else [d for d in dates if d in manifest['shards']]
+    data = {"dates": list(manifest['dates']), "articles": {}, "top": {}}
+    for d_str in sorted(wanted):
+        _load_shard(lang_code, d_str, data, mmap)
+    return data
+
+
+def _load_shard(lang_code: str, d_str: str, data: Dict[str, Any], mmap: bool):
+    json_path, bin_path = _shard_paths(lang_code, d_str)
+    with open(json_path, 'r', encoding='utf-8') as f:
+        shard = json.load(f)
+
+    articles = data['articles']
+    if "top" in shard:
+        data['top'][d_str] = shard["top"]
+
+    for title, views in shard.get("daily_raw", {}).items():
+        articles.setdefault(title, _new_article())["daily_raw"][d_str] = views
+
+    for title, coefficients in shard.get("splines", {}).items():
+        articles.setdefault(title, _new_article())["splines"][d_str] = coefficients
+
+    titles = shard.get("titles", [])
+    if titles:
+        values = np.memmap(bin_path, dtype='<u4', mode='r') if mmap else np.fromfile(bin_path, dtype='<u4')
+        for row, title in enumerate(titles):
+            start = row * MINUTES_PER_DAY
+            articles.setdefault(title, _new_article())["minutes"][d_str] = values[start:start + MINUTES_PER_DAY]
+
+
+# --- 写入 ---
+
+def _raw_cutoff(today_date_str: str) -> str:
+    """保留 daily_raw 的最早日期，更早的分片由 compact_history 去掉原始值"""
+    return (datetime.strptime(today_date_str, "%Y-%m-%d") - timedelta(days=HISTORY_RAW_DAYS - 1)).strftime("%Y-%m-%d")
+
+
+def save_history(data: Dict[str, Any], lang_code: str, dates: Optional[Iterable[str]] = None,
+                 mode: str = HISTORY_STORAGE_MODE, today_date_str: Optional[str] = None) -> List[str]:
+    """
+    保存指定语言的历史数据。
+    - dates: 需要重写的分片日期；为 None 时写入内存中出现的全部日期。
+      内容哈希与清单一致的分片会被跳过，因此未变化的文件不会产生磁盘写入或 git diff。
+    - mode: 'minutes' 写入分钟块；'spline' 只写入 PCHIP 系数。
+    - today_date_str: 给定时，插值窗口 (前后各两天) 的 daily_raw 已被压缩掉的分片无法补算系数，
+      切换到 spline 模式时保持原有存储不变。
+    返回实际写入的分片日期列表。
+    """
+    store_dir = _store_dir(lang_code)
+    os.makedirs(store_dir, exist_ok=True)
+
+    manifest = _read_manifest(lang_code) or {"format": MANIFEST_FORMAT, "dates": [], "shards": {}}
+    shard_dates = sorted(_data_dates(data) if dates is None else set(dates))
+    convert_from = None
+    if mode == 'spline' and today_date_str:
+        convert_from = (datetime.strptime(_raw_cutoff(today_date_str), "%Y-%m-%d") + timedelta(days=2)).strftime("%Y-%m-%d")
+
+    written = []
+    for d_str in shard_dates:
+        shard_mode = mode
+        if convert_from and d_str < convert_from:
+            shard_mode = (manifest['shards'].get(d_str) or {}).get("storage", mode)
+        if _write_shard(lang_code, manifest, data, d_str, shard_mode):
+            written.append(d_str)
+
+    manifest['dates'] = list(data['dates'])
+    _write_manifest(lang_code, manifest)
+
+    print(f"  History [{lang_code}]: wrote {len(written)}/{len(shard_dates)} shards")
+    return written
+
+
+def _write_shard(lang_code: str, manifest: Dict[str, Any], data: Dict[str, Any], d_str: str, mode: str) -> int:
+    """
+    写入单个分片并更新清单条目。内容哈希未变化时跳过，返回写入的字节数 (跳过时为 0)。
+    """
+    shard_json, shard_bin = _build_shard(data, d_str, mode)
+    digest = hashlib.sha256(shard_json + (shard_bin or b'')).hexdigest()
+    json_path, bin_path = _shard_paths(lang_code, d_str)
+
+    previous = manifest['shards'].get(d_str)
+    if previous and previous['hash'] == digest and os.path.exists(json_path):
+        return 0
+
+    if shard_bin is not None:
+        _write_atomic(bin_path, shard_bin)
+    elif os.path.exists(bin_path):
+        os.remove(bin_path)
+    _write_atomic(json_path, shard_json)
+    manifest['shards'][d_str] = {"hash": digest, "storage": mode}
+    return len(shard_json) + len(shard_bin or b'')
+
+
+def _write_manifest(lang_code: str, manifest: Dict[str, Any]):
+    manifest['format'] = MANIFEST_FORMAT
+    manifest['shards'] = dict(sorted(manifest['shards'].items()))
+    _write_atomic(_manifest_path(lang_code),
+                  json.dumps(manifest, ensure_ascii=False, indent=1).encode('utf-8'))
+
+
+def _build_shard(data: Dict[str, Any], d_str: str, mode: str):
+    """
+    构建单日分片内容，返回 (JSON 字节, 二进制字节或 None)。条目按标题排序以保证输出稳定。
+    """
+    articles = data['articles']
+    daily_raw = {title: articles[title]["daily_raw"][d_str]
+                 for title in sorted(articles) if d_str in articles[title]["daily_raw"]}
+    curve_titles = [title for title in sorted(articles)
+                    if d_str in articles[title].get("minutes", {}) or d_str in articles[title].get("splines", {})]
+
+    shard: Dict[str, Any] = {"date": d_str}
+    if d_str in data.get('top', {}):
+        shard["top"] = data['top'][d_str]
+    shard["daily_raw"] = daily_raw
+    shard_bin = None
+
+    if mode == 'spline':
+        _fill_missing_splines(data, d_str, curve_titles)
+        shard["splines"] = {title: articles[title]["splines"][d_str] for title in curve_titles}
+    else:
+        shard["titles"] = curve_titles
+        rows = [np.asarray(get_minutes(articles[title], d_str), dtype='<u4') for title in curve_titles]
+        if rows:
+            shard_bin = np.concatenate(rows).astype('<u4', copy=False).tobytes()
+
+    return json.dumps(shard, ensure_ascii=False, indent=1).encode('utf-8'), shard_bin
+
+
+def _fill_missing_splines(data: Dict[str, Any], d_str: str, titles: List[str]):
+    """
+    从 minutes 模式切换到 spline 模式时，为只有分钟采样的条目补算系数 (基于当前 daily_raw，
+    调用方须保证 d_str 前后各两天的原始值仍在，见 save_history 的 today_date_str)。
+    """
+    missing = [title for title in titles if d_str not in data['articles'][title].setdefault("splines", {})]
+    if not missing:
+        return
+    coefficients = pchip_coefficients(pchip_windows(
+        [(data['articles'][title]["daily_raw"], d_str) for title in missing]))
+    for title, row in zip(missing, coefficients):
+        data['articles'][title]["splines"][d_str] = row.tolist()
+
+
+# --- 压缩与回收 ---
+
+def _shard_size(lang_code: str, d_str: str) -> int:
+    return sum(os.path.getsize(p) for p in _shard_paths(lang_code, d_str) if os.path.exists(p))
+
+
+def compact_history(lang_code: str, today_date_str: str) -> int:
+    """
+    按保留分级压缩历史存储，返回回收的字节数。
+    - 早于保留窗口 (清单 dates) 的分片：整体删除，其中的条目随之消失；
+    - 早于 HISTORY_RAW_DAYS 的窗口内分片：去掉插值不再需要的 daily_raw。
+    """
+    manifest = _read_manifest(lang_code)
+    if manifest is None:
+        return 0
+
+    window = set(manifest['dates'])
+    window_start = min(window) if window else today_date_str
+    raw_cutoff = _raw_cutoff(today_date_str)
+    reclaimed = 0
+    removed = trimmed = 0
+
+    for d_str in list(manifest['shards'].keys()):
+        if d_str not in window and d_str < window_start:
+            reclaimed += _shard_size(lang_code, d_str)
+            for path in _shard_paths(lang_code, d_str):
+                if os.path.exists(path):
+                    os.remove(path)
+            del manifest['shards'][d_str]
+            removed += 1
+        elif d_str < raw_cutoff:
+            shard = load_history(lang_code, dates=[d_str], mmap=False)
+            if not any(art["daily_raw"] for art in shard['articles'].values()):
+                continue
+            before = _shard_size(lang_code, d_str)
+            for art in shard['articles'].values():
+                art["daily_raw"] = {}
+            if _write_shard(lang_code, manifest, shard, d_str, manifest['shards'][d_str].get("storage", 'minutes')):
+                reclaimed += before - _shard_size(lang_code, d_str)
+                trimmed += 1
+
+    _write_manifest(lang_code, manifest)
+    if removed or trimmed:
+        print(f"  Compaction [{lang_code}]: removed {removed} shards, trimmed raw views from {trimmed} shards, "
+              f"reclaimed {reclaimed / 1024:.1f} KB")
+    return reclaimed
+
+
+# --- 渲染切片 ---
+# 渲染单日只需要少数几天的分钟曲线。渲染前由主进程把这些曲线 (spline 分片也求值为分钟) 写成一个
+# 与本存储同格式的小型切片目录，各渲染进程与页面只读取该目录：
+# Python 端以 np.memmap 只读映射 (多个进程共享同一份页缓存，零拷贝)，页面端按分片格式直接加载。
+
+def segment_dates(dates: List[str], date_str: str, prev_date_str: Optional[str]) -> List[str]:
+    """
+    渲染 date_str 所需的日期：目标日与预渲染日 (各含前一天，供趋势回看) 以及目标日的后一天 (日期进位)。
+    """
+    index = dates.index(date_str)
+    indices = {index - 1, index}
+    if index + 1 < len(dates):
+        indices.add(index + 1)
+    if prev_date_str in dates:
+        indices |= {dates.index(prev_date_str) - 1, dates.index(prev_date_str)}
+    return sorted(dates[i] for i in indices if i >= 0)
+
+
+def build_segment_slice(lang_code: str, date_str: str, prev_date_str: Optional[str] = None) -> Dict[str, Any]:
+    """
+    在内存中装配渲染单日所需的分钟曲线。
+    返回 {"dates": 保留窗口, "curves": {date: (titles, matrix)}}，matrix 形状 (len(titles) + 1, 1440)，
+    末行为全零，供缺失条目索引。
+    """
+    dates = load_history(lang_code, dates=[])['dates']
+    needed = segment_dates(dates, date_str, prev_date_str)
+    history = load_history(lang_code, dates=needed, mmap=True)
+
+    curves = {}
+    for d_str in needed:
+        titles = sorted(title for title, art in history['articles'].items()
+                        if d_str in art["minutes"] or d_str in art["splines"])
+        matrix = np.zeros((len(titles) + 1, MINUTES_PER_DAY), dtype='<u4')
+        spline_rows = [row for row, title in enumerate(titles) if d_str in history['articles'][title]["splines"]]
+        if spline_rows:
+            coefficients = np.array([history['articles'][titles[row]]["splines"][d_str] for row in spline_rows])
+            matrix[spline_rows] = evaluate_curves(coefficients)
+        for row, title in enumerate(titles):
+            minutes = history['articles'][title]["minutes"].get(d_str)
+            if minutes is not None and d_str not in history['articles'][title]["splines"]:
+                matrix[row] = minutes
+        curves[d_str] = (titles, matrix)
+
+    return {"dates": dates, "curves": curves}
+
+
+def segment_curve_hashes(lang_code: str, date_str: str, prev_date_str: Optional[str] = None) -> Dict[str, str]:
+    """
+    渲染 date_str 实际读取的曲线内容的哈希 {date: hash}，覆盖 segment_dates 返回的全部日期。
+    只包含条目名与分钟曲线 (与渲染切片相同)，不受 daily_raw / top 的压缩或存储格式变化影响。
+    """
+    hashes = {}
+    for d_str, (titles, matrix) in build_segment_slice(lang_code, date_str, prev_date_str)['curves'].items():
+        digest = hashlib.sha256(json.dumps(titles, ensure_ascii=False).encode('utf-8'))
+        digest.update(np.ascontiguousarray(matrix).tobytes())
+        hashes[d_str] = digest.hexdigest()
+    return hashes
+
+
+def write_segment_slice(lang_code: str, date_str: str, prev_date_str: Optional[str], slice_dir: str) -> str:
+    """
+    将渲染 date_str 所需的曲线写入 slice_dir (manifest.json + {date}.json/.bin，minutes 格式)，返回该目录。
+    """
+    segment = build_segment_slice(lang_code, date_str, prev_date_str)
+    os.makedirs(slice_dir, exist_ok=True)
+    shards = {}
+    for d_str, (titles, matrix) in segment['curves'].items():
+        json_path = os.path.join(slice_dir, f"{d_str}.json")
+        _write_atomic(os.path.join(slice_dir, f"{d_str}.bin"), matrix.tobytes())
+        _write_atomic(json_path, json.dumps({"titles": titles}, ensure_ascii=False).encode('utf-8'))
+        shards[d_str] = {"storage": "minutes"}
+    manifest = {"format": MANIFEST_FORMAT, "dates": segment['dates'], "shards": shards}
+    _write_atomic(os.path.join(slice_dir, "manifest.json"), json.dumps(manifest, ensure_ascii=False).encode('utf-8'))
+    return slice_dir
+
+
+def load_segment_slice(slice_dir: str) -> Dict[str, Any]:
+    """读取 write_segment_slice 写出的切片，曲线矩阵为只读内存映射，格式同 build_segment_slice"""
+    with open(os.path.join(slice_dir, "manifest.json"), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    curves = {}
+    for d_str in manifest['shards']:
+        with open(os.path.join(slice_dir, f"{d_str}.json"), 'r', encoding='utf-8') as f:
+            titles = json.load(f)["titles"]
+        matrix = np.memmap(os.path.join(slice_dir, f"{d_str}.bin"), dtype='<u4', mode='r',
+                           shape=(len(titles) + 1, MINUTES_PER_DAY))
+        curves[d_str] = (titles, matrix)
+    return {"dates": manifest['dates'], "curves": curves}
+
+
+# --- 迁移 ---
+
+def _migrate_single_file(lang_code: str) -> Optional[Dict[str, Any]]:
+    """
+    将分片前的单文件 history_{lang}.json (及 .bin) 迁移为分片存储，返回新清单。
+    """
+    index_path = os.path.join(DOCS_DATA_DIR, f"history_{lang_code}.json")
+    bin_path = os.path.join(DOCS_DATA_DIR, f"history_{lang_code}.bin")
+    if not os.path.exists(index_path):
+        return None
+
+    print(f"Migrating {os.path.basename(index_path)} to sharded history store...")
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+
+    fmt = index.get("format")
+    articles = {}
+    for title, meta in index['articles'].items():
+        article = _new_article()
+        article["daily_raw"] = meta.get("daily_raw", {})
+        if fmt == _LEGACY_SPLINE_FORMAT:
+            article["splines"] = meta.get("splines", {})
+        elif fmt != _LEGACY_COLUMNAR_FORMAT:
+            article["minutes"] = {d: np.asarray(v, dtype='<u4') for d, v in meta.get("minutes", {}).items()}
+        articles[title] = article
+
+    if fmt == _LEGACY_COLUMNAR_FORMAT and os.path.exists(bin_path):
+        values = np.fromfile(bin_path, dtype='<u4')
+        for d_str, block in index['blocks'].items():
+            for row, title in enumerate(block['titles']):
+                start = block['offset'] + row * MINUTES_PER_DAY
+                articles[title]["minutes"][d_str] = values[start:start + MINUTES_PER_DAY]
+
+    mode = 'spline' if fmt == _LEGACY_SPLINE_FORMAT else 'minutes'
+    save_history({"dates": index['dates'], "articles": articles}, lang_code, mode=mode)
+
+    for path in (index_path, bin_path):
+        if os.path.exists(path):
+            os.remove(path)
+    return _read_manifest(lang_code)
@@ -0,0 +1,135 @@
+# src/http_cache.py
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import requests
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from config import HTTP_CACHE_DIR, HTTP_CACHE_RECENT_TTL
+
+# 仅缓存这些状态码 (404 表示该条目/日期无数据，同样可复用)
+CACHEABLE_STATUS = (200, 404)
+
+# 回放模式：只从缓存读取，不发起任何网络请求
+_replay_mode = False
+
+_COMPACT_DATE_RE = re.compile(r'/(\d{8})(?:\d{2})?(?=/|$)')
+_SPLIT_DATE_RE = re.compile(r'/(\d{4})/(\d{2})/(\d{2})(?=/|$)')
+
+
+class CacheMiss(requests.RequestException):
+    """回放模式下缓存未命中"""
+
+
+class CachedResponse:
+    """
+    与 requests.Response 接口兼容的最小响应对象。
+    """
+
+    def __init__(self, url: str, status_code: int, text: str):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=None)
+
+
+def set_replay_mode(enabled: bool):
+    """开启或关闭回放模式"""
+    global _replay_mode
+    _replay_mode = enabled
+    if enabled:
+        print(f"HTTP replay mode enabled: serving only from {HTTP_CACHE_DIR}")
+
+
+def _cache_path(url: str) -> str:
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return os.path.join(HTTP_CACHE_DIR, key[:2], f"{key}.json")
+
+
+def _latest_date_in_url(url: str) -> Optional[datetime]:
+    """提取 URL 路径中最晚的日期 (支持 YYYYMMDD[HH] 与 YYYY/MM/DD 两种写法)"""
+    path = url.split('?', 1)[0]
+    dates = []
+    for m in _COMPACT_DATE_RE.finditer(path):
+        try:
+            dates.append(datetime.strptime(m.group(1), "%Y%m%d"))
+        except ValueError:
+            pass
+    for m in _SPLIT_DATE_RE.finditer(path):
+        try:
+            dates.append(datetime(int(m.group(1)), int(m.group(2)), int(m.group(3))))
+        except ValueError:
+            pass
+    return max(dates) if dates else None
+
+
+def get_ttl(url: str) -> Optional[float]:
+    """
+    返回缓存有效期 (秒)，None 表示永久有效。
+    早于最新一天 (UTC 昨天) 的数据不会再变化，视为不可变；其余使用短 TTL。
+    """
+    latest = _latest_date_in_url(url)
+    if latest is None:
+        return HTTP_CACHE_RECENT_TTL
+    newest_day = (datetime.now(timezone.utc) - timedelta(days=1)).replace(tzinfo=None)
+    newest_day = newest_day.replace(hour=0, minute=0, second=0, microsecond=0)
+    if latest < newest_day:
+        return None
+    return HTTP_CACHE_RECENT_TTL
+
+
+def _read_entry(url: str) -> Optional[dict]:
+    path = _cache_path(url)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        return entry if entry.get('url') == url else None
+    except (OSError, ValueError):
+        return None
+
+
+def _write_entry(url: str, status_code: int, text: str):
+    path = _cache_path(url)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    entry = {"url": url, "status": status_code, "fetched_at": time.time(), "body": text}
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"  Warning: Could not write HTTP cache entry: {e}")
+
+
+def lookup(url: str) -> Optional[CachedResponse]:
+    """
+    查询缓存，命中且未过期时返回 CachedResponse，否则返回 None。
+    回放模式下忽略 TTL，未命中则抛出 CacheMiss。
+    """
+    entry = _read_entry(url)
+    if entry is not None:
+        ttl = get_ttl(url)
+        if _replay_mode or ttl is None or time.time() - entry['fetched_at'] < ttl:
+            return CachedResponse(url, entry['status'], entry['body'])
+
+    if _replay_mode:
+        raise CacheMiss(f"Replay cache miss: {url}")
+    return None
+
+
+def store(url: str, response):
+    """将可缓存的响应写入磁盘"""
+    if response.status_code in CACHEABLE_STATUS:
+        _write_entry(url, response.status_code, response.text)
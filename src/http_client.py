@@ -0,0 +1,120 @@
+# src/http_client.py
+
+import time
+import threading
+import urllib.parse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Any
+
+import http_cache
+import tracing
+from utils import RateLimiter
+from config import (
+    HEADERS, HTTP_MAX_WORKERS, HTTP_RATE_LIMIT_PER_SEC, HTTP_RATE_LIMIT_BURST,
+    HTTP_TIMEOUT, HTTP_MAX_RETRIES, HTTP_BACKOFF_FACTOR
+)
+
+# 会触发指数退避重试的状态码
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+# 所有调用方共享的 Wikimedia REST 限速器
+_rate_limiter = RateLimiter(HTTP_RATE_LIMIT_PER_SEC, HTTP_RATE_LIMIT_BURST)
+
+# 按主机统计的请求计数与耗时
+_stats: Dict[str, Dict[str, Any]] = {}
+_stats_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    返回进程内共享的 requests.Session (惰性创建)。
+    连接池大小与并发线程数一致，并在 429/5xx 及连接错误时指数退避重试。
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=HTTP_MAX_RETRIES,
+                backoff_factor=HTTP_BACKOFF_FACTOR,
+                status_forcelist=RETRY_STATUS,
+                allowed_methods=frozenset(['GET']),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_MAX_WORKERS, max_retries=retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update(HEADERS)
+            session.headers['Accept-Encoding'] = 'gzip, deflate'
+            _session = session
+        return _session
+
+
+def _record(host: str, latency: float, ok: bool, from_cache: bool):
+    with _stats_lock:
+        entry = _stats.setdefault(host, {"requests": 0, "cache_hits": 0, "errors": 0,
+                                         "total_latency": 0.0, "max_latency": 0.0})
+        if from_cache:
+            entry["cache_hits"] += 1
+            return
+        entry["requests"] += 1
+        entry["total_latency"] += latency
+        entry["max_latency"] = max(entry["max_latency"], latency)
+        if not ok:
+            entry["errors"] += 1
+
+
+def get(url: str, use_cache: bool = True):
+    """
+    统一的 GET 入口：磁盘缓存 -> 限速 -> 连接池请求 (含重试与超时)。
+    网络错误在重试耗尽后向上抛出 requests.RequestException。
+    """
+    parts = urllib.parse.urlsplit(url)
+    host = parts.netloc
+
+    with tracing.span("http.get", host=host, path=parts.path) as s:
+        if use_cache:
+            cached = http_cache.lookup(url)
+            if cached is not None:
+                _record(host, 0.0, True, from_cache=True)
+                s.set(cache=True, status=cached.status_code, bytes=len(cached.text))
+                return cached
+
+        _rate_limiter.acquire()
+        start = time.perf_counter()
+        try:
+            response = get_session().get(url, timeout=HTTP_TIMEOUT)
+        except requests.RequestException:
+            _record(host, time.perf_counter() - start, False, from_cache=False)
+            raise
+        _record(host, time.perf_counter() - start, response.status_code < 400 or response.status_code == 404,
+                from_cache=False)
+        s.set(cache=False, status=response.status_code, bytes=len(response.content))
+
+        if use_cache:
+            http_cache.store(url, response)
+        return response
+
+
+def get_stats() -> Dict[str, Dict[str, Any]]:
+    """返回按主机统计的请求计数与耗时快照"""
+    with _stats_lock:
+        return {host: dict(entry) for host, entry in _stats.items()}
+
+
+def print_stats():
+    """打印按主机统计的 HTTP 请求摘要"""
+    stats = get_stats()
+    if not stats:
+        return
+    print("HTTP request stats:")
+    for host, entry in sorted(stats.items()):
+        avg = entry["total_latency"] / entry["requests"] if entry["requests"] else 0.0
+        print(f"  {host}: {entry['requests']} requests, {entry['cache_hits']} cache hits, "
+              f"{entry['errors']} errors, avg {avg * 1000:.0f} ms, max {entry['max_latency'] * 1000:.0f} ms")
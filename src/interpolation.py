@@ -0,0 +1,86 @@
+# src/interpolation.py
+
+import numpy as np
+from datetime import datetime, timedelta
+
+# PCHIP 采样窗口：目标日前后各两天的日浏览量，x 坐标单位为小时，目标日位于区间 [0, 24)
+PCHIP_STEP_HOURS = 24.0
+MINUTE_XS = np.linspace(0, 24, 1440, endpoint=False)
+
+
+def _pchip_window(daily_raw_map, target_date_str):
+    """
+    取目标日前后各两天的原始值 (缺失的过去日期记为 0，缺失的未来日期沿用当日值)。
+    """
+    target_date = datetime.strptime(target_date_str, "%Y-%m-%d")
+    y_points = []
+    for i in range(-2, 3):
+        d_str = (target_date + timedelta(days=i)).strftime("%Y-%m-%d")
+        val = daily_raw_map.get(d_str)
+        if val is None:
+            val = 0 if i < 0 else daily_raw_map.get(target_date_str, 0)
+        y_points.append(val)
+    return y_points
+
+
+def pchip_coefficients(y_windows: np.ndarray) -> np.ndarray:
+    """
+    批量计算目标日区间 [0, 24) 上的 PCHIP 三次多项式系数。
+    - y_windows: 形状 (N, 5)，x 坐标为 -24, 0, 24, 48, 72。
+    返回形状 (N, 4) 的系数 [c0, c1, c2, c3]，y(s) = c0*s^3 + c1*s^2 + c2*s + c3。
+    浮点运算顺序与 scipy 的 PchipInterpolator / CubicHermiteSpline 一致，结果逐位相同。
+    """
+    y = np.asarray(y_windows, dtype=np.float64).reshape(-1, 5)
+    h = PCHIP_STEP_HOURS
+    mk = (y[:, 1:] - y[:, :-1]) / h
+
+    # 内部节点导数：斜率异号或为零时取 0，否则取加权调和平均 (等距节点下 w1 = w2 = 3h)
+    smk = np.sign(mk)
+    condition = (smk[:, 1:] != smk[:, :-1]) | (mk[:, 1:] == 0) | (mk[:, :-1] == 0)
+    w1 = 2 * h + h
+    w2 = h + 2 * h
+    with np.errstate(divide='ignore', invalid='ignore'):
+        whmean = (w1 / mk[:, :-1] + w2 / mk[:, 1:]) / (w1 + w2)
+        dk = np.where(condition, 0.0, 1.0 / whmean)
+
+    # 目标日区间两端 (节点 1 与节点 2) 的 Hermite 系数
+    d0, d1 = dk[:, 0], dk[:, 1]
+    slope = (y[:, 2] - y[:, 1]) / h
+    t = (d0 + d1 - 2 * slope) / h
+    return np.stack((t / h, (slope - d0) / h - t, d0, y[:, 1]), axis=1)
+
+
+def evaluate_curves(coefficients: np.ndarray) -> np.ndarray:
+    """
+    在 1440 个分钟采样点上批量求值多项式，返回形状 (N, 1440) 的非负整数数组。
+    运算顺序与前端 docs/js/utils.js 的 evaluateSpline 一致，修改时两处须同步。
+    """
+    c = np.asarray(coefficients, dtype=np.float64).reshape(-1, 4)
+    s = MINUTE_XS
+    s2 = s * s
+    s3 = s2 * s
+    ys = c[:, 3:4] + c[:, 2:3] * s
+    ys = ys + c[:, 1:2] * s2
+    ys = ys + c[:, 0:1] * s3
+    return np.maximum(ys, 0).astype(np.int64)
+
+
+def pchip_windows(items) -> np.ndarray:
+    """items: [(daily_raw_map, target_date_str), ...] -> 形状 (N, 5) 的采样窗口"""
+    return np.array([_pchip_window(raw, d_str) for raw, d_str in items], dtype=np.float64).reshape(-1, 5)
+
+
+def interpolate_curves(items) -> np.ndarray:
+    """
+    批量生成分钟级曲线。
+    - items: [(daily_raw_map, target_date_str), ...]
+    返回形状 (len(items), 1440) 的整数数组，行顺序与 items 一致。
+    """
+    return evaluate_curves(pchip_coefficients(pchip_windows(items)))
+
+
+def interpolate_curve_for_date(daily_raw_map, target_date_str):
+    """
+    使用 PCHIP 插值算法为单日数据生成分钟级曲线。
+    """
+    return interpolate_curves([(daily_raw_map, target_date_str)])[0].tolist()
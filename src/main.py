@@ -1,22 +1,30 @@
 # src/main.py
 
 import os
-import time
-from typing import cast
+import glob
+import argparse
+from functools import partial
 from datetime import datetime, timedelta, timezone
-from playwright.sync_api import sync_playwright, ViewportSize, Browser
 
 import animator
+import browser_pool
+import screenshots
+import tracing
 from config import (
     REPO_URL, TWITTER_USERNAME, BASE_COLOR_SLOPE_THRESHOLD, BASE_DIR,
-    LANG_CONFIG, BASE_VIEWPORT_WIDTH, BASE_VIEWPORT_HEIGHT, DEVICE_SCALE_FACTOR
+    LANG_CONFIG, RENDER_FARM_DIR, PIPELINE_POOLS, CONFIG_JSON_PATH, VIDEO_DIR
 )
 from utils import (
     get_date_str, format_number, save_json_config, save_daily_report_data,
     ensure_picture_dir, cleanup_old_videos, cleanup_video_directories
 )
-from wiki_api import get_siteviews_scaling_factors, get_top_articles, generate_chart_link
-from twitter_client import get_twitter_auth_v1, get_twitter_client_v2
+from wiki_api import get_siteviews_scaling_factors, get_all_top_articles, generate_chart_link
+from twitter_client import get_twitter_auth_v1, get_twitter_client_v2, post_thread
+from http_cache import set_replay_mode
+from http_client import print_stats as print_http_stats
+from pipeline import StagePipeline
+from run_manifest import RunManifest, file_hashes
+from history_store import shard_hashes
 
 
 def construct_tweet(lang_config, date_str, articles_data, chart_link):
@@ -81,157 +89,169 @@ def update_readme(date_str, tweet_id):
         print(f"Error updating README: {e}")
 
 
-def capture_screenshots(urls, save_dir):
-    """使用 Playwright 截取 Top Views, Logarithmic Line Chart 和 Pie Chart"""
-    topviews_url = urls.get('topviews')
-    pageviews_url = urls.get('pageviews')
-
-    if not topviews_url or not pageviews_url:
-        return []
+def build_content_pipeline(yesterday, date_str, args, manifest: RunManifest):
+    """
+    构建 Phase 1 的阶段 DAG：
+    network 池负责 Wikimedia 请求与数据更新，render 池负责视频渲染，browser 池负责截图。
+    各语言的阶段只依赖自身的数据，因此一种语言在渲染视频时，另一种语言可以同时截图或拉取数据。
+    每个阶段经 manifest.checkpoint 记录结果与产物哈希，--resume 时复用仍有效的阶段。
+    """
+    pipeline = StagePipeline(PIPELINE_POOLS)
+
+    def fetch_scaling(_):
+        scaling_factors = get_siteviews_scaling_factors()
+        save_json_config(scaling_factors, BASE_COLOR_SLOPE_THRESHOLD)
+        return {
+            "baseThreshold": BASE_COLOR_SLOPE_THRESHOLD,
+            "scalingFactors": scaling_factors
+        }
+
+    def history_artifacts(lang_code, _):
+        # update_data 重算 today-2 .. today 的分片
+        dates = [(yesterday - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(3)]
+        return {f"history_{lang_code}/{d}": h for d, h in shard_hashes(lang_code, dates).items() if h}
+
+    def video_artifacts(lang_code, video_path):
+        if not video_path:
+            return {}
+        segments = [p for p in glob.glob(os.path.join(VIDEO_DIR, '*', lang_code, 'segment_*.mp4'))
+                    if os.path.basename(os.path.dirname(os.path.dirname(p))) <= date_str]
+        return file_hashes([video_path] + sorted(segments))
+
+    def screenshot_artifacts(result):
+        artifacts = file_hashes(p for captured in result.values() for p in captured['images'])
+        # 截图不完整的语言记为缺失产物，--resume 时重新截图
+        artifacts.update({f"screenshots/{code}": None for code, captured in result.items() if len(captured['images']) < 3})
+        return artifacts
+
+    pipeline.add("scaling", manifest.checkpoint("scaling", fetch_scaling, lambda _: file_hashes([CONFIG_JSON_PATH])),
+                 'network')
+    pipeline.add("top_articles", manifest.checkpoint("top_articles", lambda _: get_all_top_articles(yesterday)),
+                 'network')
+
+    def update_lang_data(lang, deps):
+        articles_data = deps["top_articles"].get(lang['code'], [])
+        if not articles_data:
+            print(f"No data for {lang['code']}, skipping.")
+            return None
+        print(f"[{lang['code']}] Updating animation data...")
+        animator.update_data(lang['project'], date_str, articles_data, lang['code'])
+        return articles_data
 
-    topviews_path = os.path.join(save_dir, "topviews.png")
-    line_path = os.path.join(save_dir, "line.png")
-    pie_path = os.path.join(save_dir, "pie.png")
+    def render_lang_video(lang, deps):
+        if not deps[f"{lang['code']}:data"]:
+            return None
+        video_path = animator.render_video(
+            date_str=date_str,
+            lang_code=lang['code'],
+            config=deps["scaling"],
+            engine=args.engine,
+            farm_dir=args.farm
+        )
+        if not video_path:
+            raise RuntimeError(f"Video rendering failed for {lang['code']}")
+        cleanup_old_videos(video_path)
+        return video_path
 
-    if all(os.path.exists(p) for p in [topviews_path, line_path, pie_path]):
-        print(f"Images already exist in {save_dir}, skipping.")
-        return [topviews_path, line_path, pie_path]
+    def take_screenshots(deps):
+        jobs = []
+        for lang in LANG_CONFIG:
+            articles_data = deps["top_articles"].get(lang['code'], [])
+            if not articles_data:
+                continue
 
-    images = []
-    try:
-        with sync_playwright() as p:
-            print("Launching browser...")
-            browser: Browser = p.chromium.launch(headless=True)
-            vp = cast(ViewportSize, {'width': BASE_VIEWPORT_WIDTH, 'height': BASE_VIEWPORT_HEIGHT})
-            page = browser.new_page(viewport=vp, device_scale_factor=DEVICE_SCALE_FACTOR)
-
-            def scroll_past_header():
-                try:
-                    header = page.locator(".interapp-navigation").first
-                    if header.is_visible():
-                        header_box = header.bounding_box()
-                        if header_box:
-                            scroll_y = header_box['height'] * 0.9
-                            page.evaluate(f"window.scrollBy(0, {scroll_y})")
-                            time.sleep(0.5)
-                except Exception as err:
-                    print(f"Could not scroll past header: {err}")
-
-            # 1. Top Views
-            print(f"Navigating to Top Views: {topviews_url}")
-            page.goto(topviews_url, wait_until='domcontentloaded', timeout=15000)
-            page.wait_for_selector("#topview-entry-1", state="visible", timeout=15000)
-            scroll_past_header()
-            page.screenshot(path=topviews_path)
-            print(f"Captured: {topviews_path}")
-            images.append(topviews_path)
-
-            # 2. Line Chart
-            print(f"Navigating to Page Views: {pageviews_url}")
-            page.goto(pageviews_url, wait_until='domcontentloaded', timeout=15000)
-            page.wait_for_selector("canvas", state="visible", timeout=15000)
-            time.sleep(3)
-
-            try:
-                settings_btn = page.locator(".js-test-settings").first
-                if settings_btn.is_visible():
-                    settings_btn.click()
-                    time.sleep(1)
-                    bezier = page.locator(".js-test-bezier-curve").first
-                    if bezier.is_visible():
-                        bezier.click()
-                        time.sleep(0.5)
-                    save_btn = page.locator(".save-settings-btn").first
-                    if save_btn.is_visible():
-                        save_btn.click()
-                        time.sleep(2)
-                log_label = page.locator(".logarithmic-scale").first
-                if log_label.is_visible():
-                    log_label.click()
-                    time.sleep(3)
-            except Exception as e:
-                print(f"Error configuring line chart: {e}")
-
-            scroll_past_header()
-            page.screenshot(path=line_path)
-            print(f"Captured: {line_path}")
-            images.append(line_path)
-
-            # 3. Pie Chart
-            try:
-                chart_btn = page.locator(".btn-chart-type").first
-                if chart_btn.is_visible():
-                    chart_btn.click()
-                    time.sleep(1)
-                    pie = page.locator(".js-test-pie-chart").first
-                    if pie.is_visible():
-                        pie.click()
-                        time.sleep(3)
-            except Exception as e:
-                print(f"Error toggling Pie chart: {e}")
-
-            scroll_past_header()
-            page.screenshot(path=pie_path)
-            print(f"Captured: {pie_path}")
-            images.append(pie_path)
-            browser.close()
+            chart_link_top5 = generate_chart_link(lang['project'], articles_data, yesterday, top_n=5)
+            topviews_link = f"https://pageviews.wmcloud.org/topviews/?project={lang['project']}&platform=all-access&date={date_str}&excludes="
 
-    except Exception as e:
-        print(f"Playwright critical error: {e}")
+            pic_dir = ensure_picture_dir(date_str, lang['code'])
+            jobs.append((lang['code'], {"topviews": topviews_link, "pageviews": chart_link_top5}, pic_dir))
 
-    return images
+        print(f"Taking screenshots for {len(jobs)} languages...")
+        images = screenshots.capture_all(jobs)
+        return {code: {"images": images.get(code, [])} for code, _, _ in jobs}
 
+    # 所有语言的截图在同一个浏览器中并行完成，只需等待 Top 列表
+    browser_stages = [pipeline.add("screenshots", manifest.checkpoint("screenshots", take_screenshots,
+                                                                      screenshot_artifacts),
+                                   'browser', ["top_articles"])]
+    for lang in LANG_CONFIG:
+        code = lang['code']
+        pipeline.add(f"{code}:data", manifest.checkpoint(f"{code}:data", partial(update_lang_data, lang),
+                                                         partial(history_artifacts, code)),
+                     'network', ["top_articles"])
+        browser_stages.append(pipeline.add(f"{code}:render",
+                                           manifest.checkpoint(f"{code}:render", partial(render_lang_video, lang),
+                                                               partial(video_artifacts, code)),
+                                           'render', ["scaling", f"{code}:data"]))
+
+    # 内容准备完毕，关闭常驻浏览器池；放在 browser 池中执行，使共享浏览器在创建它的线程中关闭
+    pipeline.add("browser:shutdown", lambda _: browser_pool.shutdown(), 'browser', browser_stages, always=True)
+    return pipeline
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Wikipedia daily attention report")
+    parser.add_argument('--replay', action='store_true',
+                        help="只从本地 HTTP 缓存读取 Wikimedia 数据，不发起网络请求 (用于离线复现与基准测试)")
+    parser.add_argument('--engine', choices=['browser', 'native'], default=None,
+                        help="视频渲染引擎：browser (无头 Chromium 截图) 或 native (Pillow 直接绘制)，默认读取配置")
+    parser.add_argument('--farm', nargs='?', const=RENDER_FARM_DIR, default=None, metavar='FARM_DIR',
+                        help="将视频 segment 作为任务放入渲染农场队列，由 render_farm.py worker 渲染 (默认目录 videos/farm)")
+    parser.add_argument('--resume', action='store_true',
+                        help="从 data/runs/{date}.json 记录的进度继续：跳过已完成且产物未变化的阶段 (已发布的推文在任何情况下都不会重发)")
+    return parser.parse_args()
+
+
+def main(args):
+    if args.replay:
+        set_replay_mode(True)
 
-def main():
     yesterday = datetime.now(timezone.utc) - timedelta(days=1)
     date_str = get_date_str(yesterday)
     print(f"--- Report Date: {date_str} ---")
 
-    scaling_factors = get_siteviews_scaling_factors()
-    save_json_config(scaling_factors, BASE_COLOR_SLOPE_THRESHOLD)
+    # 每次运行生成一份 trace (data/traces/)，中途失败时也写出已记录的部分
+    tracing.enable(f"{date_str}_{datetime.now(timezone.utc):%H%M%S}")
+    try:
+        with tracing.span("run", date=date_str, resume=args.resume, engine=args.engine):
+            run_daily(args, yesterday, date_str)
+    finally:
+        tracing.write_report()
+
+
+def run_daily(args, yesterday, date_str):
+    manifest = RunManifest(date_str, resume=args.resume)
+    if args.resume:
+        print(f"Resuming from run manifest: {manifest.path}")
 
-    full_config = {
-        "baseThreshold": BASE_COLOR_SLOPE_THRESHOLD,
-        "scalingFactors": scaling_factors
-    }
+    print(">>> Phase 1: Preparing content (Data, Videos & Screenshots)...")
+    with tracing.span("phase.prepare"):
+        results = build_content_pipeline(yesterday, date_str, args, manifest).run()
 
     report_data = {"date": date_str, "results": []}
     tweet_queue = []
 
-    print(">>> Phase 1: Preparing content (Data & Screenshots)...")
+    # 按 LANG_CONFIG 顺序汇总，保证推文串的发布顺序与阶段完成顺序无关
     for lang in LANG_CONFIG:
-        print(f"\nProcessing {lang['code']}...")
-
-        articles_data = get_top_articles(lang['code'], yesterday)
+        code = lang['code']
+        articles_data = results.get(f"{code}:data")
+        video_path = results.get(f"{code}:render")
         if not articles_data:
-            print(f"No data for {lang['code']}, skipping.")
+            print(f"No content for {code}, skipping.")
             continue
 
-        print("Updating animation data...")
-        animator.update_data(lang['project'], date_str, articles_data, lang['code'])
-        video_path = animator.render_video(
-            date_str=date_str,
-            lang_code=lang['code'],
-            config=full_config
-        )
-        cleanup_old_videos(video_path)
-
-        # 生成链接
+        # 截图阶段失败时仍发布文字与视频
         full_list_link = generate_chart_link(lang['project'], articles_data, yesterday)
-        chart_link_top5 = generate_chart_link(lang['project'], articles_data, yesterday, top_n=5)
-        topviews_link = f"https://pageviews.wmcloud.org/topviews/?project={lang['project']}&platform=all-access&date={date_str}&excludes="
-
-        print("Taking screenshots...")
-        pic_dir = ensure_picture_dir(date_str, lang['code'])
-        screenshot_urls = {"topviews": topviews_link, "pageviews": chart_link_top5}
-        image_paths = capture_screenshots(screenshot_urls, pic_dir)
-
+        captured = (results.get("screenshots") or {}).get(code)
+        image_paths = captured['images'] if captured else []
+        if not captured:
+            print(f"[{code}] No screenshots, posting without images.")
         tweet_text = construct_tweet(lang, date_str, articles_data, full_list_link)
         print(f"[Content Preview] {tweet_text[:50]}...")
 
         # 区分视频和图片
         report_data["results"].append({
-            "lang": lang['code'],
+            "lang": code,
             "data": articles_data,
             "link": full_list_link,
             "images": image_paths,
@@ -239,7 +259,7 @@ def main():
         })
 
         tweet_queue.append({
-            "lang_code": lang['code'],
+            "lang_code": code,
             "text": tweet_text,
             "video_path": video_path,
             "image_paths": image_paths,
@@ -249,68 +269,23 @@ def main():
     print("\n>>> Phase 2: Posting Tweets...")
     client_v2 = get_twitter_client_v2()
     api_v1 = get_twitter_auth_v1()
-    last_successful_id = None
 
     if client_v2 and api_v1:
-        for item in tweet_queue:
-            lang_code = item['lang_code']
-            text = item['text']
-            video_path = item.get('video_path')
-            image_paths = item.get('image_paths', [])
-
-            try:
-                media_ids = []
-
-                # 1. 上传视频 (作为首个媒体)
-                if video_path and os.path.exists(video_path):
-                    print(f"[{lang_code}] Uploading video: {video_path}...")
-                    media = api_v1.media_upload(filename=video_path, media_category='tweet_video', chunked=True)
-                    if hasattr(media, 'processing_info'):
-                        state = media.processing_info['state']
-                        while state in ['pending', 'in_progress']:
-                            time.sleep(2)
-                            status = api_v1.get_media_upload_status(media.media_id)
-                            state = status.processing_info['state']
-                            if state == 'failed':
-                                print(f"[{lang_code}] Video processing failed.")
-                                break
-                    media_ids.append(media.media_id)
-
-                # 2. 上传图片 (Mixed Media: Twitter API v2 支持 1 Video + Images)
-                # 注意：推特限制单个推文最多 4 个媒体文件
-                for p in image_paths:
-                    if os.path.exists(p) and len(media_ids) < 4:
-                        print(f"[{lang_code}] Uploading image: {p}...")
-                        m = api_v1.media_upload(filename=p)
-                        media_ids.append(m.media_id)
-
-                # 3. 发送推文 (视频 + 图片混合)
-                print(f"[{lang_code}] Sending tweet with {len(media_ids)} media items...")
-
-                kwargs = {
-                    'text': text,
-                    'media_ids': media_ids if media_ids else None
-                }
-
-                # 发送英语推文，其他语言推文回复上一条（形成 Thread）
-                if last_successful_id:
-                    kwargs['in_reply_to_tweet_id'] = last_successful_id
-
-                resp = client_v2.create_tweet(**kwargs)
-                last_successful_id = resp.data['id']
-                print(f"[{lang_code}] Posted successfully. ID: {last_successful_id}")
-
-                if lang_code == 'en':
-                    update_readme(date_str, last_successful_id)
-
-                time.sleep(5)
-
-            except Exception as e:
-                print(f"[{lang_code}] Failed to post: {e}")
+        def on_posted(item, tweet_id):
+            # 先落盘发布状态，再做其他事情
+            manifest.mark_posted(item['lang_code'], tweet_id)
+            if item['lang_code'] == 'en':
+                update_readme(date_str, tweet_id)
+
+        with tracing.span("phase.post", tweets=len(tweet_queue)):
+            post_thread(client_v2, api_v1, tweet_queue, on_posted=on_posted, posted=manifest.posts(),
+                        on_sending=lambda item: manifest.mark_sending(item['lang_code']),
+                        on_rejected=lambda item, e: manifest.mark_failed(item['lang_code'], str(e)))
     else:
         print("Twitter credentials missing, skipping post phase.")
 
     save_daily_report_data(date_str, report_data)
+    print_http_stats()
 
     # 执行目录清理 (保留最近 6 天)
     cleanup_video_directories(keep_count=6)
@@ -319,4 +294,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    main(parse_args())
@@ -0,0 +1,522 @@
+# src/native_renderer.py
+
+import os
+import math
+import time
+import colorsys
+import subprocess
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+
+from config import (
+    VIDEO_FPS, VIDEO_SECONDS_PER_DAY, VIDEO_TOTAL_FRAMES_PER_DAY, VIDEO_WIDTH, VIDEO_HEIGHT,
+    VIDEO_SCALE, VIDEO_PRE_ROLL_FRAMES
+)
+import tracing
+from frame_writer import FrameWriter
+from history_store import build_segment_slice, load_segment_slice
+
+# 无浏览器的原生渲染引擎：用 Python 复现 docs/js/render.js 的条形图模拟，
+# 用 Pillow 直接绘制 RGB 帧并通过管道以 rawvideo 写入 FFmpeg。
+# 模拟部分与前端逐帧一致 (相同的浮点运算顺序)，绘制部分按 capture 模式的 CSS 布局近似还原。
+
+MINUTES_PER_DAY = 1440
+
+# 与 docs/js/constants.js 保持一致
+BAR_COUNT = 10
+DERIVATIVE_WINDOW = 90  # 单位: 分钟
+MIN_SPEED = 0.03
+MAX_SPEED = 0.20
+TREND_SAMPLES = 10
+
+LANG_TITLES = {
+    'en': 'Wikipedia Top 10',
+    'zh': '维基百科前 10',
+    'ja': 'ウィキペディア トップ10',
+    'de': 'Wikipedia Top 10',
+    'fr': 'Wikipédia Top 10',
+    'ru': 'Топ-10 Википедии',
+    'it': 'Wikipedia Top 10'
+}
+
+# 与 docs/css (capture 模式) 保持一致的布局尺寸，单位为 CSS 像素
+APP_PADDING = 20
+HEADER_HEIGHT = 90
+HEADER_MARGIN_BOTTOM = 20
+HEADER_PADDING_X = 40
+HEADER_RADIUS = 18
+CHART_MARGIN = 20
+ROW_PADDING_X = 10
+RANK_WIDTH = 40
+RANK_MARGIN_RIGHT = 20
+FILL_HEIGHT_RATIO = 0.81
+FILL_PADDING_X = 18
+FILL_MIN_WIDTH = 30
+BAR_RADIUS = 6
+TITLE_MARGIN_RIGHT = 15
+
+FONT_SIZE_TITLE = 38.4
+FONT_SIZE_TIME = 38.4
+FONT_SIZE_RANK = 19.2
+FONT_SIZE_BAR_TITLE = 24
+FONT_SIZE_BAR_VALUE = 24
+
+BG_COLOR = (17, 17, 17)
+HEADER_BG_COLOR = (28, 28, 28)      # rgba(30, 30, 30, 0.85) 叠加在背景色上
+HEADER_BORDER_COLOR = (51, 51, 51)  # rgba(255, 255, 255, 0.1) 叠加在标题栏上
+RANK_COLOR = (102, 102, 102)
+TEXT_COLOR = (255, 255, 255)
+
+# 字体候选 (依次尝试，均不存在时退回 Pillow 内置字体)
+SERIF_FONTS = [
+    "/usr/share/fonts/truetype/noto/NotoSerif-Bold.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSerif-Bold.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSerif-Bold.ttf",
+]
+CJK_FONTS = [
+    "/usr/share/fonts/opentype/noto/NotoSerifCJK-Bold.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
+]
+MONO_FONTS = [
+    "/usr/share/fonts/truetype/liberation/LiberationMono-Bold.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSansMono-Bold.ttf",
+]
+# Noto CJK 字体集合中各地区字形的索引
+CJK_FONT_INDEX = {'ja': 0, 'zh': 2}
+
+
+def chart_layout() -> Tuple[int, int]:
+    """返回 capture 模式下图表容器的高度与行高 (CSS 像素)，对应 ui.updateLayoutMetrics"""
+    chart_top = APP_PADDING + HEADER_HEIGHT + HEADER_MARGIN_BOTTOM
+    chart_height = VIDEO_HEIGHT - APP_PADDING - chart_top - CHART_MARGIN
+    return chart_height, math.floor(chart_height / BAR_COUNT)
+
+
+# --- 数据 ---
+
+# 当前进程最近一次读取的切片
+_slice_cache: Dict[str, Any] = {}
+
+
+def load_segment_data(lang_code: str, date_str: str, prev_date_str: Optional[str] = None,
+                      slice_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    返回渲染单日所需的分钟曲线 (格式见 history_store.build_segment_slice)。
+    给定 slice_dir 时从主进程写出的切片内存映射读取 (同一进程内缓存)，否则直接从历史存储装配。
+    """
+    if slice_dir is None:
+        return build_segment_slice(lang_code, date_str, prev_date_str)
+    key = (slice_dir, os.stat(os.path.join(slice_dir, "manifest.json")).st_mtime_ns)
+    if _slice_cache.get("key") != key:
+        _slice_cache["key"] = key
+        _slice_cache["data"] = load_segment_slice(slice_dir)
+    return _slice_cache["data"]
+
+
+# --- 模拟 (对应 render.js) ---
+
+class BarChartSimulation:
+    """
+    逐帧复现 advanceSimulation/renderCurrentState 的状态更新，不涉及任何绘制。
+    """
+
+    def __init__(self, data: Dict[str, Any], lang_code: str, config_data: Dict[str, Any],
+                 chart_height: int, row_height: int):
+        self.dates = data['dates']
+        self.curves = data['curves']
+        self.chart_height = chart_height
+        self.row_height = row_height
+        self.threshold = config_data['baseThreshold'] * (config_data['scalingFactors'].get(lang_code) or 1.0)
+
+        self.date_index = 0
+        self.minute = 0.0
+        # title -> {"currentY", "targetY", "speedFactor", "active"}；插入顺序即 DOM 中的叠放顺序
+        self.bars: Dict[str, Dict[str, Any]] = {}
+        self._row_maps: Dict[Tuple[str, str], np.ndarray] = {}
+
+    def seek(self, date_str: str, minute: float):
+        """对应 initializeToFrame 的初始化：清空条目并定位到指定日期与分钟"""
+        self.bars = {}
+        self.date_index = self.dates.index(date_str)
+        self.minute = minute
+
+    def export_state(self) -> Dict[str, Any]:
+        """导出可序列化的模拟状态 (对应 window.exportState)"""
+        return {"date_index": self.date_index, "minute": self.minute,
+                "bars": {title: dict(bar) for title, bar in self.bars.items()}}
+
+    def import_state(self, snapshot: Dict[str, Any]):
+        """恢复 export_state 导出的状态 (对应 window.importState)"""
+        self.date_index = snapshot["date_index"]
+        self.minute = snapshot["minute"]
+        self.bars = {title: dict(bar) for title, bar in snapshot["bars"].items()}
+
+    def start_day(self, date_str: str, prev_date_str: Optional[str]):
+        """定位到目标日第 0 帧之前：有前一天数据时从其预渲染起点模拟 VIDEO_PRE_ROLL_FRAMES 帧"""
+        dt = 1 / VIDEO_FPS
+        warmup = VIDEO_PRE_ROLL_FRAMES if prev_date_str else 0
+        if warmup:
+            self.seek(prev_date_str, MINUTES_PER_DAY - warmup * MINUTES_PER_DAY / VIDEO_TOTAL_FRAMES_PER_DAY)
+        else:
+            self.seek(date_str, 0)
+        for _ in range(warmup):
+            self.advance(dt)
+
+    def advance(self, dt: float):
+        """对应 advanceSimulation"""
+        base_speed = MINUTES_PER_DAY / VIDEO_SECONDS_PER_DAY
+        self.minute += base_speed * dt
+        while self.minute >= MINUTES_PER_DAY:
+            self.minute -= MINUTES_PER_DAY
+            self.date_index += 1
+            if self.date_index >= len(self.dates):
+                self.date_index = 0
+        self._update(dt)
+
+    def time_label(self) -> str:
+        date_str = self.dates[self.date_index]
+        hour = math.floor(self.minute / 60)
+        minute = math.floor(self.minute % 60)
+        return f"{date_str.replace('-', '/')}-{hour:02d}:{minute:02d}"
+
+    def _row_map(self, d_str: str, other: str) -> np.ndarray:
+        """d_str 当日的条目在 other 日曲线矩阵中的行号 (缺失时指向全零末行)"""
+        key = (d_str, other)
+        if key not in self._row_maps:
+            titles = self.curves[d_str][0]
+            other_titles = self.curves[other][0]
+            lookup = {title: row for row, title in enumerate(other_titles)}
+            self._row_maps[key] = np.array([lookup.get(title, len(other_titles)) for title in titles], dtype=np.intp)
+        return self._row_maps[key]
+
+    def _sample(self, d_str: str, minute: float) -> np.ndarray:
+        """对应 getValueAt：返回当日全部条目在指定分钟 (可跨日) 的取值"""
+        date_index = self.date_index
+        while minute < 0:
+            minute += MINUTES_PER_DAY
+            date_index -= 1
+        while minute >= MINUTES_PER_DAY:
+            minute -= MINUTES_PER_DAY
+            date_index += 1
+        count = len(self.curves[d_str][0])
+        if date_index < 0 or date_index >= len(self.dates) or self.dates[date_index] not in self.curves:
+            return np.zeros(count, dtype=np.int64)
+        other = self.dates[date_index]
+        return self.curves[other][1][self._row_map(d_str, other), min(math.floor(minute), MINUTES_PER_DAY - 1)]
+
+    def _update(self, dt: float):
+        """对应 renderCurrentState 的状态部分"""
+        d_str = self.dates[self.date_index]
+        if d_str not in self.curves:
+            titles = []
+            samples = []
+        else:
+            titles = self.curves[d_str][0]
+            step = DERIVATIVE_WINDOW / TREND_SAMPLES
+            samples = [self._sample(d_str, self.minute - (i * step)).tolist() for i in range(TREND_SAMPLES)]
+
+        current_values = []
+        for col, title in enumerate(titles):
+            val = samples[0][col]
+            if val > 0:
+                trend_delta = self._trend([samples[i][col] for i in range(TREND_SAMPLES)])
+                current_values.append((title, val, val - trend_delta))
+
+        # 稳定排序，与 Array.prototype.sort 一致
+        current_values.sort(key=lambda item: -item[1])
+        top_n = current_values[:BAR_COUNT]
+        frame_max_val = max(1, top_n[0][1]) if top_n else 1
+
+        active_titles = set()
+        for index, (title, val, past_val) in enumerate(top_n):
+            active_titles.add(title)
+            bar = self.bars.get(title)
+            if bar is None:
+                bar = {"currentY": self.chart_height, "targetY": 0, "speedFactor": MIN_SPEED, "active": True}
+                self.bars[title] = bar
+
+            bar["targetY"] = index * self.row_height
+            bar["active"] = True
+
+            width_pct = (math.log(max(1, val)) / math.log(max(1.1, frame_max_val))) * 100
+            width_pct = max(min(width_pct, 100), 15)
+
+            trend_delta = val - past_val
+            slope = trend_delta / DERIVATIVE_WINDOW
+            bar["rank"] = index + 1
+            bar["value"] = val
+            bar["widthPct"] = width_pct
+            bar["color"] = self._derivative_color(slope)
+
+            normalized_pos_delta = abs(trend_delta) / frame_max_val if frame_max_val > 1 else 0
+            bar["speedFactor"] = MIN_SPEED + (MAX_SPEED - MIN_SPEED) * normalized_pos_delta
+
+        for title in list(self.bars.keys()):
+            if title not in active_titles:
+                bar = self.bars[title]
+                bar["targetY"] = self.chart_height + self.row_height
+                bar["speedFactor"] = MIN_SPEED
+                bar["active"] = False
+                if bar["currentY"] > self.chart_height + 200:
+                    del self.bars[title]
+
+        time_scale = min(dt * 60, 1.0)
+        for bar in self.bars.values():
+            bar["currentY"] += (bar["targetY"] - bar["currentY"]) * min(1, bar["speedFactor"] * time_scale)
+
+    @staticmethod
+    def _trend(values: List[int]) -> float:
+        """对应 calculateTrend：最近 DERIVATIVE_WINDOW 分钟内的线性回归斜率乘以窗口长度"""
+        step = DERIVATIVE_WINDOW / TREND_SAMPLES
+        sum_x = sum_y = sum_xy = sum_xx = 0.0
+        n = 0
+        for i, val in enumerate(values):
+            x = -(i * step)
+            sum_x += x
+            sum_y += val
+            sum_xy += x * val
+            sum_xx += x * x
+            n += 1
+        slope = (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x * sum_x)
+        return 0 if math.isnan(slope) else slope * DERIVATIVE_WINDOW
+
+    def _derivative_color(self, slope: float) -> str:
+        """对应 getDerivativeColor"""
+        ratio = slope / self.threshold
+        clamped_ratio = max(-1, min(1, ratio))
+        if clamped_ratio > 0:
+            hue = 120 - clamped_ratio * 120  # 绿 -> 红
+        else:
+            hue = 120 - clamped_ratio * 150  # 绿 -> 紫
+        overdrive_ratio = max(0, min(1, abs(ratio) - 1))
+        lightness = 55 - (overdrive_ratio * 20)
+        return f"hsl({hue}, 90%, {lightness}%)"
+
+
+# --- 绘制 ---
+
+def _hsl_to_rgb(color: str) -> Tuple[int, int, int]:
+    h, s, l = (float(part.strip().rstrip('%')) for part in color[4:-1].split(','))
+    r, g, b = colorsys.hls_to_rgb((h % 360) / 360, l / 100, s / 100)
+    return round(r * 255), round(g * 255), round(b * 255)
+
+
+def _load_font(candidates: List[str], size: float, index: int = 0):
+    from PIL import ImageFont
+    for path in candidates:
+        if os.path.exists(path):
+            return ImageFont.truetype(path, size=round(size), index=index)
+    return ImageFont.load_default(size=round(size))
+
+
+class FrameRasterizer:
+    """
+    按 capture 模式的页面布局，将模拟状态绘制为 RGB 帧。
+    """
+
+    def __init__(self, lang_code: str, scale: float = VIDEO_SCALE):
+        from PIL import Image, ImageDraw
+
+        self.scale = scale
+        self.width = int(VIDEO_WIDTH * scale)
+        self.height = int(VIDEO_HEIGHT * scale)
+
+        # 图表容器 (#chart-container) 的位置与尺寸
+        chart_top = APP_PADDING + HEADER_HEIGHT + HEADER_MARGIN_BOTTOM
+        self.chart_x = APP_PADDING + CHART_MARGIN
+        self.chart_y = chart_top
+        self.chart_width = VIDEO_WIDTH - 2 * (APP_PADDING + CHART_MARGIN)
+        self.chart_height, self.row_height = chart_layout()
+        self.track_width = self.chart_width - 2 * ROW_PADDING_X - RANK_WIDTH - RANK_MARGIN_RIGHT
+
+        if lang_code in CJK_FONT_INDEX:
+            title_fonts = CJK_FONTS + SERIF_FONTS
+        else:
+            title_fonts = SERIF_FONTS + CJK_FONTS
+        font_index = CJK_FONT_INDEX.get(lang_code, 0)
+        self.font_title = _load_font(title_fonts, FONT_SIZE_TITLE * scale, font_index)
+        self.font_bar_title = _load_font(title_fonts, FONT_SIZE_BAR_TITLE * scale, font_index)
+        self.font_time = _load_font(MONO_FONTS, FONT_SIZE_TIME * scale)
+        self.font_rank = _load_font(MONO_FONTS, FONT_SIZE_RANK * scale)
+        self.font_value = _load_font(MONO_FONTS, FONT_SIZE_BAR_VALUE * scale)
+
+        # 静态背景：标题栏与标题文字
+        self.background = Image.new('RGB', (self.width, self.height), BG_COLOR)
+        draw = ImageDraw.Draw(self.background)
+        header_box = self._box(APP_PADDING, APP_PADDING, VIDEO_WIDTH - APP_PADDING, APP_PADDING + HEADER_HEIGHT)
+        draw.rounded_rectangle(header_box, radius=self._px(HEADER_RADIUS), fill=HEADER_BG_COLOR,
+                               outline=HEADER_BORDER_COLOR, width=max(1, self._px(1)))
+        self.header_center_y = self._px(APP_PADDING + HEADER_HEIGHT / 2)
+        draw.text((self._px(APP_PADDING + HEADER_PADDING_X), self.header_center_y),
+                  LANG_TITLES.get(lang_code, 'Wikipedia Top 10'), font=self.font_title, fill=TEXT_COLOR, anchor='lm')
+
+        self.chart_background = Image.new('RGB', (self._px(self.chart_width), self._px(self.chart_height)), BG_COLOR)
+        self._ellipsis_cache: Dict[Tuple[str, int], str] = {}
+
+    def _px(self, value: float) -> int:
+        return round(value * self.scale)
+
+    def _box(self, x0: float, y0: float, x1: float, y1: float) -> Tuple[int, int, int, int]:
+        return self._px(x0), self._px(y0), self._px(x1) - 1, self._px(y1) - 1
+
+    def _fit_title(self, title: str, max_width: int) -> str:
+        """对应 text-overflow: ellipsis"""
+        key = (title, max_width)
+        if key not in self._ellipsis_cache:
+            text = title
+            if self.font_bar_title.getlength(text) > max_width:
+                lo, hi = 0, len(title)
+                while lo < hi:
+                    mid = (lo + hi + 1) // 2
+                    if self.font_bar_title.getlength(title[:mid] + "…") <= max_width:
+                        lo = mid
+                    else:
+                        hi = mid - 1
+                text = title[:lo] + "…" if lo else ""
+            self._ellipsis_cache[key] = text
+        return self._ellipsis_cache[key]
+
+    def _draw_bar(self, draw, title: str, bar: Dict[str, Any], y: float):
+        row_h = self.row_height
+        center_y = self._px(y + row_h / 2)
+
+        draw.text((self._px(ROW_PADDING_X + RANK_WIDTH / 2), center_y), str(bar["rank"]),
+                  font=self.font_rank, fill=RANK_COLOR, anchor='mm')
+
+        fill_x = ROW_PADDING_X + RANK_WIDTH + RANK_MARGIN_RIGHT
+        fill_w = max(FILL_MIN_WIDTH, self.track_width * bar["widthPct"] / 100)
+        fill_h = row_h * FILL_HEIGHT_RATIO
+        fill_y = y + (row_h - fill_h) / 2
+        color = _hsl_to_rgb(bar["color"])
+        draw.rounded_rectangle(self._box(fill_x, fill_y, fill_x + fill_w, fill_y + fill_h),
+                               radius=self._px(BAR_RADIUS), fill=color)
+
+        shadow = tuple(int(c * 0.45) for c in color)
+        value_text = f"{bar['value']:,}"
+        value_right = self._px(fill_x + fill_w - FILL_PADDING_X)
+        value_width = self.font_value.getlength(value_text)
+        title_left = self._px(fill_x + FILL_PADDING_X)
+        title_text = self._fit_title(title.replace('_', ' '),
+                                     int(value_right - value_width - self._px(TITLE_MARGIN_RIGHT) - title_left))
+
+        for dy, fill in ((self._px(1), shadow), (0, TEXT_COLOR)):
+            if title_text:
+                draw.text((title_left, center_y + dy), title_text, font=self.font_bar_title, fill=fill, anchor='lm')
+            draw.text((value_right, center_y + dy), value_text, font=self.font_value, fill=fill, anchor='rm')
+
+    def render(self, simulation: BarChartSimulation) -> bytes:
+        """绘制当前模拟状态，返回 rgb24 原始像素"""
+        from PIL import Image, ImageDraw
+
+        chart = self.chart_background.copy()
+        draw = ImageDraw.Draw(chart)
+        for title, bar in simulation.bars.items():
+            y = bar["currentY"]
+            if "rank" not in bar or y >= self.chart_height or y + self.row_height <= 0:
+                continue
+            if bar["active"]:
+                self._draw_bar(draw, title, bar, y)
+            else:
+                # 离场条目整体半透明 (opacity: 0.5)
+                layer = chart.copy()
+                self._draw_bar(ImageDraw.Draw(layer), title, bar, y)
+                chart = Image.blend(chart, layer, 0.5)
+                draw = ImageDraw.Draw(chart)
+
+        frame = self.background.copy()
+        frame.paste(chart, (self._px(self.chart_x), self._px(self.chart_y)))
+        ImageDraw.Draw(frame).text((self.width - self._px(APP_PADDING + HEADER_PADDING_X), self.header_center_y),
+                                   simulation.time_label(), font=self.font_time, fill=TEXT_COLOR, anchor='rm')
+        return frame.tobytes()
+
+
+# --- 渲染任务 ---
+
+def compute_checkpoints(lang_code: str, date_str: str, prev_date_str: Optional[str],
+                        config_data: Dict[str, Any], start_frames: List[int],
+                        slice_dir: Optional[str] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    一次模拟整日 (不绘制)，返回各分块起始帧的状态检查点 {帧号: 状态}。
+    """
+    chart_height, row_height = chart_layout()
+    simulation = BarChartSimulation(load_segment_data(lang_code, date_str, prev_date_str, slice_dir),
+                                    lang_code, config_data, chart_height, row_height)
+    simulation.start_day(date_str, prev_date_str)
+
+    dt = 1 / VIDEO_FPS
+    checkpoints = {}
+    frame = 0
+    for target in sorted(start_frames):
+        for _ in range(frame, target):
+            simulation.advance(dt)
+        frame = target
+        checkpoints[target] = simulation.export_state()
+    return checkpoints
+
+
+def render_chunk_worker(args) -> bool:
+    """原生引擎的分块渲染 (见 _render_chunk)"""
+    chunk_index, start_frame, end_frame, date_str, _, lang_code = args[:6]
+    with tracing.span("render.chunk", engine='native', lang=lang_code, date=date_str, chunk=chunk_index,
+                      frames=end_frame - start_frame, checkpoint=args[8] is not None) as s:
+        ok = _render_chunk(args)
+        s.set(ok=ok, bytes=os.path.getsize(args[7]) if os.path.exists(args[7]) else 0)
+    return ok
+
+
+def _render_chunk(args) -> bool:
+    """
+    原生引擎的分块渲染：从检查点恢复 (无检查点时以无绘制的模拟从日初快进到分块起点)，
+    再逐帧绘制并以 rawvideo 写入 FFmpeg。两种方式得到的起始状态完全一致。
+    profile 为渲染预设 (config.VIDEO_PROFILES)：按其缩放绘制，模拟逐帧推进但只绘制每 frame_step 帧。
+    """
+    (chunk_index, start_frame, end_frame, date_str, prev_date_str, lang_code, config_data,
+     chunk_output_path, checkpoint, slice_dir, profile) = args
+
+    os.makedirs(os.path.dirname(chunk_output_path), exist_ok=True)
+    rasterizer = FrameRasterizer(lang_code, profile['scale'])
+    frame_step = profile['frame_step']
+    simulation = BarChartSimulation(load_segment_data(lang_code, date_str, prev_date_str, slice_dir),
+                                    lang_code, config_data, rasterizer.chart_height, rasterizer.row_height)
+
+    dt = 1 / VIDEO_FPS
+    if checkpoint is not None:
+        simulation.import_state(checkpoint)
+    else:
+        simulation.start_day(date_str, prev_date_str)
+        for _ in range(start_frame):
+            simulation.advance(dt)
+
+    ffmpeg_cmd = ['ffmpeg', '-y', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                  '-s', f'{rasterizer.width}x{rasterizer.height}', '-r', str(VIDEO_FPS / frame_step), '-i', '-',
+                  '-c:v', 'libx264', '-preset', profile['preset'], '-crf', str(profile['crf']),
+                  '-pix_fmt', 'yuv420p', chunk_output_path]
+    proc = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # 绘制与管道写入重叠进行
+    writer = FrameWriter(proc.stdin)
+    capture_seconds = 0.0
+
+    try:
+        for i in range(start_frame, end_frame):
+            start = time.perf_counter()
+            simulation.advance(dt)
+            if (i - start_frame + 1) % frame_step and i + 1 < end_frame:
+                continue
+            frame = rasterizer.render(simulation)
+            capture_seconds += time.perf_counter() - start
+            writer.put(frame)
+        writer.close()
+        print(writer.summary(capture_seconds, f"Chunk {chunk_index}"))
+    except Exception as e:
+        print(f"  [Chunk {chunk_index}] Native worker error: {e}")
+        return False
+    finally:
+        writer.stop()
+        if proc.stdin:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        proc.wait()
+
+    return proc.returncode == 0 and os.path.exists(chunk_output_path)
@@ -0,0 +1,150 @@
+# src/pipeline.py
+
+import time
+import concurrent.futures
+from typing import Callable, Dict, Any, Optional, Tuple, List
+
+import tracing
+
+# 阶段 DAG 调度器：每个阶段声明依赖与所属资源池 (如 network / browser / render)，
+# 依赖全部完成后提交到对应资源池的线程池执行；不同资源池的阶段互相重叠，同一资源池按容量限流。
+# 阶段失败时其下游阶段被跳过。运行结束后打印时间线与关键路径。
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable[[Dict[str, Any]], Any], pool: str, deps: Tuple[str, ...],
+                 always: bool = False):
+        self.name = name
+        self.fn = fn
+        self.pool = pool
+        self.deps = deps
+        self.always = always
+        self.status = "pending"  # pending / running / done / failed / skipped
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.ready = 0.0  # 依赖全部完成的时刻
+        self.start = 0.0
+        self.end = 0.0
+
+    @property
+    def wait(self) -> float:
+        """依赖就绪后等待资源池空闲的时间"""
+        return max(0.0, self.start - self.ready)
+
+    @property
+    def duration(self) -> float:
+        return max(0.0, self.end - self.start)
+
+
+class StagePipeline:
+    """
+    pools: {资源池名: 并发数}。
+    同一资源池的阶段在该池的线程中执行；容量为 1 的池始终使用同一线程
+    (Playwright 同步 API 只能在创建它的线程中使用，浏览器相关阶段应放入这样的池)。
+    """
+
+    def __init__(self, pools: Dict[str, int]):
+        self.pools = pools
+        self.stages: Dict[str, Stage] = {}
+        self.started = self.finished = 0.0
+
+    def add(self, name: str, fn: Callable[[Dict[str, Any]], Any], pool: str, deps=(), always: bool = False) -> str:
+        """
+        添加阶段 (依赖必须已添加)。fn 接收 {依赖名: 依赖结果}，返回值作为本阶段结果。
+        always: 依赖结束后无论成败都执行 (用于清理)。
+        """
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        if pool not in self.pools:
+            raise ValueError(f"Unknown resource pool: {pool}")
+        missing = [dep for dep in deps if dep not in self.stages]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages: {missing}")
+        self.stages[name] = Stage(name, fn, pool, tuple(deps), always)
+        return name
+
+    def _execute(self, stage: Stage):
+        stage.start = time.perf_counter()
+        try:
+            with tracing.span(f"stage {stage.name}", pool=stage.pool, queued=round(stage.wait, 3)):
+                return stage.fn({dep: self.stages[dep].result for dep in stage.deps})
+        finally:
+            stage.end = time.perf_counter()
+
+    def run(self) -> Dict[str, Any]:
+        """执行全部阶段，返回 {阶段名: 结果} (失败或跳过的阶段为 None)"""
+        executors = {pool: concurrent.futures.ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"{pool}-pool")
+                     for pool, size in self.pools.items()}
+        self.started = time.perf_counter()
+        pending = list(self.stages.values())
+        running: Dict[concurrent.futures.Future, Stage] = {}
+
+        try:
+            while pending or running:
+                # 按添加顺序 (拓扑序) 检查，同一轮内即可传播跳过状态
+                for stage in list(pending):
+                    dep_status = [self.stages[dep].status for dep in stage.deps]
+                    failed_upstream = any(status in ("failed", "skipped") for status in dep_status)
+                    if failed_upstream and not stage.always:
+                        stage.status = "skipped"
+                        pending.remove(stage)
+                        print(f"[pipeline] {stage.name} skipped (upstream failure)")
+                    elif all(status in ("done", "failed", "skipped") for status in dep_status):
+                        stage.status = "running"
+                        stage.ready = max([self.stages[dep].end for dep in stage.deps], default=self.started)
+                        pending.remove(stage)
+                        running[executors[stage.pool].submit(self._execute, stage)] = stage
+
+                if not running:
+                    break
+                done, _ = concurrent.futures.wait(list(running), return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        stage.result = future.result()
+                        stage.status = "done"
+                        print(f"[pipeline] {stage.name} done in {stage.duration:.1f}s")
+                    except Exception as e:
+                        stage.error = e
+                        stage.status = "failed"
+                        print(f"[pipeline] {stage.name} failed after {stage.duration:.1f}s: {e}")
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True)
+            self.finished = time.perf_counter()
+
+        self.print_report()
+        return {name: stage.result for name, stage in self.stages.items()}
+
+    def critical_path(self) -> List[Stage]:
+        """
+        从最后结束的阶段出发，逐级回溯最晚完成的依赖 (即真正限制其开始时间的依赖)。
+        """
+        finished = [s for s in self.stages.values() if s.status in ("done", "failed")]
+        if not finished:
+            return []
+        path = [max(finished, key=lambda s: s.end)]
+        while path[-1].deps:
+            path.append(max((self.stages[dep] for dep in path[-1].deps), key=lambda s: s.end))
+        return list(reversed(path))
+
+    def print_report(self):
+        wall = self.finished - self.started
+        print(f"\n>>> Pipeline timeline (wall {wall:.1f}s)")
+        print(f"  {'stage':<24} {'pool':<8} {'status':<8} {'start':>7} {'wait':>7} {'run':>8}")
+        for stage in sorted(self.stages.values(), key=lambda s: (s.start or float('inf'), s.name)):
+            if stage.status == "skipped":
+                print(f"  {stage.name:<24} {stage.pool:<8} {stage.status:<8}")
+                continue
+            print(f"  {stage.name:<24} {stage.pool:<8} {stage.status:<8} {stage.start - self.started:>6.1f}s "
+                  f"{stage.wait:>6.1f}s {stage.duration:>7.1f}s")
+
+        busy = {pool: sum(s.duration for s in self.stages.values() if s.pool == pool) for pool in self.pools}
+        print("  Pool utilisation: " + ", ".join(
+            f"{pool} {seconds / (wall * self.pools[pool]) * 100 if wall else 0:.0f}%" for pool, seconds in busy.items()))
+
+        path = self.critical_path()
+        if path:
+            steps = " -> ".join(f"{s.name} ({s.duration:.1f}s" + (f", queued {s.wait:.1f}s" if s.wait >= 0.1 else "") + ")"
+                                for s in path)
+            print(f"  Critical path ({sum(s.duration + s.wait for s in path):.1f}s): {steps}")
@@ -0,0 +1,57 @@
+# src/preview.py
+
+import sys
+import json
+import argparse
+
+import animator
+import browser_pool
+from config import CONFIG_JSON_PATH, VIDEO_PROFILES
+from history_store import load_history
+
+# 预览渲染：以 draft 预设 (低分辨率、低帧率、低画质) 走与正式渲染相同的代码路径，输出到 videos/drafts/。
+# 用法: python src/preview.py --lang en --day 2025-11-26 --frames 0:720 --engine native
+
+
+def parse_frame_range(value: str):
+    start, _, end = value.partition(':')
+    try:
+        frame_range = (int(start or 0), int(end))
+    except ValueError:
+        raise argparse.ArgumentTypeError("帧区间格式应为 START:END")
+    if frame_range[0] >= frame_range[1]:
+        raise argparse.ArgumentTypeError("帧区间为空")
+    return frame_range
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Render a fast draft preview of the daily video")
+    parser.add_argument('--lang', default='en', help="语言代码")
+    parser.add_argument('--date', default=None, help="视频日期 (默认为历史窗口中的最后一天)")
+    parser.add_argument('--day', action='append', default=None, help="只渲染该日的 segment (可重复)")
+    parser.add_argument('--frames', type=parse_frame_range, default=None, metavar='START:END',
+                        help="每天只渲染该帧区间")
+    parser.add_argument('--profile', default='draft', choices=list(VIDEO_PROFILES), help="渲染预设")
+    parser.add_argument('--engine', choices=['browser', 'native'], default=None, help="渲染引擎，默认读取配置")
+    return parser.parse_args()
+
+
+def main(args):
+    dates = load_history(args.lang, dates=[])['dates']
+    if not dates:
+        print(f"No history data found for {args.lang}.")
+        return 1
+
+    with open(CONFIG_JSON_PATH, 'r', encoding='utf-8') as f:
+        config_data = json.load(f)
+
+    try:
+        video_path = animator.render_video(args.date or dates[-1], args.lang, config_data, engine=args.engine,
+                                           profile=args.profile, days=args.day, frame_range=args.frames)
+    finally:
+        browser_pool.shutdown()
+    return 0 if video_path else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
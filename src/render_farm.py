@@ -0,0 +1,387 @@
+# src/render_farm.py
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import sqlite3
+import hashlib
+import argparse
+import threading
+import contextlib
+from typing import Dict, Any, List, Optional, Iterable
+
+import animator
+import browser_pool
+from config import (
+    VIDEO_DIR, RENDER_FARM_DIR, RENDER_FARM_LEASE_SECONDS, RENDER_FARM_HEARTBEAT_SECONDS,
+    RENDER_FARM_MAX_ATTEMPTS, RENDER_FARM_POLL_SECONDS, RENDER_FARM_TIMEOUT, RENDER_FARM_WORKER_TIMEOUT
+)
+from history_store import write_segment_slice
+
+# 渲染农场：把需要更新的单日 segment 作为任务放入农场目录中的 SQLite 队列，由任意数量的 worker 进程领取渲染。
+# 只支持单机：WAL 模式依赖本机共享内存，农场目录不能放在 NFS / SMB 等网络存储上。
+#   {farm_dir}/queue.db              - 任务队列 (WAL 模式，本机多进程并发安全)
+#   {farm_dir}/slices/{job_id}/      - 协调端写出的渲染切片，worker 无需访问历史存储
+#   {farm_dir}/segments/{job_id}.mp4 - worker 上传的渲染结果，协调端取回后删除
+# worker 领取任务时获得租约，渲染期间按心跳续约；租约过期 (worker 崩溃或失联) 的任务重新排队。
+# 任务 ID 含渲染输入的哈希，输入相同的任务不会重复排队。
+# worker 每次轮询与续约都会记录心跳；协调端在 RENDER_FARM_WORKER_TIMEOUT 内没有看到任何 worker 活动时不再等待。
+#
+# 用法：
+#   协调端: python src/main.py --farm [farm_dir]
+#   worker: python src/render_farm.py worker [--farm-dir DIR] [--exit-when-idle]
+#   状态:   python src/render_farm.py status [--farm-dir DIR]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            TEXT PRIMARY KEY,
+    lang          TEXT NOT NULL,
+    date          TEXT NOT NULL,
+    prev_date     TEXT,
+    engine        TEXT NOT NULL,
+    config        TEXT NOT NULL,
+    inputs        TEXT NOT NULL,
+    status        TEXT NOT NULL,  -- pending / leased / done / failed
+    worker        TEXT,
+    lease_expires REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    error         TEXT,
+    created       REAL NOT NULL,
+    updated       REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    id        TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL
+);
+"""
+
+
+def job_id_for(lang_code: str, date_str: str, inputs: Dict[str, Any]) -> str:
+    digest = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+    return f"{lang_code}_{date_str}_{digest[:16]}"
+
+
+class RenderQueue:
+    """
+    农场目录中的任务队列。每个线程/进程使用各自的实例 (SQLite 连接不跨线程共享)。
+    状态变更均在 BEGIN IMMEDIATE 事务中完成，多个 worker 不会领取到同一任务。
+    """
+
+    def __init__(self, farm_dir: str):
+        self.farm_dir = farm_dir
+        os.makedirs(os.path.join(farm_dir, "segments"), exist_ok=True)
+        os.makedirs(os.path.join(farm_dir, "slices"), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(farm_dir, "queue.db"), timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def slice_dir(self, job_id: str) -> str:
+        return os.path.join(self.farm_dir, "slices", job_id)
+
+    def result_path(self, job_id: str) -> str:
+        return os.path.join(self.farm_dir, "segments", f"{job_id}.mp4")
+
+    def approximate_marker(self, job_id: str) -> str:
+        """worker 以预渲染代替检查点完成渲染时写入的标记，协调端据此不缓存该结果"""
+        return os.path.join(self.farm_dir, "segments", f"{job_id}.approximate")
+
+    def submit(self, job_id: str, lang_code: str, date_str: str, prev_date_str: Optional[str], engine: str,
+               config_data: Dict[str, Any], inputs: Dict[str, Any]) -> bool:
+        """
+        加入任务。同 ID 的任务已在排队、渲染中或已有结果时不重复加入，返回 False。
+        """
+        now = time.time()
+        with self._transaction():
+            row = self.conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row and (row['status'] in ('pending', 'leased') or
+                        (row['status'] == 'done' and os.path.exists(self.result_path(job_id)))):
+                return False
+            self.conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, lang, date, prev_date, engine, config, inputs, status, attempts,"
+                " created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', 0, ?, ?)",
+                (job_id, lang_code, date_str, prev_date_str, engine, json.dumps(config_data),
+                 json.dumps(inputs, sort_keys=True), now, now))
+        return True
+
+    def _expire_leases(self, now: float):
+        """租约过期的任务重新排队；已用尽尝试次数的标记为失败"""
+        self.conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,"
+            " error = 'lease expired (worker ' || worker || ')', worker = NULL, lease_expires = NULL, updated = ?"
+            " WHERE status = 'leased' AND lease_expires < ?",
+            (RENDER_FARM_MAX_ATTEMPTS, now, now))
+
+    def expire_leases(self):
+        with self._transaction():
+            self._expire_leases(time.time())
+
+    def _touch_worker(self, worker_id: str, now: float):
+        self.conn.execute("INSERT OR REPLACE INTO workers (id, last_seen) VALUES (?, ?)", (worker_id, now))
+
+    def last_worker_seen(self) -> Optional[float]:
+        """最近一次 worker 活动 (轮询或续约) 的时间，从未有 worker 连接时为 None"""
+        row = self.conn.execute("SELECT MAX(last_seen) AS last_seen FROM workers").fetchone()
+        return row['last_seen']
+
+    def workers(self) -> Dict[str, float]:
+        return {row['id']: row['last_seen']
+                for row in self.conn.execute("SELECT * FROM workers ORDER BY last_seen DESC").fetchall()}
+
+    def lease(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """领取最早加入的待处理任务并获得租约，队列为空时返回 None"""
+        now = time.time()
+        with self._transaction():
+            self._touch_worker(worker_id, now)
+            self._expire_leases(now)
+            row = self.conn.execute(
+                "SELECT * FROM jobs WHERE status = 'pending' ORDER BY created, date LIMIT 1").fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1,"
+                " updated = ? WHERE id = ?",
+                (worker_id, now + RENDER_FARM_LEASE_SECONDS, now, row['id']))
+        job = dict(row)
+        job['attempts'] += 1
+        return job
+
+    def _update_leased(self, sql: str, params: tuple, job_id: str, worker_id: str) -> bool:
+        """仅当任务仍由 worker_id 持有时执行更新，返回是否成功"""
+        with self._transaction():
+            self._touch_worker(worker_id, time.time())
+            cursor = self.conn.execute(f"{sql} WHERE id = ? AND worker = ? AND status = 'leased'",
+                                       (*params, job_id, worker_id))
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """续约；租约已被收回时返回 False"""
+        now = time.time()
+        return self._update_leased("UPDATE jobs SET lease_expires = ?, updated = ?",
+                                   (now + RENDER_FARM_LEASE_SECONDS, now), job_id, worker_id)
+
+    def complete(self, job_id: str, worker_id: str) -> bool:
+        return self._update_leased("UPDATE jobs SET status = 'done', lease_expires = NULL, error = NULL, updated = ?",
+                                   (time.time(),), job_id, worker_id)
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        return self._update_leased(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,"
+            " worker = NULL, lease_expires = NULL, error = ?, updated = ?",
+            (RENDER_FARM_MAX_ATTEMPTS, error, time.time()), job_id, worker_id)
+
+    def jobs(self, job_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        if job_ids is None:
+            rows = self.conn.execute("SELECT * FROM jobs ORDER BY created, date").fetchall()
+        else:
+            job_ids = list(job_ids)
+            if not job_ids:
+                return {}
+            placeholders = ", ".join("?" for _ in job_ids)
+            rows = self.conn.execute(f"SELECT * FROM jobs WHERE id IN ({placeholders})", job_ids).fetchall()
+        return {row['id']: dict(row) for row in rows}
+
+
+# --- 协调端 ---
+
+def render_segments(farm_dir: str, jobs: List[Dict[str, Any]], lang_code: str, config_data: Dict[str, Any],
+                    engine: str):
+    """
+    将 render_video 中需要更新的 segment 加入农场队列，等待 worker 完成并取回结果 (写入缓存键)。
+    jobs: [{"date", "prev_date", "path", "inputs"}]
+    """
+    queue = RenderQueue(farm_dir)
+    try:
+        pending = {}
+        for job in jobs:
+            job_id = job_id_for(lang_code, job["date"], job["inputs"])
+            pending[job_id] = job
+            # 切片先于任务写入，worker 领取时切片已就绪
+            write_segment_slice(lang_code, job["date"], job["prev_date"], queue.slice_dir(job_id))
+            if not queue.submit(job_id, lang_code, job["date"], job["prev_date"], engine, config_data, job["inputs"]):
+                print(f"  Farm job {job_id} already queued or rendered.")
+        print(f"  Submitted {len(pending)} segment jobs to render farm {farm_dir}, waiting for workers...")
+
+        start = time.time()
+        deadline = start + RENDER_FARM_TIMEOUT
+        while pending and time.time() < deadline:
+            # 长时间没有任何 worker 活动 (未启动或全部退出) 时不再等待，任务留在队列中供之后的 worker 领取
+            last_seen = max(queue.last_worker_seen() or 0, start)
+            if time.time() - last_seen > RENDER_FARM_WORKER_TIMEOUT:
+                print(f"  No render farm worker seen for {RENDER_FARM_WORKER_TIMEOUT}s, giving up on "
+                      f"{len(pending)} segment jobs (start one with: python src/render_farm.py worker).")
+                break
+            queue.expire_leases()
+            for job_id, row in queue.jobs(pending.keys()).items():
+                if row['status'] == 'done':
+                    _collect(queue, job_id, pending.pop(job_id))
+                elif row['status'] == 'failed':
+                    print(f"  Failed to render segment {pending.pop(job_id)['date']} on farm: {row['error']}")
+            if pending:
+                time.sleep(RENDER_FARM_POLL_SECONDS)
+
+        for job_id, job in pending.items():
+            print(f"  Gave up waiting for farm job {job_id} (segment {job['date']}).")
+    finally:
+        queue.close()
+
+
+def _collect(queue: RenderQueue, job_id: str, job: Dict[str, Any]):
+    """取回 worker 上传的 segment，写入缓存键，并清理农场中的切片与结果"""
+    result_path = queue.result_path(job_id)
+    if not os.path.exists(result_path):
+        print(f"  Warning: Farm job {job_id} is done but its segment is missing.")
+        return
+    os.makedirs(os.path.dirname(job["path"]), exist_ok=True)
+    tmp_path = f"{job['path']}.tmp"
+    shutil.copyfile(result_path, tmp_path)
+    os.replace(tmp_path, job["path"])
+    exact = not os.path.exists(queue.approximate_marker(job_id))
+    animator._write_segment_key(job["path"], job["inputs"], exact)
+    print(f"  Collected segment {job['date']} from farm{'' if exact else ' (approximate render, not cached)'}.")
+
+    os.remove(result_path)
+    if not exact:
+        os.remove(queue.approximate_marker(job_id))
+    shutil.rmtree(queue.slice_dir(job_id), ignore_errors=True)
+
+
+# --- worker ---
+
+def _heartbeat(farm_dir: str, job_id: str, worker_id: str, stop: threading.Event, lost: threading.Event):
+    queue = RenderQueue(farm_dir)
+    try:
+        while not stop.wait(RENDER_FARM_HEARTBEAT_SECONDS):
+            if not queue.heartbeat(job_id, worker_id):
+                lost.set()
+                return
+    finally:
+        queue.close()
+
+
+def _process_job(queue: RenderQueue, job: Dict[str, Any], worker_id: str):
+    job_id = job['id']
+    inputs = json.loads(job['inputs'])
+    print(f"[{worker_id}] Rendering {job_id} (attempt {job['attempts']}/{RENDER_FARM_MAX_ATTEMPTS})...")
+
+    # 前端资源或渲染代码与协调端不一致时渲染结果会不同，拒绝该任务
+    if animator._render_assets_hash(job['engine']) != inputs['assets']:
+        queue.fail(job_id, worker_id, f"render assets on {worker_id} differ from the coordinator's")
+        print(f"[{worker_id}] Render assets differ from the coordinator's, skipping {job_id}.")
+        return
+
+    stop, lost = threading.Event(), threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(queue.farm_dir, job_id, worker_id, stop, lost),
+                                 daemon=True)
+    heartbeat.start()
+
+    local_path = os.path.join(VIDEO_DIR, "temp", "farm", f"{job_id}.mp4")
+    error = "render failed"
+    exact = True
+    try:
+        ok, exact = animator.render_day_segment_parallel(job['date'], job['prev_date'], job['lang'],
+                                                  json.loads(job['config']), local_path, job['engine'],
+                                                  slice_dir=queue.slice_dir(job_id))
+    except Exception as e:
+        ok, error = False, str(e)
+    finally:
+        stop.set()
+        heartbeat.join()
+
+    if lost.is_set():
+        print(f"[{worker_id}] Lease on {job_id} was lost, discarding result.")
+    elif ok:
+        # 上传：先写临时文件再原子替换，协调端不会读到不完整的视频
+        tmp_path = f"{queue.result_path(job_id)}.tmp"
+        shutil.copyfile(local_path, tmp_path)
+        if exact:
+            if os.path.exists(queue.approximate_marker(job_id)):
+                os.remove(queue.approximate_marker(job_id))
+        else:
+            open(queue.approximate_marker(job_id), 'w').close()
+        os.replace(tmp_path, queue.result_path(job_id))
+        if queue.complete(job_id, worker_id):
+            print(f"[{worker_id}] Uploaded {job_id}.")
+        else:
+            print(f"[{worker_id}] Lease on {job_id} expired before completion, result discarded.")
+    else:
+        queue.fail(job_id, worker_id, error)
+        print(f"[{worker_id}] Failed {job_id}: {error}")
+
+    if os.path.exists(local_path):
+        os.remove(local_path)
+
+
+def run_worker(farm_dir: str, worker_id: Optional[str] = None, exit_when_idle: bool = False):
+    """循环领取并渲染任务；exit_when_idle 为 True 时队列为空即退出"""
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    queue = RenderQueue(farm_dir)
+    print(f"[{worker_id}] Render farm worker polling {farm_dir}...")
+    try:
+        while True:
+            job = queue.lease(worker_id)
+            if job is not None:
+                _process_job(queue, job, worker_id)
+            elif exit_when_idle:
+                print(f"[{worker_id}] Queue is empty, exiting.")
+                break
+            else:
+                time.sleep(RENDER_FARM_POLL_SECONDS)
+    finally:
+        queue.close()
+        browser_pool.shutdown()
+
+
+def print_status(farm_dir: str):
+    queue = RenderQueue(farm_dir)
+    try:
+        queue.expire_leases()
+        jobs = queue.jobs()
+        workers = queue.workers()
+    finally:
+        queue.close()
+    now = time.time()
+    print(f"Render farm {farm_dir}: {len(workers)} workers, {len(jobs)} jobs")
+    for worker_id, last_seen in workers.items():
+        print(f"  {worker_id:<40} last seen {now - last_seen:.0f}s ago")
+    print(f"  {'job':<40} {'status':<8} {'attempts':>8}  worker / error")
+    for job_id, row in jobs.items():
+        detail = row['worker'] if row['status'] == 'leased' else (row['error'] or '')
+        print(f"  {job_id:<40} {row['status']:<8} {row['attempts']:>8}  {detail}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Render farm worker and queue status")
+    parser.add_argument('command', choices=['worker', 'status'])
+    parser.add_argument('--farm-dir', default=RENDER_FARM_DIR, help="农场目录 (协调端与本机各 worker 共享)")
+    parser.add_argument('--worker-id', default=None, help="worker 标识 (默认为 主机名-进程号)")
+    parser.add_argument('--exit-when-idle', action='store_true', help="队列为空时退出")
+    return parser.parse_args()
+
+
+def main(args):
+    if args.command == 'worker':
+        run_worker(args.farm_dir, args.worker_id, args.exit_when_idle)
+    else:
+        print_status(args.farm_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,174 @@
+# src/run_manifest.py
+
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, Optional, Iterable
+
+from config import DATA_DIR
+
+# 运行清单：data/runs/{date}.json 记录当天运行中每个已完成阶段的结果与产物哈希，以及每种语言的推文发布状态。
+# - --resume 时，结果仍有效 (产物哈希与当前文件一致，且上游阶段的结果与产物与记录时相同) 的阶段直接复用记录的结果；
+# - 发布状态无论是否 --resume 都会读取：已发布 (posted) 的语言不再发布，
+#   发送中 (sending，即上次在 create_tweet 前后中断、结果未知) 的语言也不再自动重发，需人工确认。
+#
+# 清单格式：
+# {"date": ..., "stages": {阶段名: {"status": "done"/"failed", "finished": ..., "duration": ...,
+#                                   "result": ..., "artifacts": {产物标识: 哈希}, "deps": 上游指纹, "error": ...}},
+#  "posts": {lang_code: {"state": "sending"/"posted", "tweet_id": ..., "time": ...}}}
+
+RUNS_DIR = os.path.join(DATA_DIR, "runs")
+
+
+def file_hash(path: str) -> Optional[str]:
+    """文件内容的 SHA-256，文件不存在时为 None"""
+    if not path or not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_hashes(paths: Iterable[str]) -> Dict[str, Optional[str]]:
+    return {path: file_hash(path) for path in paths}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+class RunManifest:
+    def __init__(self, date_str: str, resume: bool = False, runs_dir: str = RUNS_DIR):
+        self.date_str = date_str
+        self.resume = resume
+        self.path = os.path.join(runs_dir, f"{date_str}.json")
+        self._lock = threading.Lock()
+
+        data = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: Could not read run manifest {self.path}: {e}")
+        data = data or {}
+
+        # 非 --resume 时丢弃阶段记录重新执行，但保留发布状态，避免重复发推
+        self.data = {
+            "date": date_str,
+            "created": data.get("created") or _now(),
+            "stages": data.get("stages", {}) if resume else {},
+            "posts": data.get("posts", {}),
+        }
+        self._save()
+
+    def _save(self):
+        with self._lock:
+            self.data["updated"] = _now()
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+
+    # --- 阶段 ---
+
+    def deps_fingerprint(self, deps: Dict[str, Any]) -> str:
+        """
+        上游阶段的指纹：各依赖的结果及其记录的产物哈希 (如 {lang}:data 重写后的历史分片哈希)。
+        """
+        payload = {dep: {"result": result, "artifacts": (self.data["stages"].get(dep) or {}).get("artifacts")}
+                   for dep, result in deps.items()}
+        return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+                              .encode('utf-8')).hexdigest()
+
+    def completed(self, name: str, artifacts: Optional[Callable[[Any], Dict[str, Optional[str]]]] = None,
+                  deps_fingerprint: Optional[str] = None):
+        """
+        阶段已完成、上游未变化且产物未变化时返回 (True, 记录的结果)，否则返回 (False, None)。
+        artifacts(result) 计算产物的当前哈希，与记录比较。
+        """
+        record = self.data["stages"].get(name)
+        if not record or record.get("status") != "done":
+            return False, None
+        if deps_fingerprint is not None and record.get("deps") != deps_fingerprint:
+            print(f"[resume] {name}: upstream stages changed, running again")
+            return False, None
+        if artifacts is not None:
+            current = artifacts(record["result"])
+            if current != record.get("artifacts") or any(h is None for h in current.values()):
+                print(f"[resume] {name}: artifacts changed or missing, running again")
+                return False, None
+        return True, record["result"]
+
+    def record_stage(self, name: str, status: str, duration: float, result: Any = None,
+                     artifacts: Optional[Dict[str, Optional[str]]] = None, error: Optional[str] = None,
+                     deps_fingerprint: Optional[str] = None):
+        record = {"status": status, "finished": _now(), "duration": round(duration, 2)}
+        if status == "done":
+            record["result"] = result
+            record["artifacts"] = artifacts or {}
+            record["deps"] = deps_fingerprint
+        else:
+            record["error"] = error
+        with self._lock:
+            self.data["stages"][name] = record
+        self._save()
+
+    def checkpoint(self, name: str, fn: Callable[[Dict[str, Any]], Any],
+                   artifacts: Optional[Callable[[Any], Dict[str, Optional[str]]]] = None):
+        """
+        包装流水线阶段函数：--resume 时复用仍有效的结果；执行后记录结果 (须可 JSON 序列化)、产物哈希与上游指纹。
+        上游阶段重新执行并产生不同的结果或产物时，本阶段随之失效。
+        """
+        def run(deps: Dict[str, Any]):
+            fingerprint = self.deps_fingerprint(deps)
+            if self.resume:
+                done, result = self.completed(name, artifacts, fingerprint)
+                if done:
+                    print(f"[resume] {name}: reusing result from previous run")
+                    return result
+
+            start = time.perf_counter()
+            try:
+                result = fn(deps)
+            except Exception as e:
+                self.record_stage(name, "failed", time.perf_counter() - start, error=str(e))
+                raise
+            self.record_stage(name, "done", time.perf_counter() - start, result,
+                              artifacts(result) if artifacts is not None else None, deps_fingerprint=fingerprint)
+            return result
+
+        return run
+
+    # --- 发布 ---
+
+    def posts(self) -> Dict[str, Optional[str]]:
+        """
+        返回不可再发布的语言 {lang_code: tweet_id}；
+        发送结果未知的语言 tweet_id 为 None。
+        """
+        return {lang: post.get("tweet_id") for lang, post in self.data["posts"].items()
+                if post.get("state") in ("sending", "posted")}
+
+    def mark_sending(self, lang_code: str):
+        """调用 create_tweet 前写入，使中断后无法确认结果的推文不会被自动重发"""
+        with self._lock:
+            self.data["posts"][lang_code] = {"state": "sending", "tweet_id": None, "time": _now()}
+        self._save()
+
+    def mark_posted(self, lang_code: str, tweet_id: Any):
+        with self._lock:
+            self.data["posts"][lang_code] = {"state": "posted", "tweet_id": str(tweet_id), "time": _now()}
+        self._save()
+
+    def mark_failed(self, lang_code: str, error: str):
+        """create_tweet 明确返回错误 (推文未发出)，下次运行可以重试"""
+        with self._lock:
+            self.data["posts"][lang_code] = {"state": "failed", "error": error, "time": _now()}
+        self._save()
@@ -0,0 +1,208 @@
+# src/screenshots.py
+
+import os
+import asyncio
+from typing import cast, Dict, List, Optional, Tuple
+from playwright.async_api import async_playwright, Browser, Page, ViewportSize, TimeoutError as PlaywrightTimeoutError
+
+import tracing
+from config import (
+    BASE_VIEWPORT_WIDTH, BASE_VIEWPORT_HEIGHT, DEVICE_SCALE_FACTOR,
+    SCREENSHOT_CONCURRENCY, SCREENSHOT_TIMEOUT_MS, SCREENSHOT_SETTLE_POLL_MS
+)
+
+# 截图引擎：一个浏览器，各语言各用一个独立的浏览器上下文 (pageviews 设置保存在 localStorage 中，互不干扰)，
+# 在同一事件循环中并行截取 Top Views、对数折线图与饼图。
+# 不使用固定等待：导航等待网络空闲，图表等待 canvas 绘制完成且连续两次轮询不再变化，
+# 弹窗与开关等待对应元素的可见/隐藏状态。
+
+# canvas 已绘制 (非空白)、与操作前的画面不同，且连续两次轮询保持不变 (动画结束) 时返回 true
+CANVAS_SETTLED_JS = """
+(previous) => {
+    const canvas = document.querySelector('canvas');
+    if (!canvas || !canvas.width || !canvas.height) return false;
+    let snapshot;
+    try {
+        snapshot = canvas.toDataURL();
+    } catch (e) {
+        return true;  // 无法读取像素时退化为只等待可见
+    }
+    const blank = document.createElement('canvas');
+    blank.width = canvas.width;
+    blank.height = canvas.height;
+    if (snapshot === blank.toDataURL() || snapshot === previous) {
+        window.__canvasSnapshot = null;
+        return false;
+    }
+    if (snapshot !== window.__canvasSnapshot) {
+        window.__canvasSnapshot = snapshot;
+        window.__canvasStable = 0;
+        return false;
+    }
+    return ++window.__canvasStable >= 2;
+}
+"""
+
+# 等待浏览器完成两帧布局与绘制 (滚动后截图前使用)
+NEXT_PAINT_JS = "() => new Promise(resolve => requestAnimationFrame(() => requestAnimationFrame(resolve)))"
+
+
+async def _canvas_snapshot(page: Page) -> Optional[str]:
+    try:
+        return await page.evaluate("() => { const c = document.querySelector('canvas'); return c ? c.toDataURL() : null; }")
+    except Exception:
+        return None
+
+
+async def _wait_chart_settled(page: Page, lang_code: str, previous: Optional[str] = None):
+    """等待图表绘制稳定；previous 为操作前的画面，要求画面已发生变化"""
+    try:
+        await page.wait_for_function(CANVAS_SETTLED_JS, arg=previous, polling=SCREENSHOT_SETTLE_POLL_MS,
+                                     timeout=SCREENSHOT_TIMEOUT_MS)
+    except PlaywrightTimeoutError:
+        print(f"[{lang_code}] Chart did not settle within {SCREENSHOT_TIMEOUT_MS / 1000:.0f}s, capturing anyway.")
+
+
+async def _scroll_past_header(page: Page, lang_code: str):
+    try:
+        header = page.locator(".interapp-navigation").first
+        if await header.is_visible():
+            header_box = await header.bounding_box()
+            if header_box:
+                await page.evaluate("(y) => window.scrollBy(0, y)", header_box['height'] * 0.9)
+                await page.evaluate(NEXT_PAINT_JS)
+    except Exception as err:
+        print(f"[{lang_code}] Could not scroll past header: {err}")
+
+
+async def _click_and_wait(page: Page, trigger: str, target: str):
+    """点击 trigger 并等待 target 出现；trigger 不可见时返回 False"""
+    button = page.locator(trigger).first
+    if not await button.is_visible():
+        return False
+    await button.click()
+    await page.locator(target).first.wait_for(state="visible", timeout=SCREENSHOT_TIMEOUT_MS)
+    return True
+
+
+async def _configure_line_chart(page: Page, lang_code: str):
+    """切换为贝塞尔曲线与对数坐标"""
+    try:
+        if await _click_and_wait(page, ".js-test-settings", ".save-settings-btn"):
+            bezier = page.locator(".js-test-bezier-curve").first
+            if await bezier.is_visible():
+                await bezier.click()
+            before = await _canvas_snapshot(page)
+            save_btn = page.locator(".save-settings-btn").first
+            await save_btn.click()
+            await save_btn.wait_for(state="hidden", timeout=SCREENSHOT_TIMEOUT_MS)
+            await _wait_chart_settled(page, lang_code, before)
+
+        log_label = page.locator(".logarithmic-scale").first
+        if await log_label.is_visible():
+            before = await _canvas_snapshot(page)
+            await log_label.click()
+            await _wait_chart_settled(page, lang_code, before)
+    except Exception as e:
+        print(f"[{lang_code}] Error configuring line chart: {e}")
+
+
+async def _switch_to_pie(page: Page, lang_code: str):
+    try:
+        if await _click_and_wait(page, ".btn-chart-type", ".js-test-pie-chart"):
+            before = await _canvas_snapshot(page)
+            await page.locator(".js-test-pie-chart").first.click()
+            await _wait_chart_settled(page, lang_code, before)
+    except Exception as e:
+        print(f"[{lang_code}] Error toggling Pie chart: {e}")
+
+
+async def _capture_lang(browser: Browser, semaphore: asyncio.Semaphore, lang_code: str,
+                        urls: Dict[str, str], save_dir: str) -> List[str]:
+    topviews_url = urls.get('topviews')
+    pageviews_url = urls.get('pageviews')
+    if not topviews_url or not pageviews_url:
+        return []
+
+    topviews_path = os.path.join(save_dir, "topviews.png")
+    line_path = os.path.join(save_dir, "line.png")
+    pie_path = os.path.join(save_dir, "pie.png")
+
+    if all(os.path.exists(p) for p in [topviews_path, line_path, pie_path]):
+        print(f"[{lang_code}] Images already exist in {save_dir}, skipping.")
+        return [topviews_path, line_path, pie_path]
+
+    images = []
+    # 并发的截图任务在同一线程中交错执行，各自放在一条虚拟轨道上
+    async with semaphore:
+        with tracing.span("screenshots.lang", track=f"screenshots {lang_code}", lang=lang_code) as trace:
+            vp = cast(ViewportSize, {'width': BASE_VIEWPORT_WIDTH, 'height': BASE_VIEWPORT_HEIGHT})
+            context = await browser.new_context(viewport=vp, device_scale_factor=DEVICE_SCALE_FACTOR)
+            try:
+                page = await context.new_page()
+
+                # 1. Top Views
+                print(f"[{lang_code}] Navigating to Top Views: {topviews_url}")
+                await page.goto(topviews_url, wait_until='networkidle', timeout=SCREENSHOT_TIMEOUT_MS * 2)
+                await page.locator("#topview-entry-1").wait_for(state="visible", timeout=SCREENSHOT_TIMEOUT_MS)
+                await _scroll_past_header(page, lang_code)
+                await page.screenshot(path=topviews_path)
+                print(f"[{lang_code}] Captured: {topviews_path}")
+                images.append(topviews_path)
+
+                # 2. Line Chart
+                print(f"[{lang_code}] Navigating to Page Views: {pageviews_url}")
+                await page.goto(pageviews_url, wait_until='networkidle', timeout=SCREENSHOT_TIMEOUT_MS * 2)
+                await page.locator("canvas").first.wait_for(state="visible", timeout=SCREENSHOT_TIMEOUT_MS)
+                await _wait_chart_settled(page, lang_code)
+                await _configure_line_chart(page, lang_code)
+                await _scroll_past_header(page, lang_code)
+                await page.screenshot(path=line_path)
+                print(f"[{lang_code}] Captured: {line_path}")
+                images.append(line_path)
+
+                # 3. Pie Chart
+                await _switch_to_pie(page, lang_code)
+                await _scroll_past_header(page, lang_code)
+                await page.screenshot(path=pie_path)
+                print(f"[{lang_code}] Captured: {pie_path}")
+                images.append(pie_path)
+
+            except Exception as e:
+                print(f"[{lang_code}] Playwright critical error: {e}")
+            finally:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+            trace.set(images=len(images), bytes=sum(os.path.getsize(p) for p in images))
+
+    return images
+
+
+async def _capture_all(jobs: List[Tuple[str, Dict[str, str], str]]) -> Dict[str, List[str]]:
+    async with async_playwright() as playwright:
+        print("Launching screenshot browser...")
+        browser = await playwright.chromium.launch(headless=True)
+        semaphore = asyncio.Semaphore(SCREENSHOT_CONCURRENCY)
+        try:
+            results = await asyncio.gather(
+                *(_capture_lang(browser, semaphore, lang_code, urls, save_dir) for lang_code, urls, save_dir in jobs))
+        finally:
+            await browser.close()
+    return {lang_code: images for (lang_code, _, _), images in zip(jobs, results)}
+
+
+def capture_all(jobs: List[Tuple[str, Dict[str, str], str]]) -> Dict[str, List[str]]:
+    """
+    并行截取多个语言的图表。
+    jobs: [(lang_code, {"topviews": url, "pageviews": url}, save_dir)]
+    返回 {lang_code: [图片路径]} (截图失败的语言只包含已成功的图片)。
+    """
+    if not jobs:
+        return {}
+    try:
+        return asyncio.run(_capture_all(jobs))
+    except Exception as e:
+        print(f"Screenshot browser error: {e}")
+        return {lang_code: [] for lang_code, _, _ in jobs}
@@ -0,0 +1,239 @@
+# src/tracing.py
+
+import os
+import json
+import time
+import shutil
+import threading
+import functools
+from typing import Dict, Any, Optional, List
+
+from config import TRACES_DIR, TRACE_KEEP_RUNS
+
+# 轻量追踪：用 span 包裹各阶段与子步骤，记录起止时间、进程/线程与属性 (语言、日期、帧数、字节数等)。
+# - 未启用时 span 为空操作；enable() 通过环境变量把追踪目录传给渲染子进程，子进程自动启用；
+# - 每个进程把事件逐行追加到 {追踪目录}/events-{pid}.jsonl，运行结束时由 write_report() 合并为
+#   Chrome trace / Perfetto 可直接打开的 data/traces/{run_id}.json，并输出汇总表 ({run_id}.summary.txt)，
+#   同时向 data/traces/history.jsonl 追加一行各 span 的总耗时，便于跨天比较性能回归。
+
+TRACE_ENV = "ATTENTION_TRACE_DIR"
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {"dir": None, "file": None, "pid": None, "run_id": None}
+# 虚拟轨道 (如并发的异步截图任务) -> 合成的线程号
+_tracks: Dict[str, int] = {}
+
+
+def enable(run_id: str) -> str:
+    """在主进程中启用追踪，返回事件目录"""
+    trace_dir = os.path.join(TRACES_DIR, run_id)
+    os.makedirs(trace_dir, exist_ok=True)
+    os.environ[TRACE_ENV] = trace_dir
+    _state["run_id"] = run_id
+    return trace_dir
+
+
+def _trace_dir() -> Optional[str]:
+    return os.environ.get(TRACE_ENV)
+
+
+def enabled() -> bool:
+    return _trace_dir() is not None
+
+
+def _emit(event: Dict[str, Any]):
+    trace_dir = _trace_dir()
+    if trace_dir is None:
+        return
+    line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+    with _lock:
+        # fork 出的子进程继承了父进程的文件句柄，按 pid 重新打开
+        if _state["pid"] != os.getpid() or _state["dir"] != trace_dir:
+            _state["file"] = open(os.path.join(trace_dir, f"events-{os.getpid()}.jsonl"), 'a', encoding='utf-8')
+            _state["pid"], _state["dir"] = os.getpid(), trace_dir
+        _state["file"].write(line)
+        _state["file"].flush()
+
+
+def _track_id(track: str) -> int:
+    with _lock:
+        if track not in _tracks:
+            _tracks[track] = 10_000_000 + len(_tracks)
+        return _tracks[track]
+
+
+class span:
+    """
+    with tracing.span("render.chunk", lang="en", frames=120) as s:
+        ...
+        s.set(bytes=size)
+    track: 放在指定的虚拟轨道上 (同一线程中交错执行的异步任务各用一条轨道)。
+    """
+
+    def __init__(self, name: str, track: Optional[str] = None, **attrs):
+        self.name = name
+        self.track = track
+        self.attrs = attrs
+        self.start_us = 0
+        self.start = 0.0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        if enabled():
+            self.start_us = time.time_ns() // 1000
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.start:
+            return False
+        if exc is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        thread = threading.current_thread()
+        _emit({
+            "name": self.name,
+            "cat": self.name.split('.')[0].split(' ')[0],
+            "ph": "X",
+            "ts": self.start_us,
+            "dur": int((time.perf_counter() - self.start) * 1_000_000),
+            "pid": os.getpid(),
+            "tid": _track_id(self.track) if self.track else thread.native_id,
+            "tname": self.track or thread.name,
+            "args": self.attrs,
+        })
+        return False
+
+
+def traced(name: Optional[str] = None, **attrs):
+    """函数装饰器形式的 span"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name or fn.__name__, **attrs):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- 报告 ---
+
+def _load_events(trace_dir: str) -> List[Dict[str, Any]]:
+    events = []
+    for fname in sorted(os.listdir(trace_dir)):
+        if not fname.endswith(".jsonl"):
+            continue
+        with open(os.path.join(trace_dir, fname), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass  # 进程被杀时可能留下半行
+    return events
+
+
+def _summarize(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for event in events:
+        groups.setdefault(event["name"], []).append(event)
+
+    rows = []
+    for name, items in groups.items():
+        durations = sorted(e["dur"] / 1_000_000 for e in items)
+        row = {
+            "name": name,
+            "count": len(items),
+            "total": sum(durations),
+            "mean": sum(durations) / len(durations),
+            "p95": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            "max": durations[-1],
+            "errors": sum(1 for e in items if "error" in e.get("args", {})),
+        }
+        for key in ("frames", "bytes"):
+            values = [e["args"][key] for e in items if isinstance(e.get("args", {}).get(key), (int, float))]
+            if values:
+                row[key] = sum(values)
+        rows.append(row)
+    return sorted(rows, key=lambda r: r["total"], reverse=True)
+
+
+def _format_summary(run_id: str, wall: float, rows: List[Dict[str, Any]]) -> str:
+    lines = [f"Trace summary {run_id} (wall {wall:.1f}s)",
+             f"  {'span':<32} {'count':>6} {'total':>9} {'mean':>8} {'p95':>8} {'max':>8} {'err':>4}  extra"]
+    for r in rows:
+        extra = []
+        if "frames" in r:
+            extra.append(f"{r['frames']} frames ({r['frames'] / r['total']:.0f} fps)" if r['total'] else f"{r['frames']} frames")
+        if "bytes" in r:
+            extra.append(f"{r['bytes'] / 1024 / 1024:.1f}MB")
+        lines.append(f"  {r['name'][:32]:<32} {r['count']:>6} {r['total']:>8.1f}s {r['mean']:>7.2f}s "
+                     f"{r['p95']:>7.2f}s {r['max']:>7.2f}s {r['errors']:>4}  {', '.join(extra)}")
+    return "\n".join(lines)
+
+
+def write_report() -> Optional[str]:
+    """
+    合并所有进程的事件，写出 Chrome trace JSON 与汇总表，并追加历史记录。返回 trace 文件路径。
+    """
+    trace_dir = _trace_dir()
+    run_id = _state["run_id"]
+    if trace_dir is None or run_id is None or not os.path.isdir(trace_dir):
+        return None
+    with _lock:
+        if _state["file"] is not None:
+            _state["file"].close()
+        _state["file"] = _state["pid"] = _state["dir"] = None
+
+    events = _load_events(trace_dir)
+    if not events:
+        return None
+
+    # Chrome trace：进程与线程名元数据 + 完整事件 (tname 只用于生成元数据)
+    main_pid = os.getpid()
+    trace_events = []
+    names = {}
+    for event in events:
+        names[(event["pid"], event["tid"])] = event.pop("tname", None)
+    for pid in sorted({pid for pid, _ in names}):
+        trace_events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                             "args": {"name": "main" if pid == main_pid else f"worker {pid}"}})
+    for (pid, tid), tname in sorted(names.items(), key=lambda kv: (kv[0][0], kv[0][1])):
+        if tname:
+            trace_events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": tname}})
+    trace_events.extend(sorted(events, key=lambda e: e["ts"]))
+
+    trace_path = os.path.join(TRACES_DIR, f"{run_id}.json")
+    with open(trace_path, 'w', encoding='utf-8') as f:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+    start = min(e["ts"] for e in events)
+    wall = (max(e["ts"] + e["dur"] for e in events) - start) / 1_000_000
+    rows = _summarize(events)
+    summary = _format_summary(run_id, wall, rows)
+    with open(os.path.join(TRACES_DIR, f"{run_id}.summary.txt"), 'w', encoding='utf-8') as f:
+        f.write(summary + "\n")
+    with open(os.path.join(TRACES_DIR, "history.jsonl"), 'a', encoding='utf-8') as f:
+        f.write(json.dumps({"run": run_id, "wall": round(wall, 3),
+                            "spans": {r["name"]: {"count": r["count"], "total": round(r["total"], 3)} for r in rows}},
+                           ensure_ascii=False) + "\n")
+
+    print("\n" + summary)
+    print(f"Trace written to {trace_path} (open in https://ui.perfetto.dev or chrome://tracing)")
+
+    shutil.rmtree(trace_dir, ignore_errors=True)
+    os.environ.pop(TRACE_ENV, None)
+    _prune()
+    return trace_path
+
+
+def _prune():
+    """只保留最近 TRACE_KEEP_RUNS 次运行的 trace 文件 (history.jsonl 保留全部)"""
+    traces = sorted(f for f in os.listdir(TRACES_DIR) if f.endswith(".json"))
+    for fname in traces[:-TRACE_KEEP_RUNS]:
+        for path in (fname, fname[:-len(".json")] + ".summary.txt"):
+            try:
+                os.remove(os.path.join(TRACES_DIR, path))
+            except OSError:
+                pass
@@ -1,11 +1,22 @@
 # src/twitter_client.py
 
 import os
+import time
+import concurrent.futures
 import tweepy
-from typing import Optional
+from typing import Optional, Callable, Dict, Any, List
+
+import tracing
+from config import (
+    TWITTER_UPLOAD_WORKERS, TWITTER_POST_INTERVAL, TWITTER_STATUS_BACKOFF, TWITTER_PROCESSING_TIMEOUT, TWITTER_FAKE
+)
 
 def get_twitter_auth_v1() -> Optional[tweepy.API]:
     """获取 v1.1 API 对象 (用于上传媒体)"""
+    if TWITTER_FAKE:
+        import fake_twitter
+        return fake_twitter.FakeAPI(fake_twitter.get_server())
+
     api_key = os.environ.get("TWITTER_API_KEY")
     api_secret = os.environ.get("TWITTER_API_SECRET")
     access_token = os.environ.get("TWITTER_ACCESS_TOKEN")
@@ -19,6 +30,10 @@ def get_twitter_auth_v1() -> Optional[tweepy.API]:
 
 def get_twitter_client_v2() -> Optional[tweepy.Client]:
     """获取 v2 Client 对象 (用于发布推文)"""
+    if TWITTER_FAKE:
+        import fake_twitter
+        return fake_twitter.FakeClient(fake_twitter.get_server())
+
     api_key = os.environ.get("TWITTER_API_KEY")
     api_secret = os.environ.get("TWITTER_API_SECRET")
     access_token = os.environ.get("TWITTER_ACCESS_TOKEN")
@@ -34,3 +49,136 @@ def get_twitter_client_v2() -> Optional[tweepy.Client]:
         access_token=access_token,
         access_token_secret=access_token_secret
     )
+
+
+def _wait_for_processing(api_v1: tweepy.API, media, lang_code: str):
+    """
+    轮询视频的服务器端处理状态，间隔取服务器返回的 check_after_secs；
+    未给出时按 TWITTER_STATUS_BACKOFF 指数退避。
+    """
+    info = getattr(media, 'processing_info', None)
+    backoff, max_backoff = TWITTER_STATUS_BACKOFF
+    deadline = time.monotonic() + TWITTER_PROCESSING_TIMEOUT
+    while info and info.get('state') in ('pending', 'in_progress'):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Video processing not finished after {TWITTER_PROCESSING_TIMEOUT}s")
+        delay = info.get('check_after_secs')
+        if delay is None:
+            delay, backoff = backoff, min(backoff * 2, max_backoff)
+        print(f"[{lang_code}] Video {info['state']} ({info.get('progress_percent', 0)}%), checking again in {delay}s")
+        time.sleep(delay)
+        info = getattr(api_v1.get_media_upload_status(media.media_id), 'processing_info', None)
+
+    if info and info.get('state') == 'failed':
+        raise RuntimeError(f"Video processing failed: {info.get('error')}")
+
+
+def upload_media(api_v1: tweepy.API, item: Dict[str, Any]) -> List[Any]:
+    """
+    上传一条推文的全部媒体，返回 media_ids (视频在前)。
+    视频 FINALIZE 后先上传图片，再等待视频处理完成，使图片上传与服务器端处理重叠；
+    视频处理失败或超时时去掉视频，只带图片发布。
+    注意：推特限制单个推文最多 4 个媒体文件。
+    """
+    lang_code = item['lang_code']
+    video_path = item.get('video_path')
+    media_ids = []
+    video = None
+
+    if video_path and os.path.exists(video_path):
+        print(f"[{lang_code}] Uploading video: {video_path}...")
+        with tracing.span("upload.video", lang=lang_code, bytes=os.path.getsize(video_path)):
+            video = api_v1.media_upload(filename=video_path, media_category='tweet_video', chunked=True,
+                                        wait_for_async_finalize=False)
+        media_ids.append(video.media_id)
+
+    # Mixed Media: Twitter API v2 支持 1 Video + Images
+    for p in item.get('image_paths', []):
+        if os.path.exists(p) and len(media_ids) < 4:
+            print(f"[{lang_code}] Uploading image: {p}...")
+            with tracing.span("upload.image", lang=lang_code, bytes=os.path.getsize(p)):
+                media_ids.append(api_v1.media_upload(filename=p).media_id)
+
+    if video is not None:
+        with tracing.span("upload.processing", lang=lang_code):
+            try:
+                _wait_for_processing(api_v1, video, lang_code)
+            except (RuntimeError, TimeoutError) as e:
+                print(f"[{lang_code}] Warning: {e}, posting with images only.")
+                media_ids.remove(video.media_id)
+    return media_ids
+
+
+def post_thread(client_v2: tweepy.Client, api_v1: tweepy.API, tweet_queue: List[Dict[str, Any]],
+                on_posted: Optional[Callable[[Dict[str, Any], Any], None]] = None,
+                post_interval: float = TWITTER_POST_INTERVAL,
+                posted: Optional[Dict[str, Any]] = None,
+                on_sending: Optional[Callable[[Dict[str, Any]], None]] = None,
+                on_rejected: Optional[Callable[[Dict[str, Any], Exception], None]] = None) -> List[Any]:
+    """
+    发布推文串：所有语言的媒体上传与处理状态轮询提前并发进行，
+    推文按队列顺序在各自媒体就绪后依次发布，后一条回复上一条成功的推文。
+    - posted: 之前已发布的语言 {lang_code: tweet_id}，跳过发布并接续推文串；tweet_id 为 None 表示结果未知，同样跳过
+    - on_sending(item) 在调用 create_tweet 之前调用；on_posted(item, tweet_id) 在发布成功后调用；
+      on_rejected(item, error) 在接口明确拒绝 (推文未发出) 时调用
+    返回各条推文的 ID (失败为 None)。
+    """
+    posted = posted or {}
+    tweet_ids = []
+    last_successful_id = None
+    last_post_time = None
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=TWITTER_UPLOAD_WORKERS) as pool:
+        uploads = {item['lang_code']: pool.submit(upload_media, api_v1, item)
+                   for item in tweet_queue if item['lang_code'] not in posted}
+
+        for item in tweet_queue:
+            lang_code = item['lang_code']
+            if lang_code in posted:
+                if posted[lang_code] is None:
+                    print(f"[{lang_code}] Outcome of a previous post attempt is unknown, not posting again "
+                          f"(check the account and the run manifest).")
+                else:
+                    last_successful_id = posted[lang_code]
+                    print(f"[{lang_code}] Already posted. ID: {last_successful_id}")
+                tweet_ids.append(posted[lang_code])
+                continue
+
+            tweet_id = None
+            try:
+                media_ids = uploads[lang_code].result()
+
+                if last_post_time is not None:
+                    time.sleep(max(0.0, last_post_time + post_interval - time.monotonic()))
+
+                print(f"[{lang_code}] Sending tweet with {len(media_ids)} media items...")
+                kwargs = {
+                    'text': item['text'],
+                    'media_ids': media_ids if media_ids else None
+                }
+
+                # 发送英语推文，其他语言推文回复上一条（形成 Thread）
+                if last_successful_id:
+                    kwargs['in_reply_to_tweet_id'] = last_successful_id
+
+                if on_sending:
+                    on_sending(item)
+                try:
+                    with tracing.span("tweet.create", lang=lang_code, media=len(media_ids)):
+                        resp = client_v2.create_tweet(**kwargs)
+                except tweepy.errors.HTTPException as e:
+                    # 4xx 表示请求被拒绝；5xx 与网络错误时推文可能已发出，不视为拒绝
+                    if on_rejected and not isinstance(e, tweepy.errors.TwitterServerError):
+                        on_rejected(item, e)
+                    raise
+                last_post_time = time.monotonic()
+                tweet_id = last_successful_id = resp.data['id']
+                print(f"[{lang_code}] Posted successfully. ID: {tweet_id}")
+
+                if on_posted:
+                    on_posted(item, tweet_id)
+            except Exception as e:
+                print(f"[{lang_code}] Failed to post: {e}")
+            tweet_ids.append(tweet_id)
+
+    return tweet_ids
@@ -1,11 +1,54 @@
 # src/utils.py
 
 import os
+import re
 import json
 import shutil
+import threading
+import time
 from datetime import datetime
 from typing import Dict, Any
-from config import CONFIG_JSON_PATH, DATA_DIR, VIDEO_DIR, PICTURES_DIR
+from config import CONFIG_JSON_PATH, SITEVIEWS_STORE_PATH, DATA_DIR, VIDEO_DIR, PICTURES_DIR
+
+class RateLimiter:
+    """
+    线程安全的令牌桶限速器。
+    rate: 每秒补充的令牌数；burst: 桶容量 (允许的瞬时突发请求数)。
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """阻塞直到取得一个令牌"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def available_memory_mb() -> float:
+    """返回当前可用的物理内存 (MB)，无法获取时返回 0"""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return 0.0
 
 def get_date_str(date_obj: datetime) -> str:
     """格式化日期对象为 YYYY-MM-DD 字符串"""
@@ -29,6 +72,26 @@ def save_json_config(scaling_factors: Dict[str, float], base_threshold: float):
     except Exception as e:
         print(f"Error saving config: {e}")
 
+def load_siteviews_store() -> Dict[str, Dict[str, int]]:
+    """加载本地站点日浏览量存储 {project: {YYYY-MM-DD: views}}"""
+    if not os.path.exists(SITEVIEWS_STORE_PATH):
+        return {}
+    try:
+        with open(SITEVIEWS_STORE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading siteviews store: {e}")
+        return {}
+
+def save_siteviews_store(store: Dict[str, Dict[str, int]]):
+    """保存本地站点日浏览量存储"""
+    try:
+        os.makedirs(os.path.dirname(SITEVIEWS_STORE_PATH), exist_ok=True)
+        with open(SITEVIEWS_STORE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(store, f, ensure_ascii=False, indent=1, sort_keys=True)
+    except Exception as e:
+        print(f"Error saving siteviews store: {e}")
+
 def save_daily_report_data(date_str: str, data: Dict[str, Any]):
     """向 data/ 保存每日报告数据"""
     file_path = os.path.join(DATA_DIR, f"{date_str}.json")
@@ -73,8 +136,9 @@ def cleanup_video_directories(keep_count: int = 6):
         return
 
     try:
-        # 获取所有子目录
-        subdirs = [d for d in os.listdir(VIDEO_DIR) if os.path.isdir(os.path.join(VIDEO_DIR, d))]
+        # 获取所有日期子目录 (temp/、farm/、drafts/ 等工作目录不参与计数)
+        subdirs = [d for d in os.listdir(VIDEO_DIR)
+                   if os.path.isdir(os.path.join(VIDEO_DIR, d)) and re.fullmatch(r'\d{4}-\d{2}-\d{2}', d)]
         # 按日期字符串排序 (YYYY-MM-DD)
         subdirs.sort()
 
@@ -1,67 +1,103 @@
 # src/wiki_api.py
 
 import os
-import requests
 import json
 import urllib.parse
+import concurrent.futures
 from datetime import datetime, timedelta, timezone
 from statistics import mean
 from typing import Dict, List, Optional
-from config import LANG_CONFIG, HEADERS, SPECIFIC_IGNORE_TERMS, IGNORE_PREFIXES, CONFIG_JSON_PATH
+import http_client
+from config import (
+    LANG_CONFIG, SPECIFIC_IGNORE_TERMS, IGNORE_PREFIXES, CONFIG_JSON_PATH, HTTP_MAX_WORKERS,
+    SITEVIEWS_WINDOW_DAYS
+)
+from utils import load_siteviews_store, save_siteviews_store
+
+def _load_cached_scaling_factors() -> Optional[Dict[str, float]]:
+    """从 config.json 加载上次保存的放缩因子，失败时返回 None"""
+    try:
+        if os.path.exists(CONFIG_JSON_PATH):
+            with open(CONFIG_JSON_PATH, 'r', encoding='utf-8') as f:
+                return json.load(f).get("scalingFactors")
+    except Exception as e:
+        # 文件读取或解析出错
+        print(f"Error reading cache file {CONFIG_JSON_PATH}: {e}")
+    return None
+
+def fetch_siteviews(project: str, start_date: datetime, end_date: datetime) -> Optional[Dict[str, int]]:
+    """
+    获取单个站点在日期范围内 (含两端) 的日浏览量，失败时返回 None。
+    """
+    project_key = project.replace('.org', '') if project.endswith('.org') else project
+    start_str = start_date.strftime("%Y%m%d")
+    end_str = end_date.strftime("%Y%m%d")
+    url = f"https://wikimedia.org/api/rest_v1/metrics/pageviews/aggregate/{project_key}/all-access/user/daily/{start_str}/{end_str}"
+
+    try:
+        response = http_client.get(url)
+        if response.status_code != 200:
+            print(f"  Warning: Failed to fetch aggregate views for {project} (Status {response.status_code})")
+            return None
+        result = {}
+        for item in response.json().get('items', []):
+            if item.get('views') is not None:
+                d_str = datetime.strptime(item['timestamp'], "%Y%m%d%H").strftime("%Y-%m-%d")
+                result[d_str] = item['views']
+        return result
+    except Exception as e:
+        print(f"  Error fetching {project}: {e}")
+        return None
 
 def get_siteviews_scaling_factors() -> Dict[str, float]:
     """
     获取各语言站点的流量数据，并计算相对于最大流量站点的放缩因子。
     用于动态调整可视化的颜色阈值。
+    站点日浏览量增量保存在本地存储中，每次运行只请求窗口内缺失的日期。
     """
     print("Fetching site-wide views for dynamic threshold scaling...")
     factors = {lang['code']: 1.0 for lang in LANG_CONFIG}
 
-    end_date = datetime.now(timezone.utc)
-    start_date = end_date - timedelta(days=20)
-    start_str = start_date.strftime("%Y%m%d")
-    end_str = end_date.strftime("%Y%m%d")
+    # 滚动窗口：截至昨天 (UTC) 的 SITEVIEWS_WINDOW_DAYS 个完整日
+    last_day = datetime.now(timezone.utc) - timedelta(days=1)
+    window = [(last_day - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(SITEVIEWS_WINDOW_DAYS)]
 
+    store = load_siteviews_store()
     avg_views = {}
 
     for lang in LANG_CONFIG:
         project = lang['project']
-        project_key = project.replace('.org', '') if project.endswith('.org') else project
-        url = f"https://wikimedia.org/api/rest_v1/metrics/pageviews/aggregate/{project_key}/all-access/user/daily/{start_str}/{end_str}"
-
-        try:
-            response = requests.get(url, headers=HEADERS)
-            if response.status_code == 200:
-                data = response.json()
-                items = data.get('items', [])
-                valid_views = [item['views'] for item in items if item.get('views') is not None]
-                if valid_views:
-                    avg_views[lang['code']] = mean(valid_views)
-            else:
-                print(f"  Warning: Failed to fetch aggregate views for {lang['code']} (Status {response.status_code})")
-        except Exception as e:
-            print(f"  Error fetching {lang['code']}: {e}")
+        daily = store.setdefault(project, {})
+
+        missing = sorted(d for d in window if d not in daily)
+        if missing:
+            start = datetime.strptime(missing[0], "%Y-%m-%d")
+            end = datetime.strptime(missing[-1], "%Y-%m-%d")
+            fetched = fetch_siteviews(project, start, end)
+            if fetched:
+                daily.update(fetched)
+            print(f"  {lang['code']}: fetched {len(fetched or {})}/{len(missing)} missing days")
+
+        # 剔除窗口外的旧数据
+        for d_str in list(daily.keys()):
+            if d_str not in window:
+                del daily[d_str]
+
+        valid_views = [daily[d] for d in window if d in daily]
+        if valid_views:
+            avg_views[lang['code']] = mean(valid_views)
+
+    save_siteviews_store(store)
 
     if not avg_views:
-        print("Warning: Could not calculate average site views from network.")
-        try:
-            # 网络请求失败，从缓存 config.json 文件加载旧的放缩因子
-            if os.path.exists(CONFIG_JSON_PATH):
-                with open(CONFIG_JSON_PATH, 'r', encoding='utf-8') as f:
-                    cached_config = json.load(f)
-                    cached_factors = cached_config.get("scalingFactors")
-                    if cached_factors:
-                        print(f"-> Using cached scaling factors from: {CONFIG_JSON_PATH}")
-                        return cached_factors
-
-            # 如果缓存文件不存在或内容无效，则使用默认值
-            print("-> Cache not found or invalid. Using default scaling factors.")
-            return factors
-        except Exception as e:
-            # 文件读取或解析出错，也使用默认值
-            print(f"Error reading cache file {CONFIG_JSON_PATH}: {e}")
-            print("-> Using default scaling factors.")
-            return factors
+        print("Warning: Could not calculate average site views from network or local store.")
+        cached_factors = _load_cached_scaling_factors()
+        if cached_factors:
+            print(f"-> Using cached scaling factors from: {CONFIG_JSON_PATH}")
+            return cached_factors
+        # 如果缓存文件不存在或内容无效，则使用默认值
+        print("-> Cache not found or invalid. Using default scaling factors.")
+        return factors
 
     max_avg_views = max(avg_views.values())
     if max_avg_views == 0:
@@ -70,6 +106,14 @@ def get_siteviews_scaling_factors() -> Dict[str, float]:
     for code, avg in avg_views.items():
         factors[code] = (avg / max_avg_views) ** 0.5
 
+    # 部分站点既无网络数据也无本地存储时，沿用其上次的放缩因子
+    unavailable = [code for code in factors if code not in avg_views]
+    if unavailable:
+        cached_factors = _load_cached_scaling_factors() or {}
+        for code in unavailable:
+            factors[code] = cached_factors.get(code, 1.0)
+        print(f"  Warning: No site views for {', '.join(unavailable)}, using cached factors.")
+
     print(f"Calculated scaling factors: {json.dumps(factors, indent=2)}")
     return factors
 
@@ -84,7 +128,7 @@ def get_top_articles(lang_code: str, date_obj: datetime) -> List[Dict]:
     url = f"https://wikimedia.org/api/rest_v1/metrics/pageviews/top/{lang_code}.wikipedia/all-access/{year}/{month}/{day}"
 
     try:
-        response = requests.get(url, headers=HEADERS)
+        response = http_client.get(url)
         if response.status_code == 404:
             return []
         response.raise_for_status()
@@ -112,6 +156,24 @@ def get_top_articles(lang_code: str, date_obj: datetime) -> List[Dict]:
         print(f"Error fetching {lang_code}: {e}")
         return []
 
+def get_all_top_articles(date_obj: datetime) -> Dict[str, List[Dict]]:
+    """
+    并发获取 LANG_CONFIG 中所有语言的 Top 10 条目。
+    所有请求共享 http_client 的连接池，返回 {lang_code: cleaned_list}，单个语言失败或 404 时为空列表。
+    """
+    print(f"Fetching top articles for {len(LANG_CONFIG)} languages concurrently...")
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=HTTP_MAX_WORKERS) as executor:
+        future_to_code = {
+            executor.submit(get_top_articles, lang['code'], date_obj): lang['code']
+            for lang in LANG_CONFIG
+        }
+        for future in concurrent.futures.as_completed(future_to_code):
+            results[future_to_code[future]] = future.result()
+
+    # 按 LANG_CONFIG 顺序返回
+    return {lang['code']: results.get(lang['code'], []) for lang in LANG_CONFIG}
+
 def generate_chart_link(project: str, articles_data: List[Dict], end_date_obj: datetime, top_n: Optional[int] = None) -> Optional[str]:
     """
     生成 pageviews.wmcloud.org 的趋势图链接。